@@ -87,6 +87,20 @@ def tables_for_meta(meta):
         )
     )
 
+    # Table for the stats that rules watch, so that they're only
+    # checked for the entities where those stats changed.
+    Table(
+        'rule_watches', meta,
+        Column('rule', TEXT, primary_key=True),
+        Column('branch', TEXT, primary_key=True, default='trunk'),
+        Column('turn', INT, primary_key=True, default=0),
+        Column('tick', INT, primary_key=True, default=0),
+        Column('watches', TEXT, default='[]'),
+        ForeignKeyConstraint(
+            ['rule'], ['rules.rule']
+        )
+    )
+
     # Table for rules' prereqs, functions with veto power over a rule
     # being followed
     Table(
@@ -590,6 +604,8 @@ def queries(table):
         ))
 
 
+    r.update(alchemy.window_queries(table['things'], 'character'))
+
     branches = table['branches']
 
     r['branch_children'] = select(
@@ -14,8 +14,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """The main interface to the allegedb ORM, and some supporting functions and classes"""
+from collections import OrderedDict
 from contextlib import ContextDecorator, contextmanager
 import gc
+from operator import itemgetter
 from weakref import WeakValueDictionary
 
 from blinker import Signal
@@ -202,12 +204,14 @@ class TimeSignalDescriptor:
                 branch_then, turn_now, tick_now, turn_now, tick_now
             )
             e.query.new_branch(branch_now, branch_then, turn_now, tick_now)
+            e._load_new_branch(branch_now, turn_now, tick_now)
         e._obranch, e._oturn = val
 
         if not e._planning:
             if tick_now > e._turn_end[val]:
                 e._turn_end[val] = tick_now
         e._otick = e._turn_end_plan[val] = tick_now
+        e._load_at(branch_now, turn_now, tick_now)
         sig.send(
             e,
             branch_then=branch_then,
@@ -530,6 +534,15 @@ class ORM(object):
         self._time_plan = {}
         self._plans_uncommitted = []
         self._plan_ticks_uncommitted = []
+        self._keyframes_times = defaultdict(set)
+        """Branch, turn, and tick of every keyframe of each graph"""
+        self._loaded = OrderedDict()
+        """Windows of history loaded, keyed by graph and branch, with the
+        one used longest ago first"""
+        self._branch_loaded = {}
+        """Time in each branch from which everything is loaded"""
+        self._branch_windows = {}
+        """Keys of the windows in ``_loaded`` that each branch needs"""
         self._graph_val_cache = Cache(self)
         self._graph_val_cache.name = 'graph_val_cache'
         self._nodes_cache = NodesCache(self)
@@ -553,7 +566,11 @@ class ORM(object):
             dbstring,
             alchemy=True,
             connect_args={},
-            validate=False
+            validate=False,
+            keyframe_interval=None,
+            lazy=False,
+            cache_budget=None,
+            write_behind=False
     ):
         """Make a SQLAlchemy engine if possible, else a sqlite3 connection. In
         either case, begin a transaction.
@@ -565,8 +582,25 @@ class ORM(object):
         :arg connect_args: Dictionary of keyword arguments to be used for the database
         connection.
         :arg validate: Whether to perform an integrity test on the data.
+        :arg keyframe_interval: If set, snap a keyframe whenever history
+        passes a turn divisible by this number.
+        :arg lazy: If ``True``, only load each graph's history from its
+        latest keyframe on, in the current branch and those it descends
+        from. The rest gets loaded when time travel reaches it.
+        :arg cache_budget: If set, whenever I commit or load history and
+        one of my caches holds more than this many changes, forget
+        history, starting with what was used longest ago, until each
+        holds no more than half as many, or until only what the present
+        needs is left. It gets loaded again when time travel needs it.
+        Implies ``lazy=True``.
+        :arg write_behind: If ``True``, run database queries in a thread of
+        their own, so that writing and committing don't hold anything up.
+        ``self.query.sync()`` waits for them to be done.
 
         """
+        self.keyframe_interval = keyframe_interval
+        self.cache_budget = cache_budget
+        self._lazy = lazy or cache_budget is not None
         self._planning = False
         self._forward = False
         self._no_kc = False
@@ -579,7 +613,8 @@ class ORM(object):
         if not hasattr(self, 'query'):
             self.query = self.query_engine_cls(
                 dbstring, connect_args, alchemy,
-                getattr(self, 'pack', None), getattr(self, 'unpack', None)
+                getattr(self, 'pack', None), getattr(self, 'unpack', None),
+                write_behind=write_behind
             )
         self._edge_val_cache.setdb = self.query.edge_val_set
         self._edge_val_cache.deldb = self.query.edge_val_del_time
@@ -592,6 +627,8 @@ class ORM(object):
         self._graph_val_cache.setdb = self.query.graph_val_set
         self._graph_val_cache.deldb = self.query.graph_val_del_time
         self.query.initdb()
+        if write_behind:
+            self.query.start_writer()
         self._obranch = self.query.get_branch()
         self._oturn = self.query.get_turn()
         self._otick = self.query.get_tick()
@@ -603,7 +640,7 @@ class ORM(object):
             self._turn_end_plan[branch, turn] = plan_end_tick
         if 'trunk' not in self._branches:
             self._branches['trunk'] = None, 0, 0, 0, 0
-        self._new_keyframes = set()
+        self._new_keyframes = {}
         self._nbtt_stuff = (
             self._btt, self._turn_end_plan, self._turn_end,
             self._plan_ticks, self._plan_ticks_uncommitted,
@@ -631,6 +668,7 @@ class ORM(object):
             self._branch_parents[child].add(parent)
 
     def _snap_keyframe(self, graph, branch, turn, tick, nodes, edges, graph_val):
+        self._keyframes_times[graph].add((branch, turn, tick))
         nodes_keyframes_branch_d = self._nodes_cache.keyframe[
             graph,][branch]
         if turn in nodes_keyframes_branch_d:
@@ -673,35 +711,40 @@ class ORM(object):
             gvkb[turn] = {tick: graph_val}
 
     def snap_keyframe(self):
+        """Record the complete state of every graph at the present time"""
         branch, turn, tick = self._btt()
         snapp = self._snap_keyframe
         for graphn, graph in self.graph.items():
-            snapp(graphn, branch, turn, tick,
-                  graph._nodes_state(), graph._edges_state(),
-                  graph._val_state())
-            self._new_keyframes.add((graphn, branch, turn, tick))
+            state = (graph._nodes_state(), graph._edges_state(),
+                     graph._val_state())
+            snapp(graphn, branch, turn, tick, *state)
+            self._new_keyframes[graphn, branch, turn, tick] = state
+
+    def _snap_keyframe_if_due(self, turn_from, turn_to):
+        """Snap a keyframe if it's been ``keyframe_interval`` turns since
+        the last one would have been"""
+        interval = self.keyframe_interval
+        if not interval or turn_from // interval == turn_to // interval:
+            return
+        self.snap_keyframe()
 
     def _init_load(self, validate=False):
         assert hasattr(self, 'graph')
-        snap_keyframe = self._snap_keyframe
-        for (graph, branch, turn, tick, nodes, edges, graph_val) in \
-                self.query.keyframes_dump():
-            snap_keyframe(graph, branch, turn, tick, nodes, edges, graph_val)
-        noderows = [
-            (graph, node, branch, turn, tick, ex if ex else None)
-            for (graph, node, branch, turn, tick, ex)
-            in self.query.nodes_dump()
-        ]
-        self._nodes_cache.load(noderows)
-        edgerows = [
-            (graph, orig, dest, idx, branch, turn, tick, ex if ex else None)
-            for (graph, orig, dest, idx, branch, turn, tick, ex)
-            in self.query.edges_dump()
-        ]
-        self._edges_cache.load(edgerows)
-        self._graph_val_cache.load(self.query.graph_val_dump())
-        self._node_val_cache.load(self.query.node_val_dump())
-        self._edge_val_cache.load(self.query.edge_val_dump())
+        if self._lazy:
+            keyframes_times = self._keyframes_times
+            for (graph, branch, turn, tick) in self.query.keyframes_list():
+                keyframes_times[graph].add((branch, turn, tick))
+            self._load_at(*self._btt())
+        else:
+            snap_keyframe = self._snap_keyframe
+            for (graph, branch, turn, tick, nodes, edges, graph_val) in \
+                    self.query.keyframes_dump():
+                snap_keyframe(graph, branch, turn, tick, nodes, edges, graph_val)
+            self._nodes_cache.load(self.query.nodes_dump())
+            self._edges_cache.load(self.query.edges_dump())
+            self._graph_val_cache.load(self.query.graph_val_dump())
+            self._node_val_cache.load(self.query.node_val_dump())
+            self._edge_val_cache.load(self.query.edge_val_dump())
         last_plan = -1
         plans = self._plans
         branches_plans = self._branches_plans
@@ -717,6 +760,268 @@ class ORM(object):
             plan_ticks[plan][turn].append(tick)
             time_plan[plans[plan][0], turn, tick] = plan
 
+    def _windows_at(self, branch, turn, tick):
+        """Return the windows of history needed to look at this time
+
+        That's a dictionary keyed by graph and branch, with values
+        ``(turn_from, tick_from, turn_to, tick_to)``. For each graph, the
+        windows go from its latest keyframe to the given time, following
+        the branch back to its ancestors as needed. ``turn_to`` and
+        ``tick_to`` are ``None`` for the given branch, since anything
+        that happens later in it may be wanted too.
+
+        """
+        # trunk's parent is None
+        lineage = [
+            btt for btt in self._iter_parent_btt(branch, turn, tick)
+            if btt[0] is not None
+        ]
+        branches = self._branches
+        keyframes_times = self._keyframes_times
+        windows = {}
+        for graph in self._graph_objs:
+            kfs = keyframes_times.get(graph, ())
+            turn_to = tick_to = None
+            for (b, r, t) in lineage:
+                kftimes = [
+                    (kr, kt) for (kb, kr, kt) in kfs
+                    if kb == b and (kr, kt) <= (r, t)
+                ]
+                if kftimes:
+                    windows[graph, b] = max(kftimes) + (turn_to, tick_to)
+                    break
+                windows[graph, b] = branches[b][1:3] + (turn_to, tick_to)
+                turn_to, tick_to = r, t
+        return windows
+
+    def _load_at(self, branch, turn, tick):
+        """Make sure my caches have everything that's true at this time
+
+        Only does anything if I was instantiated with ``lazy=True``.
+
+        """
+        if not self._lazy:
+            return
+        branch_loaded = self._branch_loaded
+        loaded = self._loaded
+        if branch in branch_loaded and branch_loaded[branch] <= (turn, tick):
+            # so that _shrink_caches knows what was used last
+            for k in self._branch_windows[branch]:
+                loaded.move_to_end(k)
+            return
+        windows = self._windows_at(branch, turn, tick)
+        # the parts of each window that aren't loaded yet, with inclusive
+        # bounds, as the window queries take them
+        todo = []
+        for k, (turn_from, tick_from, turn_to, tick_to) in windows.items():
+            if k not in loaded:
+                loaded[k] = turn_from, tick_from, turn_to, tick_to
+                todo.append(k + loaded[k])
+                continue
+            turn_from_0, tick_from_0, turn_to_0, tick_to_0 = loaded[k]
+            start = min((turn_from, tick_from), (turn_from_0, tick_from_0))
+            if start < (turn_from_0, tick_from_0):
+                todo.append(k + start + (turn_from_0, tick_from_0 - 1))
+            if turn_to_0 is None:
+                end = (None, None)
+            elif turn_to is None:
+                end = (None, None)
+                todo.append(k + (turn_to_0, tick_to_0 + 1, None, None))
+            else:
+                end = max((turn_to, tick_to), (turn_to_0, tick_to_0))
+                if end > (turn_to_0, tick_to_0):
+                    todo.append(k + (turn_to_0, tick_to_0 + 1) + end)
+            loaded[k] = start + end
+            loaded.move_to_end(k)
+        if todo:
+            self._load_windows(todo)
+            if self._over_cache_budget():
+                self._shrink_caches(windows)
+        branch_loaded[branch] = max(
+            (windows[graph, branch][:2] for graph in self._graph_objs
+             if (graph, branch) in windows),
+            default=self._branches[branch][1:3]
+        )
+        self._branch_windows[branch] = list(windows)
+
+    def _window_caches(self):
+        """Return the caches that get loaded a window at a time
+
+        These are the ones ``cache_budget`` limits.
+
+        """
+        return (
+            self._nodes_cache, self._edges_cache, self._graph_val_cache,
+            self._node_val_cache, self._edge_val_cache
+        )
+
+    def _over_cache_budget(self):
+        budget = self.cache_budget
+        return budget is not None and any(
+            len(cache.time_entity) > budget
+            for cache in self._window_caches()
+        )
+
+    def _snap_keyframe_for_shrink(self):
+        now = self._btt()
+        keyframes_times = self._keyframes_times
+        if any(now not in keyframes_times[graph] for graph in self.graph):
+            self.snap_keyframe()
+
+    def _shrink_caches(self, keep=None):
+        """Forget history until each cache holds half ``cache_budget``
+
+        Whole windows of history go first, starting with the one that
+        was used longest ago, and then the parts of the windows that the
+        present doesn't need. The windows that the present needs, and
+        any in ``keep``, which is like what :meth:`_windows_at` returns,
+        stay. What's forgotten gets loaded again when time travel needs
+        it.
+
+        Call this after committing, and after snapping a keyframe of the
+        present, so that what the present needs is not much.
+
+        """
+        needed = self._windows_at(*self._btt())
+        for k, window in (keep or {}).items():
+            if k not in needed:
+                needed[k] = window
+                continue
+            turn_from, tick_from, turn_to, tick_to = needed[k]
+            start = min((turn_from, tick_from), window[:2])
+            if turn_to is None or window[2] is None:
+                end = (None, None)
+            else:
+                end = max((turn_to, tick_to), window[2:])
+            needed[k] = start + end
+        target = self.cache_budget // 2
+        caches = self._window_caches()
+        sizes = [len(cache.time_entity) for cache in caches]
+        window_sizes = self._window_sizes(caches)
+        loaded = self._loaded
+        forget = []
+        for k in list(loaded):
+            if all(size <= target for size in sizes):
+                break
+            if k in needed:
+                continue
+            forget.append(k + loaded.pop(k))
+            for i, size in enumerate(window_sizes.get(k, ())):
+                sizes[i] -= size
+        if any(size > target for size in sizes):
+            for k, (turn_from, tick_from, turn_to, tick_to) \
+                    in needed.items():
+                if k not in loaded:
+                    continue
+                turn_from_0, tick_from_0, turn_to_0, tick_to_0 = loaded[k]
+                if (turn_from_0, tick_from_0) < (turn_from, tick_from):
+                    forget.append(
+                        k + (turn_from_0, tick_from_0, turn_from, tick_from - 1))
+                else:
+                    turn_from, tick_from = turn_from_0, tick_from_0
+                if turn_to is not None and (
+                        turn_to_0 is None
+                        or (turn_to_0, tick_to_0) > (turn_to, tick_to)):
+                    forget.append(k + (turn_to, tick_to + 1, turn_to_0, tick_to_0))
+                else:
+                    turn_to, tick_to = turn_to_0, tick_to_0
+                loaded[k] = turn_from, tick_from, turn_to, tick_to
+        if forget:
+            self._forget_windows(forget)
+        self._branch_loaded.clear()
+        self._branch_windows.clear()
+
+    def _window_sizes(self, caches):
+        """Return how many changes each of ``caches`` has in each window
+
+        Keyed by graph and branch, with a list of numbers in the same
+        order as ``caches``.
+
+        """
+        sizes = {}
+        for i, cache in enumerate(caches):
+            for (branch, _, _), (parent, entity, _) \
+                    in cache.time_entity.items():
+                k = (parent or (entity,))[0], branch
+                if k not in sizes:
+                    sizes[k] = [0] * len(caches)
+                sizes[k][i] += 1
+        return sizes
+
+    def _forget_windows(self, windows):
+        """Drop the history in ``windows`` from my caches
+
+        ``windows`` is a list like :meth:`_load_windows` takes.
+
+        """
+        for cache in self._window_caches():
+            cache.forget(windows)
+
+    def _load_new_branch(self, branch, turn, tick):
+        """Note that a branch I've just made has no history to load"""
+        if not self._lazy:
+            return
+        loaded = self._loaded
+        for graph in self._graph_objs:
+            loaded[graph, branch] = turn, tick, None, None
+
+    def _load_windows(self, windows):
+        """Load the history in ``windows`` into my caches
+
+        ``windows`` is a list of tuples of a graph, branch, and the
+        ``turn_from, tick_from, turn_to, tick_to`` to load, inclusive,
+        with ``turn_to=None`` for everything after. They may be earlier
+        or later than what I have loaded already, but mustn't overlap it.
+        The keyframe at the start of each window gets loaded too, if
+        there is one.
+
+        Anything not yet committed gets flushed to the database first, so
+        it's loaded back in along with the rest.
+
+        """
+        caches = (
+            self._nodes_cache, self._edges_cache, self._graph_val_cache,
+            self._node_val_cache, self._edge_val_cache
+        )
+        q = self.query
+        snap_keyframe = self._snap_keyframe
+        keyframes_times = self._keyframes_times
+        new_keyframes = self._new_keyframes
+        noderows = []
+        edgerows = []
+        graphvalrows = []
+        nodevalrows = []
+        edgevalrows = []
+        for window in windows:
+            graph, branch, turn_from, tick_from = window[:4]
+            if (graph, branch, turn_from, tick_from) in new_keyframes:
+                snap_keyframe(
+                    graph, branch, turn_from, tick_from,
+                    *new_keyframes[graph, branch, turn_from, tick_from])
+            elif (branch, turn_from, tick_from) in keyframes_times[graph]:
+                kf = q.get_keyframe(graph, branch, turn_from, tick_from)
+                if kf is not None:
+                    snap_keyframe(graph, branch, turn_from, tick_from, *kf)
+            noderows.extend(q.nodes_window(*window))
+            edgerows.extend(q.edges_window(*window))
+            graphvalrows.extend(q.graph_val_window(*window))
+            nodevalrows.extend(q.node_val_window(*window))
+            edgevalrows.extend(q.edge_val_window(*window))
+        # the rows are grouped by graph, but the caches need them
+        # in chronological order
+        when = itemgetter(-3, -2)
+        for rows, cache in zip(
+            (noderows, edgerows, graphvalrows, nodevalrows, edgevalrows),
+            caches
+        ):
+            if not rows:
+                continue
+            rows.sort(key=when)
+            # what I worked out from the history I had may not hold
+            # with the new rows put before it
+            cache.forget_memos()
+            cache.load(rows)
+
     def __enter__(self):
         """Enable the use of the ``with`` keyword"""
         return self
@@ -779,6 +1084,8 @@ class ORM(object):
         self._otick = self._turn_end_plan[v, curturn]
         if branch_is_new:
             self._copy_plans(curbranch, curturn, curtick)
+            self._load_new_branch(v, curturn, curtick)
+        self._load_at(v, curturn, self._otick)
 
     def _copy_plans(self, branch_from, turn_from, tick_from):
         """Collect all plans that are active at the given time and copy them to the current branch"""
@@ -882,6 +1189,7 @@ class ORM(object):
                 )
         self._otick = tick
         self._oturn = v
+        self._load_at(branch, v, tick)
 
     # easier to override things this way
     @property
@@ -911,6 +1219,7 @@ class ORM(object):
             if turn == turn_end and v > tick_end:
                 self._branches[branch] = parent, turn_start, tick_start, turn, v
         self._otick = v
+        self._load_at(branch, turn, v)
 
     # easier to override things this way
     @property
@@ -956,6 +1265,9 @@ class ORM(object):
             raise HistoryError(
                 "You're in the past. Go to turn {}, tick {} to change things".format(turn_end, tick_end)
             )
+        if turn > turn_end and not self._planning:
+            # nothing can change before this turn anymore
+            self._snap_keyframe_if_due(turn_end, turn)
         if self._planning:
             last_plan = self._last_plan
             if (turn, tick) in plan_ticks[last_plan]:
@@ -970,12 +1282,78 @@ class ORM(object):
         self._otick = tick
         return branch, turn, tick
 
+    def _nbtts(self, n):
+        """Increment the tick ``n`` times; return branch, turn, and the ticks
+
+        The ticks are a ``range``. Raise HistoryError in the same cases
+        as :meth:`_nbtt`.
+
+        """
+        branch, turn, start = self._nbtt()
+        end = start + n - 1
+        if end > start:
+            (btt, turn_end_plan, turn_end, plan_ticks, plan_ticks_uncommitted,
+             time_plan, branches) = self._nbtt_stuff
+            if self._planning:
+                last_plan = self._last_plan
+                for tick in range(start + 1, end + 1):
+                    plan_ticks[last_plan][turn].append(tick)
+                    plan_ticks_uncommitted.append((last_plan, turn, tick))
+                    time_plan[branch, turn, tick] = last_plan
+            turn_end_plan[branch, turn] = end
+            parent, turn_start, tick_start, turn_end, _ = branches[branch]
+            branches[branch] = parent, turn_start, tick_start, turn_end, end
+            self._otick = end
+        return branch, turn, range(start, end + 1)
+
+    def _store_many(self, batches):
+        """Store lots of new state, each value at a tick of its own
+
+        ``batches`` is a list of triples: a cache; a function that takes
+        a list of rows for that cache and saves them in the database;
+        and a list of tuples like the arguments to the cache's ``store``,
+        but without the branch, turn, and tick. Those are the present
+        branch and turn, and ticks taken all at once, in the order given.
+
+        Unless there's a plan for later that the new state could
+        contradict, each cache gets all of its rows at once, and updates
+        its keycache once for each entity, rather than once for each row.
+
+        """
+        n = sum(len(rows) for (_, _, rows) in batches)
+        if not n:
+            return
+        branch, turn, ticks = self._nbtts(n)
+        plan_ticks = self._plan_ticks
+        contra = self._planning or any(
+            trn > turn for plan in self._branches_plans.get(branch, ())
+            for trn in plan_ticks.get(plan, ())
+        )
+        ticks = iter(ticks)
+        for cache, save, rows in batches:
+            if not rows:
+                continue
+            rows = [row[:-1] + (branch, turn, next(ticks), row[-1])
+                    for row in rows]
+            if contra:
+                store = cache.store
+                for row in rows:
+                    store(*row)
+            else:
+                cache.store_many(rows)
+            save(rows)
+        if not contra:
+            self._turn_end[branch, turn] = self._otick
+
     def commit(self):
         """Write the state of all graphs to the database and commit the transaction.
 
         Also saves the current branch, turn, and tick.
 
         """
+        shrink = self._over_cache_budget()
+        if shrink:
+            self._snap_keyframe_for_shrink()
         self.query.globl['branch'] = self._obranch
         self.query.globl['turn'] = self._oturn
         self.query.globl['tick'] = self._otick
@@ -991,19 +1369,19 @@ class ORM(object):
         if self._plan_ticks_uncommitted:
             self.query.plan_ticks_insert_many(self._plan_ticks_uncommitted)
         kf_ins = self.query.keyframes_insert
-        graphmap = self.graph
-        for graphn, branch, turn, tick in self._new_keyframes:
-            graph = graphmap[graphn]
-            kf_ins(graphn, branch, turn, tick,
-                    graph._nodes_state(), graph._edges_state(),
-                    graph._val_state())
-        self._new_keyframes = []
+        for (graphn, branch, turn, tick), (nodes, edges, graph_val) \
+                in self._new_keyframes.items():
+            kf_ins(graphn, branch, turn, tick, nodes, edges, graph_val)
+        self._new_keyframes = {}
         self.query.commit()
         self._plans_uncommitted = []
         self._plan_ticks_uncommitted = []
+        if shrink:
+            self._shrink_caches()
 
     def close(self):
         """Write changes to database and close the connection"""
+        self.cache_budget = None  # no sense shrinking caches on the way out
         self.commit()
         self.query.close()
 
@@ -1013,21 +1391,25 @@ class ORM(object):
         if name in self.illegal_graph_names:
             raise GraphNameError("Illegal name")
         self.query.new_graph(name, type_s)
+        if self._lazy:
+            branch, turn, tick = self._btt()
+            self._loaded[name, branch] = turn, tick, None, None
         if data:
             branch, turn, tick = self._btt()
             if isinstance(data, DiGraph):
-                self._snap_keyframe(name, branch, turn, tick, data._node_state(), data._edges_state(), data._val_state())
+                state = (data._nodes_state(), data._edges_state(), data._val_state())
             elif isinstance(data, nx.Graph):
-                self._snap_keyframe(name, branch, turn, tick, data._node, data._adj, data.graph)
+                state = (data._node, data._adj, data.graph)
             elif isinstance(data, dict):
                 try:
                     data = nx.from_dict_of_dicts(data)
                 except AttributeError:
                     data = nx.from_dict_of_lists(data)
-                self._snap_keyframe(name, branch, turn, tick, data._node, data._adj, data.graph)
+                state = (data._node, data._adj, data.graph)
             else:
-                self._snap_keyframe(name, branch, turn, tick, *data)
-            self._new_keyframes.add((name, branch, turn, tick))
+                state = tuple(data)
+            self._snap_keyframe(name, branch, turn, tick, *state)
+            self._new_keyframes[name, branch, turn, tick] = state
 
     def new_graph(self, name, data=None, **attr):
         """Return a new instance of type Graph, initialized with the given
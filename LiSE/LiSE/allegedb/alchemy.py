@@ -189,6 +189,43 @@ def indices_for_table_dict(table):
     return {}
 
 
+def window_queries(t, graph_col='graph'):
+    """Return queries for the history of one graph in one branch
+
+    ``t`` is the table to query, and ``graph_col`` the name of its column
+    for the graph. The query named ``t.name + '_window'`` gets everything
+    between two times, inclusive; the one named ``t.name + '_after'``
+    gets everything from one time on.
+
+    """
+    graph = t.columns[graph_col]
+    after = and_(
+        graph == bindparam('graph'),
+        t.c.branch == bindparam('branch'),
+        or_(
+            t.c.turn > bindparam('turn_from'),
+            and_(
+                t.c.turn == bindparam('turn_from'),
+                t.c.tick >= bindparam('tick_from')
+            )
+        )
+    )
+    before = or_(
+        t.c.turn < bindparam('turn_to'),
+        and_(
+            t.c.turn == bindparam('turn_to'),
+            t.c.tick <= bindparam('tick_to')
+        )
+    )
+    cols = list(t.c.values())
+    return {
+        t.name + '_window': select(cols).where(
+            and_(after, before)).order_by(t.c.turn, t.c.tick),
+        t.name + '_after': select(cols).where(after).order_by(
+            t.c.turn, t.c.tick)
+    }
+
+
 def queries_for_table_dict(table):
     r = {
         'global_get': select(
@@ -308,8 +345,30 @@ def queries_for_table_dict(table):
         ).where(and_(
             table['turns'].c.branch == bindparam('branch'),
             table['turns'].c.turn == bindparam('turn')
+        )),
+        'keyframes_list': select([
+            table['keyframes'].c.graph,
+            table['keyframes'].c.branch,
+            table['keyframes'].c.turn,
+            table['keyframes'].c.tick
+        ]).order_by(
+            table['keyframes'].c.branch,
+            table['keyframes'].c.turn,
+            table['keyframes'].c.tick
+        ),
+        'get_keyframe': select([
+            table['keyframes'].c.nodes,
+            table['keyframes'].c.edges,
+            table['keyframes'].c.graph_val
+        ]).where(and_(
+            table['keyframes'].c.graph == bindparam('graph'),
+            table['keyframes'].c.branch == bindparam('branch'),
+            table['keyframes'].c.turn == bindparam('turn'),
+            table['keyframes'].c.tick == bindparam('tick')
         ))
     }
+    for tabn in ('nodes', 'edges', 'graph_val', 'node_val', 'edge_val'):
+        r.update(window_queries(table[tabn]))
     for t in table.values():
         key = list(t.primary_key)
         if 'branch' in t.columns and 'turn' in t.columns and 'tick' in t.columns:
@@ -0,0 +1,113 @@
+# This file is part of allegedb, an object relational mapper for versioned graphs.
+# Copyright (C) Zachary Spector. public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Time looking things up in history.
+
+``window`` and ``cache`` are where allegedb spends most of its time, and
+they get compiled with Cython if it's installed when LiSE is. Run::
+
+    python -m LiSE.allegedb.benchmark
+
+to see whether they were, and how long some lookups take. Compare the
+timings with those you get after installing with ``LISE_PURE_PYTHON=1``
+to see what compiling them is worth.
+
+"""
+import random
+from timeit import default_timer
+
+from . import ORM, cache, window
+from .window import ArrayWindowDict, WindowDict
+
+
+def compiled():
+    """Return a dictionary of whether each of the compiled modules was"""
+    return {
+        'window': window.COMPILED,
+        'cache': cache.COMPILED
+    }
+
+
+def bench_window(revs=1000, lookups=20000, seed=0):
+    """Return a dictionary of how many seconds it took to look up values
+    in window dictionaries of ``revs`` revisions, in random order and in
+    sequence"""
+    rando = random.Random(seed)
+    ret = {}
+    for cls in (WindowDict, ArrayWindowDict):
+        wd = cls({rev * 2: rev for rev in range(revs)})
+        randrevs = [rando.randrange(revs * 2) for _ in range(lookups)]
+        seqrevs = [i * revs * 2 // lookups for i in range(lookups)]
+        for name, revz in (('random', randrevs), ('sequential', seqrevs)):
+            start = default_timer()
+            for rev in revz:
+                wd[rev]
+            ret['{}_{}'.format(cls.__name__, name)] \
+                = default_timer() - start
+    return ret
+
+
+def bench_retrieve(nodes=200, turns=200, seed=0):
+    """Return a dictionary of how many seconds it took to look up every
+    stat of every node in a graph, at every turn of its history
+
+    Each turn, a tenth of the nodes change. Halfway through, the history
+    branches, so the later lookups need to look in the parent branch
+    too. The lookups are done twice: once straight from the cache, and
+    once by time travelling and reading the graph.
+
+    """
+    rando = random.Random(seed)
+    ret = {}
+    with ORM('sqlite:///:memory:') as orm:
+        g = orm.new_digraph('g')
+        g.add_nodes_from(range(nodes), x=0)
+        for turn in range(1, turns):
+            if turn == turns // 2:
+                orm.branch = 'b'
+            orm.turn = turn
+            for node in rando.sample(range(nodes), nodes // 10):
+                g.node[node]['x'] = turn
+        node_val_cache = orm._node_val_cache
+        retrieve = node_val_cache.retrieve
+        times = [('trunk', turn) for turn in range(turns // 2)] + [
+            ('b', turn) for turn in range(turns // 2, turns)]
+        node_val_cache.shallowest.clear()
+        start = default_timer()
+        for branch, turn in times:
+            for node in range(nodes):
+                retrieve('g', node, 'x', branch, turn, 0)
+        ret['retrieve'] = default_timer() - start
+        node_val_cache.shallowest.clear()
+        start = default_timer()
+        for branch, turn in times:
+            orm.branch = branch
+            orm.turn = turn
+            for node in g.node.values():
+                dict(node)
+        ret['time_travel'] = default_timer() - start
+    return ret
+
+
+def main():
+    print('compiled:', ', '.join(
+        name for (name, comp) in compiled().items() if comp) or 'nothing')
+    for bench in (bench_window, bench_retrieve):
+        for name, secs in bench().items():
+            print('{}: {:.3f}s'.format(name, secs))
+
+
+if __name__ == '__main__':
+    main()
@@ -15,9 +15,20 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Classes for in-memory storage and retrieval of historical graph data.
 """
-from .window import WindowDict, HistoryError, FuturistWindowDict, TurnDict, SettingsTurnDict
+from .window import (
+    WindowDict, HistoryError, FuturistWindowDict, ArrayWindowDict, TurnDict,
+    SettingsTurnDict
+)
 from collections import OrderedDict, defaultdict, deque
 from time import monotonic
+try:
+    import cython
+except ImportError:
+    class cython:
+        compiled = False
+
+# whether this module's been compiled with Cython
+COMPILED = cython.compiled
 
 
 def _default_args_munger(self, k):
@@ -180,13 +191,79 @@ def lru_append(kc, lru, kckey, maxsize):
     lru[kckey] = True
 
 
+def keycache_set(kc, lru, kckey, keys, maxsize):
+    """Put the frozenset ``keys`` into ``kc`` at ``kckey``
+
+    :param kc: a three-layer keycache
+    :param lru: an :class:`OrderedDict` with a key for each triple that should fill out ``kc``'s three layers
+    :param kckey: a triple that indexes into ``kc``
+    :param keys: the frozenset of keys that exist at that time
+    :param maxsize: maximum number of entries in ``lru`` and, therefore, ``kc``
+
+    """
+    lru_append(kc, lru, kckey, maxsize)
+    peb, turn, tick = kckey
+    if peb in kc:
+        kcpeb = kc[peb]
+        if turn in kcpeb:
+            kcpeb[turn][tick] = keys
+            return
+    else:
+        kcpeb = kc[peb] = SettingsTurnDict()
+    kcpeb[turn] = {tick: keys}
+
+
+def _latest(turns, turn, tick):
+    """Return ``((turn, tick), value)`` for the latest revision in ``turns``
+    at or before the given time, or ``None`` if there isn't one
+
+    ``tick`` may be ``None``, meaning the end of the turn.
+
+    """
+    if not turns or not turns.rev_gettable(turn):
+        return
+    if turn in turns:
+        ticks = turns[turn]
+        if tick is None:
+            return (turn, ticks.end), ticks.final()
+        if ticks.rev_gettable(tick):
+            return (turn, ticks.rev_before(tick)), ticks[tick]
+    if not turns.rev_gettable(turn - 1):
+        return
+    turn = turns.rev_before(turn - 1)
+    ticks = turns[turn]
+    return (turn, ticks.end), ticks.final()
+
+
+def _without_ticks(turns, doomed):
+    """Return a copy of ``turns`` without the ticks that ``doomed`` picks
+
+    ``doomed`` takes a turn, tick, and value, and returns whether to
+    leave them out. Turns that keep all their ticks stay the same
+    objects. If no ticks are left at all, return ``None``.
+
+    """
+    kept = []
+    for turn, ticks in turns.items():
+        kept_ticks = [
+            (tick, value) for (tick, value) in ticks.items()
+            if not doomed(turn, tick, value)
+        ]
+        if len(kept_ticks) == len(ticks):
+            kept.append((turn, ticks))
+        elif kept_ticks:
+            kept.append((turn, type(ticks)(kept_ticks)))
+    if kept:
+        return type(turns)(kept)
+
+
 class Cache:
     """A data store that's useful for tracking graph revisions."""
     __slots__ = (
         'db', 'parents', 'keys', 'keycache', 'branches', 'shallowest',
         'settings', 'presettings', 'time_entity', '_kc_lru',
         '_store_stuff', '_remove_stuff', '_truncate_stuff',
-        'setdb', 'deldb', 'keyframe', 'name'
+        'setdb', 'deldb', 'keyframe', 'name', 'retrievals', 'reads'
     )
 
     def __init__(self, db, kfkvs=None):
@@ -231,6 +308,11 @@ class Cache:
         self.presettings = PickyDefaultDict(SettingsTurnDict)
         """The values prior to ``entity[key] = value`` operations performed on some turn"""
         self.time_entity = {}
+        self.retrievals = None
+        """While I'm counting retrievals, how many were found in
+        ``shallowest``, and how many had to look through history"""
+        self.reads = None
+        """While I'm recording reads, the set to add them to"""
         self._kc_lru = OrderedDict()
         self._store_stuff = (
             self.parents, self.branches, self.keys, db.delete_plan,
@@ -264,15 +346,110 @@ class Cache:
         childbranch = db._childbranch
         branch2do = deque(['trunk'])
 
-        store = self.store
+        if self._loads_fast():
+            load_rows = self._load_rows
+        else:
+            store = self.store
+
+            def load_rows(rows):
+                for row in rows:
+                    store(*row, planning=False, loading=True)
         with db.batch():
             while branch2do:
                 branch = branch2do.popleft()
-                for row in branches[branch]:
-                    store(*row, planning=False, loading=True)
+                if branch in branches:
+                    load_rows(branches.pop(branch))
                 if branch in childbranch:
                     branch2do.extend(childbranch[branch])
 
+    def _loads_fast(self):
+        """Whether :meth:`_load_rows` does what my ``store`` would when loading
+
+        Subclasses that add to ``store`` or ``_store_journal``, and don't
+        say how to load without them, have to load one row at a time.
+
+        """
+        cls = type(self)
+        for base in (EdgesCache, NodesCache, Cache):
+            if issubclass(cls, base):
+                return cls.store is base.store \
+                    and cls._load_rows is base._load_rows \
+                    and cls._store_journal is Cache._store_journal
+        return False
+
+    def _load_rows(self, rows):
+        """Put chronological rows from one branch into my dictionaries
+
+        This does what ``store(*row, planning=False, loading=True)``
+        would, without the work that's only needed when history is being
+        made, rather than loaded: there can be no contradictions, the
+        keycache is off during loading, and the only previous value a
+        row can have is the one in the row before it. The rows may be
+        earlier than what I have already, as when a lazy ORM loads an
+        earlier window of history.
+
+        """
+        parents = self.parents
+        branches = self.branches
+        keys = self.keys
+        settings = self.settings
+        presettings = self.presettings
+        time_entity = self.time_entity
+        where_cached = self.db._where_cached
+        keycache = self.keycache
+        base_retrieve = self._base_retrieve
+        shallowest = self.shallowest
+        for row in rows:
+            parent = row[:-6]
+            entity, key, branch, turn, tick, value = row[-6:]
+            parentikey = parent + (entity, key)
+            if parentikey in branches:
+                turns = branches[parentikey][branch]
+            else:
+                if parent:
+                    entbranches = parents[parent][entity][key]
+                else:
+                    entbranches = branches[parentikey]
+                branches[parentikey] = keys[parent + (entity,)][key] \
+                    = entbranches
+                turns = entbranches[branch]
+            if turns and (turn, tick) > (turns.end, turns.final().end):
+                prev = turns.final().final()
+            else:
+                prev = base_retrieve(row[:-1])
+                if prev is KeyError:
+                    prev = None
+                # it's out of date as soon as the row is in
+                shallowest.pop(row[:-1], None)
+            settings_turns = settings[branch]
+            if turn in settings_turns:
+                settings_turns[turn][tick] = parent + (entity, key, value)
+                presettings[branch][turn][tick] = parent + (entity, key, prev)
+            else:
+                settings_turns[turn] = {tick: parent + (entity, key, value)}
+                presettings[branch][turn] = {
+                    tick: parent + (entity, key, prev)}
+            # rows from an earlier window of history go before the ones
+            # I have, which the futurist dictionaries wouldn't allow
+            if turn in turns:
+                WindowDict.__setitem__(turns[turn], tick, value)
+            else:
+                ArrayWindowDict.__setitem__(
+                    turns, turn, FuturistWindowDict({tick: value}))
+            time_entity[branch, turn, tick] = parent, entity, key
+            cached = where_cached[branch, turn, tick]
+            if self not in cached:
+                cached.append(self)
+            if keycache:
+                keycache_key = parent + (entity, branch)
+                if keycache_key in keycache:
+                    thiskeycache = keycache[keycache_key]
+                    if turn in thiskeycache:
+                        del thiskeycache[turn]
+                    thiskeycache.truncate(turn)
+                    if not thiskeycache:
+                        del keycache[keycache_key]
+
     def _valcache_lookup(self, cache, branch, turn, tick):
         """Return the value at the given time in ``cache``"""
         if branch in cache:
@@ -422,6 +599,16 @@ class Cache:
         added = set()
         deleted = set()
         kf = self.keyframe.get(entity, None)
+        if stoptime is None and kf:
+            # start from the latest keyframe, so I only have to look
+            # at history since then
+            kftime, kfkeys = self._latest_keyframe(kf, branch, turn, tick)
+            if kftime is not None:
+                added, deleted = self._get_adds_dels(
+                    entity, branch, turn, tick, stoptime=kftime, cache=cache)
+                return {
+                    k for (k, v) in kfkeys.items() if v is not None
+                }.union(added).difference(deleted), deleted
         for key, branches in cache.items():
             for (branc, trn, tck) in self.db._iter_parent_btt(branch, turn, tick, stoptime=stoptime):
                 if branc not in branches \
@@ -461,6 +648,188 @@ class Cache:
                     added.update(set(kfb[trn].final()).difference(deleted))
         return added, deleted
 
+    def _latest_keyframe(self, kf, branch, turn, tick):
+        """Find the latest keyframe in ``kf`` at or before the given time
+
+        Return a pair of the keyframe's ``(branch, turn, tick)`` and the
+        keyframe itself, or ``(None, None)`` if there isn't one.
+
+        """
+        for (b, r, t) in self.db._iter_parent_btt(branch, turn, tick):
+            if b not in kf:
+                continue
+            kfb = kf[b]
+            if not kfb.rev_gettable(r):
+                continue
+            if r in kfb:
+                kfbr = kfb[r]
+                if kfbr.rev_gettable(t):
+                    return (b, r, kfbr.rev_before(t)), kfbr[t]
+                if not kfb.rev_gettable(r - 1):
+                    continue
+                r = kfb.rev_before(r - 1)
+            else:
+                r = kfb.rev_before(r)
+            kfbr = kfb[r]
+            return (b, r, kfbr.end), kfbr.final()
+        return None, None
+
+    def set_keyframe(self, entity, branch, turn, tick, keyframe):
+        """Record the complete state of ``entity`` at the given time
+
+        ``entity`` is a tuple, as in the arguments to ``retrieve``, and
+        ``keyframe`` is a dictionary of every key it has then.
+
+        """
+        kfb = self.keyframe[entity][branch]
+        if turn in kfb:
+            kfb[turn][tick] = keyframe
+        else:
+            kfb[turn] = {tick: keyframe}
+
+    def forget_memos(self):
+        """Forget what I've worked out from my history, but not the history
+
+        That's the keycache and the values looked up most recently.
+
+        """
+        self.keycache.clear()
+        self._kc_lru.clear()
+        self.shallowest = OrderedDict()
+
+    def forget(self, windows):
+        """Drop the history in some windows of time
+
+        ``windows`` is a list of tuples of a graph, branch, and the
+        ``turn_from, tick_from, turn_to, tick_to`` to drop, inclusive,
+        with ``turn_to=None`` for everything after, as
+        :meth:`LiSE.allegedb.ORM._load_windows` takes them. Keyframes
+        in the windows go too. It's all still in the database, for when
+        it's wanted again.
+
+        """
+        spans = defaultdict(list)
+        for graph, branch, turn_from, tick_from, turn_to, tick_to in windows:
+            spans[graph, branch].append((
+                (turn_from, tick_from),
+                None if turn_to is None else (turn_to, tick_to)
+            ))
+
+        def doomed(graph, branch, turn, tick):
+            if (graph, branch) not in spans:
+                return False
+            for start, end in spans[graph, branch]:
+                if start <= (turn, tick) and (
+                        end is None or (turn, tick) <= end):
+                    return True
+            return False
+
+        def forget_turns(branchd, branch, doomed_tick):
+            if branch not in branchd:
+                return
+            turns = _without_ticks(branchd[branch], doomed_tick)
+            if turns is None:
+                del branchd[branch]
+            else:
+                branchd[branch] = turns
+
+        graph_branches = defaultdict(list)
+        for graph, branch in spans:
+            graph_branches[graph].append(branch)
+        for entity, keyd in self.keys.items():
+            graph = entity[0]
+            for branch in graph_branches.get(graph, ()):
+                for branchd in keyd.values():
+                    forget_turns(
+                        branchd, branch,
+                        lambda turn, tick, _: doomed(graph, branch, turn, tick)
+                    )
+        for entity, branchd in self.keyframe.items():
+            graph = entity[0]
+            for branch in graph_branches.get(graph, ()):
+                forget_turns(
+                    branchd, branch,
+                    lambda turn, tick, _: doomed(graph, branch, turn, tick)
+                )
+        # settings are keyed by branch, and start with the graph
+        for branch in {branch for (_, branch) in spans}:
+            for settings in (self.settings, self.presettings):
+                forget_turns(
+                    settings, branch,
+                    lambda turn, tick, setting: doomed(
+                        setting[0], branch, turn, tick)
+                )
+        time_entity = self.time_entity
+        where_cached = self.db._where_cached
+        for time, (parent, entity, key) in list(time_entity.items()):
+            if doomed((parent or (entity,))[0], *time):
+                del time_entity[time]
+                cached = where_cached.get(time)
+                if cached and self in cached:
+                    cached.remove(self)
+                    if not cached:
+                        del where_cached[time]
+        self.forget_memos()
+
+    def clear(self):
+        """Forget everything, so that I can be loaded again"""
+        for d in (
+            self.parents, self.keys, self.keycache, self.branches,
+            self.keyframe, self.settings, self.presettings,
+            self.time_entity, self._kc_lru
+        ):
+            d.clear()
+        self.shallowest = OrderedDict()
+
+    def store_many(self, rows, *, forward=None):
+        """Store a lot of rows, each like the arguments to :meth:`store`
+
+        They must be in chronological order, and later than anything
+        I have for their keys, so that there's nothing to contradict.
+        If I load fast, they go in the way they would when loading, and
+        the keycache is updated once for each entity, at the last of its
+        rows, rather than for every row.
+
+        """
+        if not self._loads_fast():
+            store = self.store
+            for row in rows:
+                store(*row, forward=forward, contra=False)
+            return
+        self._store_rows(rows, forward=forward)
+
+    def _store_rows(self, rows, *, forward=None):
+        """Load ``rows`` and update the keycache for the lot"""
+        db = self.db
+        if forward is None:
+            forward = db._forward
+        keysets = {}
+        if not db._no_kc:
+            get_keycache = self._get_keycache
+            for row in rows:
+                parentity = row[:-5]
+                if parentity not in keysets:
+                    branch, turn, tick = row[-4:-1]
+                    keysets[parentity] = set(get_keycache(
+                        parentity, branch, turn, tick - 1, forward=forward))
+        self._load_rows(rows)
+        if not keysets:
+            return
+        lasts = {}
+        for row in rows:
+            parentity = row[:-5]
+            if row[-1] is None:
+                keysets[parentity].discard(row[-5])
+            else:
+                keysets[parentity].add(row[-5])
+            lasts[parentity] = row[-4:-1]
+        keycache = self.keycache
+        lru = self._kc_lru
+        for parentity, keys in keysets.items():
+            branch, turn, tick = lasts[parentity]
+            keycache_set(keycache, lru, (parentity + (branch,), turn, tick),
+                         frozenset(keys), KEYCACHE_MAXSIZE)
+
     def store(self, *args, planning=None, forward=None, loading=False, contra=True):
         """Put a value in various dictionaries for later .retrieve(...).
 
@@ -889,6 +1258,159 @@ class Cache:
             raise ret
         return ret
 
+    def count_retrievals(self):
+        """Start counting how many retrievals hit ``shallowest``, and how
+        many missed
+
+        The counts are in ``retrievals``, a list of hits and misses, until
+        :meth:`stop_counting_retrievals`. Only caches that are counting
+        do the extra work.
+
+        """
+        self.retrievals = [0, 0]
+        cls = type(self)
+        if cls not in _counting.values():
+            self.__class__ = _counting_class(cls)
+
+    def stop_counting_retrievals(self):
+        """Stop counting retrievals, and return the hits and misses"""
+        cls = type(self)
+        if cls in _counting.values():
+            self.__class__ = cls.__bases__[0]
+        ret = self.retrievals
+        self.retrievals = None
+        return ret
+
+    def record_reads(self, reads):
+        """Start adding what's read from me to the set ``reads``
+
+        Each read is a pair of me and the entity and key that was
+        retrieved, or the entity whose keys were looked at, or, for
+        reads I can't be specific about, part of the entity. Compare
+        them to the beginnings of the entity-and-key parts of my
+        ``settings`` to tell whether what was read has changed.
+
+        Stop with :meth:`stop_recording_reads`. If I'm recording
+        already, this just changes the set.
+
+        """
+        self.reads = reads
+        cls = type(self)
+        if cls not in _recording.values():
+            self.__class__ = _recording_class(cls)
+
+    def stop_recording_reads(self):
+        cls = type(self)
+        if cls in _recording.values():
+            self.__class__ = cls.__bases__[0]
+        self.reads = None
+
+    def _iter_lineage(self, branch, turn, tick):
+        """Iterate over ``(branch, turn, tick)`` for the given time, and
+        then the time it was in each ancestor branch
+
+        Unlike the ORM's ``_iter_parent_btt``, this starts from the given
+        time, not the present, and skips branches that began after it.
+        ``tick`` may be ``None``, meaning the end of the turn.
+
+        """
+        branches = self.db._branches
+        while branch is not None:
+            parent, turn_start, tick_start = branches.get(
+                branch, (None, 0, 0))[:3]
+            if turn > turn_start or (turn == turn_start and (
+                    tick is None or tick >= tick_start)):
+                yield branch, turn, tick
+                turn, tick = turn_start, tick_start
+            branch = parent
+
+    def _retrieve_at(self, entity, key, branch, turn, tick=None):
+        """Return the value of the key at the given time, or ``None`` if
+        it wasn't set
+
+        ``tick`` may be ``None``, meaning the end of the turn.
+
+        """
+        brancs = self.branches.get(entity + (key,), {})
+        keyframes = self.keyframe.get(entity, {})
+        for (b, r, t) in self._iter_lineage(branch, turn, tick):
+            found = _latest(brancs.get(b), r, t)
+            kf = _latest(keyframes.get(b), r, t)
+            if kf is not None and (found is None or kf[0] > found[0]):
+                return kf[1].get(key)
+            if found is not None:
+                return found[1]
+
+    def retrieve_history(self, *args):
+        """Return the values a key has had over a range of turns
+
+        Takes the same arguments as ``retrieve``, except that the last
+        two are the first and last turns of the range, rather than a turn
+        and a tick.
+
+        Returns a list of pairs of a turn and the value the key had at
+        the end of it: one for the first turn of the range, then one for
+        each later turn on which the value changed. Turns before the
+        branch began get their values from its parent. When the key
+        wasn't set, its value is ``None``.
+
+        This only looks at the cache, so it doesn't change the time.
+
+        """
+        entity = args[:-4]
+        key, branch, turn_from, turn_to = args[-4:]
+        if turn_to < turn_from:
+            return []
+        db = self.db
+        if getattr(db, '_lazy', False):
+            db._load_at(branch, turn_to, 0)
+            oldest, _, _ = next(self._iter_lineage(branch, turn_from, 0))
+            db._load_at(oldest, turn_from, 0)
+        brancs = self.branches.get(entity + (key,), {})
+        turns = set()
+        for (b, r, _) in self._iter_lineage(branch, turn_to, None):
+            if r <= turn_from:
+                break
+            turnd = brancs.get(b)
+            if not turnd:
+                continue
+            rev = turnd.rev_after(turn_from)
+            while rev is not None and rev <= r:
+                turns.add(rev)
+                rev = turnd.rev_after(rev)
+        ret = []
+        for turn in [turn_from] + sorted(turns):
+            val = self._retrieve_at(entity, key, branch, turn)
+            if ret and ret[-1][1] == val:
+                continue
+            ret.append((turn, val))
+        return ret
+
+    def iter_changes(self, branch, since, until, *, before=False):
+        """Iterate over the changes made in ``branch`` after the time
+        ``since``, up to and including ``until``
+
+        Those are pairs of a turn and a tick. The changes are tuples like
+        those in ``settings``, or, with ``before=True``, like those in
+        ``presettings``, with the values from before the changes. This
+        only looks at the cache, so in lazy mode, some changes might not
+        be loaded.
+
+        """
+        journal = self.presettings if before else self.settings
+        if branch not in journal:
+            return
+        turns = journal[branch]
+        turn = since[0] if since[0] in turns else turns.rev_after(since[0])
+        while turn is not None and turn <= until[0]:
+            for tick, change in turns[turn].items():
+                if (turn, tick) <= since:
+                    continue
+                if (turn, tick) > until:
+                    break
+                yield change
+            turn = turns.rev_after(turn)
+
     def iter_entities_or_keys(self, *args, forward=None):
         """Iterate over the keys an entity has, if you specify an entity.
 
@@ -935,6 +1457,90 @@ class Cache:
                     = contains_entity_or_key
 
 
+_counting = {}
+
+
+def _counting_class(cls):
+    """Return a subclass of the cache class ``cls`` that counts its
+    retrievals"""
+    if cls in _counting:
+        return _counting[cls]
+    base_retrieve = cls._base_retrieve
+
+    def _base_retrieve(self, args):
+        if args in self.shallowest:
+            self.retrievals[0] += 1
+        else:
+            self.retrievals[1] += 1
+        return base_retrieve(self, args)
+    ret = _counting[cls] = type(
+        'Counting' + cls.__name__, (cls,),
+        {'__slots__': (), '_base_retrieve': _base_retrieve})
+    return ret
+
+
+_recording = {}
+
+
+def _recording_class(cls):
+    """Return a subclass of the cache class ``cls`` that adds what's read
+    from it to its ``reads``"""
+    if cls in _recording:
+        return _recording[cls]
+    base_retrieve = cls._base_retrieve
+    get_keycache = cls._get_keycache
+    get_adds_dels = cls._get_adds_dels
+
+    def _base_retrieve(self, args):
+        self.reads.add((self, args[:-3]))
+        return base_retrieve(self, args)
+
+    def _get_keycache(self, parentity, *args, **kwargs):
+        self.reads.add((self, parentity))
+        return get_keycache(self, parentity, *args, **kwargs)
+
+    def _get_adds_dels(self, entity, *args, **kwargs):
+        self.reads.add((self, entity))
+        return get_adds_dels(self, entity, *args, **kwargs)
+    attrs = {
+        '__slots__': (),
+        '_base_retrieve': _base_retrieve,
+        '_get_keycache': _get_keycache,
+        '_get_adds_dels': _get_adds_dels
+    }
+    if issubclass(cls, EdgesCache):
+        get_destcache = cls._get_destcache
+        get_origcache = cls._get_origcache
+        adds_dels_successors = cls._adds_dels_successors
+        adds_dels_predecessors = cls._adds_dels_predecessors
+
+        # edges are keyed by origin before destination, so a change to
+        # the predecessors of a node could be anywhere in the graph
+        def _get_destcache(self, graph, orig, *args, **kwargs):
+            self.reads.add((self, (graph, orig)))
+            return get_destcache(self, graph, orig, *args, **kwargs)
+
+        def _get_origcache(self, graph, dest, *args, **kwargs):
+            self.reads.add((self, (graph,)))
+            return get_origcache(self, graph, dest, *args, **kwargs)
+
+        def _adds_dels_successors(self, parentity, *args, **kwargs):
+            self.reads.add((self, parentity))
+            return adds_dels_successors(self, parentity, *args, **kwargs)
+
+        def _adds_dels_predecessors(self, parentity, *args, **kwargs):
+            self.reads.add((self, parentity[:1]))
+            return adds_dels_predecessors(self, parentity, *args, **kwargs)
+        attrs.update(
+            _get_destcache=_get_destcache,
+            _get_origcache=_get_origcache,
+            _adds_dels_successors=_adds_dels_successors,
+            _adds_dels_predecessors=_adds_dels_predecessors
+        )
+    ret = _recording[cls] = type('Recording' + cls.__name__, (cls,), attrs)
+    return ret
+
+
 class NodesCache(Cache):
     """A cache for remembering whether nodes exist at a given time."""
     __slots__ = ()
@@ -944,6 +1550,13 @@ class NodesCache(Cache):
             ex = None
         return super().store(graph, node, branch, turn, tick, ex, planning=planning, forward=forward, loading=loading, contra=contra)
 
+    def store_many(self, rows, *, forward=None):
+        super().store_many(
+            [row[:-1] + (row[-1] or None,) for row in rows], forward=forward)
+
+    def _load_rows(self, rows):
+        super()._load_rows([row[:-1] + (row[-1] or None,) for row in rows])
+
     def _update_keycache(self, *args, forward):
         graph, node, branch, turn, tick, ex = args
         if not ex:
@@ -992,6 +1605,43 @@ class EdgesCache(Cache):
             self.db, self.predecessors, self.successors
         )
 
+    def clear(self):
+        super().clear()
+        for d in (
+            self.destcache, self.origcache, self.predecessors,
+            self._origcache_lru, self._destcache_lru
+        ):
+            d.clear()
+
+    def forget_memos(self):
+        super().forget_memos()
+        for d in (
+            self.destcache, self.origcache, self._origcache_lru,
+            self._destcache_lru
+        ):
+            d.clear()
+
+    def forget(self, windows):
+        super().forget(windows)
+        # the turns shared with the successors may have been replaced
+        branches = defaultdict(list)
+        for window in windows:
+            branches[window[0]].append(window[1])
+        successors = self.successors
+        for (graph, dest), origs in self.predecessors.items():
+            if graph not in branches:
+                continue
+            for orig, idxs in origs.items():
+                for idx, branchd in idxs.items():
+                    for branch in branches[graph]:
+                        if branch not in branchd:
+                            continue
+                        succ = successors[graph, orig][dest][idx]
+                        if branch in succ:
+                            branchd[branch] = TurnDict(succ[branch].items())
+                        else:
+                            del branchd[branch]
+
     def _update_keycache(self, *args, forward):
         super()._update_keycache(*args, forward=forward)
         dest, key, branch, turn, tick, value = args[-6:]
@@ -1182,6 +1832,58 @@ class EdgesCache(Cache):
             forward = self.db._forward
         return orig in self._get_origcache(graph, dest, branch, turn, tick, forward=forward)
 
+    def store_many(self, rows, *, forward=None):
+        rows = [row[:-1] + (row[-1] or None,) for row in rows]
+        db = self.db
+        if forward is None:
+            forward = db._forward
+        if db._no_kc:
+            super().store_many(rows, forward=forward)
+            return
+        dests = {}
+        origs = {}
+        for (graph, orig, dest, idx, branch, turn, tick, ex) in rows:
+            if (graph, orig) not in dests:
+                dests[graph, orig] = set(self._get_destcache(
+                    graph, orig, branch, turn, tick - 1, forward=forward))
+            if (graph, dest) not in origs:
+                origs[graph, dest] = set(self._get_origcache(
+                    graph, dest, branch, turn, tick - 1, forward=forward))
+        super().store_many(rows, forward=forward)
+        lasts_dests = {}
+        lasts_origs = {}
+        for (graph, orig, dest, idx, branch, turn, tick, ex) in rows:
+            if ex is None:
+                dests[graph, orig].discard(dest)
+                origs[graph, dest].discard(orig)
+            else:
+                dests[graph, orig].add(dest)
+                origs[graph, dest].add(orig)
+            lasts_dests[graph, orig] = lasts_origs[graph, dest] \
+                = branch, turn, tick
+        for (graph, orig), (branch, turn, tick) in lasts_dests.items():
+            keycache_set(
+                self.destcache, self._destcache_lru,
+                ((graph, orig, branch), turn, tick),
+                frozenset(dests[graph, orig]), KEYCACHE_MAXSIZE
+            )
+        for (graph, dest), (branch, turn, tick) in lasts_origs.items():
+            keycache_set(
+                self.origcache, self._origcache_lru,
+                ((graph, dest, branch), turn, tick),
+                frozenset(origs[graph, dest]), KEYCACHE_MAXSIZE
+            )
+
+    def _load_rows(self, rows):
+        rows = [row[:-1] + (row[-1] or None,) for row in rows]
+        super()._load_rows(rows)
+        predecessors = self.predecessors
+        successors = self.successors
+        for (graph, orig, dest, idx, branch, turn, tick, ex) in rows:
+            ArrayWindowDict.__setitem__(
+                predecessors[graph, dest][orig][idx][branch], turn,
+                successors[graph, orig][dest][idx][branch][turn])
+
     def store(self, graph, orig, dest, idx, branch, turn, tick, ex, *, planning=None, forward=None, loading=False, contra=True):
         db, predecessors, successors = self._additional_store_stuff
         if not ex:
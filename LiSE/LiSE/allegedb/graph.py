@@ -100,6 +100,15 @@ class AbstractEntityMapping(AllegedMapping):
     def _get_cache_now(self, key):
         return self._get_cache(key, *self.db._btt())
 
+    def _get_cache_history(self, key, branch, turn_from, turn_to):
+        """Return the values of the key over a range of turns, as
+        :meth:`allegedb.cache.Cache.retrieve_history` does
+
+        Return ``None`` if the caches can't tell.
+
+        """
+        return None
+
     def _cache_contains(self, key, branch, turn, tick):
         raise NotImplementedError
 
@@ -219,6 +228,13 @@ class GraphMapping(AbstractEntityMapping):
             graphn, key, branch, turn, tick
         )
 
+    def _get_cache_history(self, key, branch, turn_from, turn_to):
+        if key == 'name':
+            return [(turn_from, self.graph.name)]
+        return self.db._graph_val_cache.retrieve_history(
+            self.graph.name, key, branch, turn_from, turn_to
+        )
+
     def _get(self, key):
         get_cache, btt = self._get_stuff
         return get_cache(key, *btt())
@@ -324,6 +340,12 @@ class Node(AbstractEntityMapping):
             graphn, node, key, branch, turn, tick
         )
 
+    def _get_cache_history(self, key, branch, turn_from, turn_to):
+        _, graphn, node = self._get_cache_stuff
+        return self.db._node_val_cache.retrieve_history(
+            graphn, node, key, branch, turn_from, turn_to
+        )
+
     def _set_db(self, key, branch, turn, tick, value):
         node_val_set, graphn, node = self._set_db_stuff
         node_val_set(
@@ -419,6 +441,12 @@ class Edge(AbstractEntityMapping):
         retrieve, graphn, orig, dest, idx = self._get_cache_stuff
         return retrieve(graphn, orig, dest, idx, key, branch, turn, tick)
 
+    def _get_cache_history(self, key, branch, turn_from, turn_to):
+        _, graphn, orig, dest, idx = self._get_cache_stuff
+        return self.db._edge_val_cache.retrieve_history(
+            graphn, orig, dest, idx, key, branch, turn_from, turn_to
+        )
+
     def _set_db(self, key, branch, turn, tick, value):
         edge_val_set, graphn, orig, dest, idx = self._set_db_stuff
         edge_val_set(
@@ -1108,7 +1136,7 @@ class DiGraph(networkx.DiGraph):
         self.succ[u][v] = datadict
 
     def add_edges_from(self, ebunch, attr_dict=None, **attr):
-        """Version of add_edges_from that only writes to the database once"""
+        """Version of add_edges_from that stores all the edges at once"""
         if attr_dict is None:
             attr_dict = attr
         else:
@@ -1118,6 +1146,7 @@ class DiGraph(networkx.DiGraph):
                 raise NetworkXError(
                     "The attr_dict argument must be a dict."
                 )
+        edges = []
         for e in ebunch:
             ne = len(e)
             if ne == 3:
@@ -1130,16 +1159,111 @@ class DiGraph(networkx.DiGraph):
                 raise NetworkXError(
                     "Edge tupse {} must be a 2-tuple or 3-tuple.".format(e)
                 )
-            if u not in self.node:
-                self.node[u] = {}
-            if v not in self.node:
-                self.node[v] = {}
-            datadict = self.adj.get(u, {}).get(v, {})
-            datadict.update(attr_dict)
-            datadict.update(dd)
-            self.succ[u][v] = datadict
-            assert(u in self.succ)
-            assert(v in self.succ[u])
+            stats = dict(attr_dict)
+            stats.update(dd)
+            edges.append((u, v, stats))
+        created_nodes, created_edges, batches = self._edge_batches(edges)
+        self.db._store_many(batches)
+        self._send_created(created_nodes, created_edges)
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        """Version of add_nodes_from that stores all the nodes at once"""
+        nodes = []
+        for n in nodes_for_adding:
+            try:
+                hash(n)
+                nodes.append((n, attr))
+            except TypeError:
+                n, ndict = n
+                newdict = attr.copy()
+                newdict.update(ndict)
+                nodes.append((n, newdict))
+        created, batches = self._node_batches(nodes)
+        self.db._store_many(batches)
+        self._send_created(created)
+
+    def _node_batches(self, nodes):
+        """Return a list of the nodes that are new, and batches for
+        ``db._store_many`` that make them and set the stats of all
+
+        ``nodes`` is an iterable of pairs of a node and a dictionary of
+        its stats.
+
+        """
+        db = self.db
+        name = self.name
+        node_exists = db._node_exists
+        seen = set()
+        created = []
+        vals = []
+        for node, stats in nodes:
+            if node not in seen:
+                seen.add(node)
+                if not node_exists(name, node):
+                    created.append(node)
+            for key, value in stats.items():
+                if value is None:
+                    raise ValueError(
+                        "allegedb uses None to indicate that a key's been deleted"
+                    )
+                vals.append((name, node, key, value))
+        return created, [
+            (db._nodes_cache, db.query.exist_nodes,
+             [(name, node, True) for node in created]),
+            (db._node_val_cache, db.query.node_vals_set, vals)
+        ]
+
+    def _edge_batches(self, edges):
+        """Return lists of the nodes and edges that are new, and batches
+        for ``db._store_many`` that make them and set the edges' stats
+
+        ``edges`` is an iterable of triples of an origin, a destination,
+        and a dictionary of stats. Nodes that don't exist yet are made,
+        with no stats.
+
+        """
+        db = self.db
+        name = self.name
+        node_exists = db._node_exists
+        edge_exists = db._edge_exists
+        nodes_seen = set()
+        edges_seen = set()
+        created_nodes = []
+        created_edges = []
+        vals = []
+        for orig, dest, stats in edges:
+            for node in (orig, dest):
+                if node not in nodes_seen:
+                    nodes_seen.add(node)
+                    if not node_exists(name, node):
+                        created_nodes.append(node)
+            if (orig, dest) not in edges_seen:
+                edges_seen.add((orig, dest))
+                if not edge_exists(name, orig, dest):
+                    created_edges.append((orig, dest))
+            for key, value in stats.items():
+                if value is None:
+                    raise ValueError(
+                        "allegedb uses None to indicate that a key's been deleted"
+                    )
+                vals.append((name, orig, dest, 0, key, value))
+        return created_nodes, created_edges, [
+            (db._nodes_cache, db.query.exist_nodes,
+             [(name, node, True) for node in created_nodes]),
+            (db._edges_cache, db.query.exist_edges,
+             [(name, orig, dest, 0, True) for (orig, dest) in created_edges]),
+            (db._edge_val_cache, db.query.edge_vals_set, vals)
+        ]
+
+    def _send_created(self, nodes=(), edges=()):
+        """Signal that these nodes and edges have come to exist"""
+        node_map = self.node
+        for node in nodes:
+            node_map.send(node_map, node_name=node, exists=True)
+        adj = self.adj
+        for orig, dest in edges:
+            succs = adj[orig]
+            succs.send(succs, orig=orig, dest=dest, idx=0, exists=True)
 
     def clear(self):
         """Remove all nodes and edges from the graph.
@@ -20,7 +20,9 @@ doesn't pollute the other files so much.
 """
 import os
 from collections.abc import MutableMapping
+from queue import Queue, Empty
 from sqlite3 import IntegrityError as sqliteIntegError
+from threading import Thread, Event
 try:
     # python 2
     import wrap
@@ -44,6 +46,145 @@ class TimeError(ValueError):
     """Exception class for problems with the time model"""
 
 
+class PendingResult(object):
+    """The result of a query that a :class:`WriterThread` will run
+
+    Iterate over it, or call ``fetchone`` or ``fetchall``, as with a
+    cursor. Any of those waits for the query to be run, and raises
+    the exception it did, if any.
+
+    """
+    __slots__ = ('_writer', '_done', '_rows', '_exc')
+
+    def __init__(self, writer):
+        self._writer = writer
+        self._done = False
+        self._rows = None
+        self._exc = None
+
+    def wait(self):
+        """Wait for my query to be run, then return all its rows"""
+        if not self._done:
+            self._writer.sync()
+        if self._exc is not None:
+            raise self._exc
+        return self._rows
+
+    def __iter__(self):
+        return iter(self.wait())
+
+    def fetchone(self):
+        rows = self.wait()
+        if rows:
+            return rows.pop(0)
+
+    def fetchall(self):
+        rows = self.wait()
+        self._rows = []
+        return rows
+
+
+class WriterThread(Thread):
+    """A thread that runs all the queries for a :class:`QueryEngine`
+
+    Queries are run in the order they're submitted. Submitting one
+    doesn't wait for it to run; reading from its :class:`PendingResult`
+    does. Errors in queries whose results nobody reads get raised by the
+    next call to :meth:`sync`.
+
+    Commits don't wait either. When several are waiting to be done,
+    only the last one is.
+
+    """
+    _commit_job = ('commit',)
+
+    def __init__(self, commit):
+        super().__init__(daemon=True)
+        self._commit = commit
+        self._queue = Queue()
+        self._error = None
+
+    def submit(self, fn, *args):
+        """Run ``fn(*args)`` eventually, and return a :class:`PendingResult`"""
+        result = PendingResult(self)
+        self._queue.put((fn, args, result))
+        return result
+
+    def commit(self):
+        """Commit, once everything submitted so far is done"""
+        self._queue.put(self._commit_job)
+
+    def sync(self, commit=False):
+        """Wait for everything submitted so far to be done
+
+        With ``commit=True``, commit it, too. Raise the first exception
+        from a query that nobody has seen yet.
+
+        """
+        done = Event()
+        self._queue.put(('sync', commit, done))
+        done.wait()
+        error = self._error
+        if error is not None:
+            self._error = None
+            raise error
+
+    def stop(self):
+        """Finish everything submitted so far, then end the thread"""
+        self._queue.put(None)
+        self.join()
+
+    def _run_job(self, fn, args, result):
+        try:
+            ret = fn(*args)
+            if ret is None or not getattr(ret, 'returns_rows', True):
+                result._rows = []
+            else:
+                result._rows = ret.fetchall()
+        except Exception as ex:
+            result._exc = ex
+            if self._error is None:
+                self._error = ex
+        result._done = True
+
+    def _run_commit(self):
+        try:
+            self._commit()
+        except Exception as ex:
+            if self._error is None:
+                self._error = ex
+
+    def run(self):
+        queue = self._queue
+        commit_job = self._commit_job
+        while True:
+            jobs = [queue.get()]
+            try:
+                while True:
+                    jobs.append(queue.get_nowait())
+            except Empty:
+                pass
+            # any commit but the last in this batch would be repeated
+            last_commit = -1
+            for i, job in enumerate(jobs):
+                if job is commit_job or (
+                        job is not None and job[0] == 'sync' and job[1]):
+                    last_commit = i
+            for i, job in enumerate(jobs):
+                if job is None:
+                    return
+                elif job is commit_job:
+                    if i == last_commit:
+                        self._run_commit()
+                elif job[0] == 'sync':
+                    _, commit, done = job
+                    if i == last_commit:
+                        self._run_commit()
+                    done.set()
+                else:
+                    self._run_job(*job)
+
+
 class GlobalKeyValueStore(MutableMapping):
     """A dict-like object that keeps its contents in a table.
 
@@ -90,7 +231,7 @@ class QueryEngine(object):
     flush_edges_t = 0
     def __init__(
             self, dbstring, connect_args, alchemy,
-            pack=None, unpack=None
+            pack=None, unpack=None, write_behind=False
     ):
         """If ``alchemy`` is True and ``dbstring`` is a legit database URI,
         instantiate an Alchemist and start a transaction with
@@ -100,6 +241,9 @@ class QueryEngine(object):
         object in place of ``dbstring`` if you wish. I'll still create
         my own transaction though.
 
+        With ``write_behind=True``, my connection may be handed over to
+        a :class:`WriterThread` with :meth:`start_writer`.
+
         """
         dbstring = dbstring or 'sqlite:///:memory:'
 
@@ -110,6 +254,10 @@ class QueryEngine(object):
             if isinstance(dbstring, Engine):
                 self.engine = dbstring
             else:
+                if write_behind and dbstring.startswith('sqlite:'):
+                    # the writer thread uses the connection made here
+                    connect_args = dict(
+                        connect_args, check_same_thread=False)
                 self.engine = create_engine(
                     dbstring,
                     connect_args=connect_args
@@ -128,7 +276,8 @@ class QueryEngine(object):
                 if dbstring.startswith('sqlite:'):
                     slashidx = dbstring.rindex('/')
                     dbstring = dbstring[slashidx+1:]
-                self.connection = connect(dbstring)
+                self.connection = connect(
+                    dbstring, check_same_thread=not write_behind)
 
         if alchemy:
             try:
@@ -152,6 +301,38 @@ class QueryEngine(object):
         self.unpack = unpack
         self._exist_edge_stuff = (self._btts, self._edges2set)
         self._edge_val_set_stuff = (self._btts, self._edgevals2set)
+        self._writer = None
+
+    def start_writer(self):
+        """Run my queries in a :class:`WriterThread` from now on
+
+        Writing to the database, and committing, will no longer hold up
+        the thread that asked for it. Reads still wait for their
+        results. Call :meth:`sync` to wait until everything is on disk.
+
+        """
+        if self._writer is not None:
+            raise ValueError("Already have a writer thread")
+        self._writer = WriterThread(self._commit)
+        self._writer.start()
+
+    def sync(self):
+        """Wait until all my queries have been run and committed
+
+        Raise any exception that one of them did, if it hasn't been
+        raised already.
+
+        """
+        self.flush()
+        if self._writer is None:
+            self._commit()
+        else:
+            self._writer.sync(commit=True)
+
+    def _run(self, fn, *args):
+        if self._writer is None:
+            return fn(*args)
+        return self._writer.submit(fn, *args)
 
     def sql(self, stringname, *args, **kwargs):
         """Wrapper for the various prewritten or compiled SQL calls.
@@ -162,6 +343,9 @@ class QueryEngine(object):
         parameters to the query.
 
         """
+        return self._run(self._sql, stringname, args, kwargs)
+
+    def _sql(self, stringname, args, kwargs):
         if hasattr(self, 'alchemist'):
             return getattr(self.alchemist, stringname)(*args, **kwargs)
         else:
@@ -179,11 +363,21 @@ class QueryEngine(object):
         tuples of argument sequences to be passed to the query.
 
         """
+        return self._run(self._sqlmany, stringname, args)
+
+    def _sqlmany(self, stringname, args):
         if hasattr(self, 'alchemist'):
             return getattr(self.alchemist.many, stringname)(*args)
         s = self.strings[stringname]
         return self.connection.cursor().executemany(s, args)
 
+    def _upsert(self, insert, insert_args, update, update_args):
+        """Run the query ``insert``, or ``update`` if that's already been done"""
+        try:
+            return self._sql(insert, insert_args, {})
+        except IntegrityError:
+            return self._sql(update, update_args, {})
+
     def have_graph(self, graph):
         """Return whether I have a graph by this name."""
         graph = self.pack(graph)
@@ -203,6 +397,36 @@ class QueryEngine(object):
         for (graph, branch, turn, tick, nodes, edges, graph_val) in self.sql('keyframes_dump'):
             yield unpack(graph), branch, turn, tick, unpack(nodes), unpack(edges), unpack(graph_val)
 
+    def keyframes_list(self):
+        """Yield the graph and time of every keyframe, but not its contents"""
+        unpack = self.unpack
+        for (graph, branch, turn, tick) in self.sql('keyframes_list'):
+            yield unpack(graph), branch, turn, tick
+
+    def get_keyframe(self, graph, branch, turn, tick):
+        """Return the nodes, edges, and graph stats in a keyframe
+
+        Or ``None`` if there's no such keyframe.
+
+        """
+        unpack = self.unpack
+        stuff = self.sql(
+            'get_keyframe', self.pack(graph), branch, turn, tick).fetchone()
+        if stuff is None:
+            return
+        nodes, edges, graph_val = stuff
+        return unpack(nodes), unpack(edges), unpack(graph_val)
+
+    def _window(self, tabn, graph, branch, turn_from, tick_from, turn_to, tick_to):
+        graph = self.pack(graph)
+        if turn_to is None:
+            return self.sql(
+                tabn + '_after', graph, branch, turn_from, turn_from, tick_from)
+        return self.sql(
+            tabn + '_window', graph, branch, turn_from, turn_from, tick_from,
+            turn_to, turn_to, tick_to
+        )
+
     def del_graph(self, graph):
         """Delete all records to do with the graph"""
         g = self.pack(graph)
@@ -267,10 +491,10 @@ class QueryEngine(object):
 
         """
         (key, value) = map(self.pack, (key, value))
-        try:
-            return self.sql('global_insert', key, value)
-        except IntegrityError:
-            return self.sql('global_update', value, key)
+        return self._run(
+            self._upsert, 'global_insert', (key, value),
+            'global_update', (value, key)
+        )
 
     def global_del(self, key):
         """Delete the global record for the key."""
@@ -288,10 +512,13 @@ class QueryEngine(object):
         return self.sql('update_branches', parent, parent_turn, parent_tick, end_turn, end_tick, branch)
 
     def set_branch(self, branch, parent, parent_turn, parent_tick, end_turn, end_tick):
-        try:
-            self.sql('branches_insert', branch, parent, parent_turn, parent_tick, end_turn, end_tick)
-        except IntegrityError:
-            self.update_branch(branch, parent, parent_turn, parent_tick, end_turn, end_tick)
+        self._run(
+            self._upsert,
+            'branches_insert',
+            (branch, parent, parent_turn, parent_tick, end_turn, end_tick),
+            'update_branches',
+            (parent, parent_turn, parent_tick, end_turn, end_tick, branch)
+        )
 
     def new_turn(self, branch, turn, end_tick=0, plan_end_tick=0):
         return self.sql('turns_insert', branch, turn, end_tick, plan_end_tick)
@@ -300,10 +527,11 @@ class QueryEngine(object):
         return self.sql('update_turns', end_tick, plan_end_tick, branch, turn)
 
     def set_turn(self, branch, turn, end_tick, plan_end_tick):
-        try:
-            return self.sql('turns_insert', branch, turn, end_tick, plan_end_tick)
-        except IntegrityError:
-            return self.sql('update_turns', end_tick, plan_end_tick, branch, turn)
+        return self._run(
+            self._upsert,
+            'turns_insert', (branch, turn, end_tick, plan_end_tick),
+            'update_turns', (end_tick, plan_end_tick, branch, turn)
+        )
 
     def turns_dump(self):
         return self.sql('turns_dump')
@@ -322,6 +550,26 @@ class QueryEngine(object):
                 unpack(value)
             )
 
+    def graph_val_window(self, graph, branch, turn_from, tick_from, turn_to=None, tick_to=None):
+        """Yield a graph's stats from between two times in a branch
+
+        With ``turn_to=None``, yield everything from the first time on.
+
+        """
+        self._flush_graph_val()
+        unpack = self.unpack
+        for (graph, key, branch, turn, tick, value) in self._window(
+                'graph_val', graph, branch, turn_from, tick_from, turn_to, tick_to
+        ):
+            yield (
+                unpack(graph),
+                unpack(key),
+                branch,
+                turn,
+                tick,
+                unpack(value)
+            )
+
     def _flush_graph_val(self):
         """Send all new and changed graph values to the database."""
         if not self._graphvals2set:
@@ -376,6 +624,21 @@ class QueryEngine(object):
         self._btts.add((branch, turn, tick))
         self._nodes2set.append((self.pack(graph), self.pack(node), branch, turn, tick, extant))
 
+    def exist_nodes(self, rows):
+        """Declare that lots of nodes exist or don't.
+
+        Each row is like the arguments to :meth:`exist_node`.
+
+        """
+        btts = self._btts
+        pack = self.pack
+        nodes2set = self._nodes2set
+        for (graph, node, branch, turn, tick, extant) in rows:
+            if (branch, turn, tick) in btts:
+                raise TimeError
+            btts.add((branch, turn, tick))
+            nodes2set.append((pack(graph), pack(node), branch, turn, tick, extant))
+
     def nodes_del_time(self, branch, turn, tick):
         self._flush_nodes()
         self.sql('nodes_del_time', branch, turn, tick)
@@ -395,6 +658,27 @@ class QueryEngine(object):
                 bool(extant)
             )
 
+    def nodes_window(self, graph, branch, turn_from, tick_from, turn_to=None, tick_to=None):
+        """Yield the comings and goings of a graph's nodes between two
+        times in a branch
+
+        With ``turn_to=None``, yield everything from the first time on.
+
+        """
+        self._flush_nodes()
+        unpack = self.unpack
+        for (graph, node, branch, turn, tick, extant) in self._window(
+                'nodes', graph, branch, turn_from, tick_from, turn_to, tick_to
+        ):
+            yield (
+                unpack(graph),
+                unpack(node),
+                branch,
+                turn,
+                tick,
+                bool(extant)
+            )
+
     def node_val_dump(self):
         """Yield the entire contents of the node_val table."""
         self._flush_node_val()
@@ -412,6 +696,30 @@ class QueryEngine(object):
                 unpack(value)
             )
 
+    def node_val_window(self, graph, branch, turn_from, tick_from, turn_to=None, tick_to=None):
+        """Yield the stats of a graph's nodes from between two times in a
+        branch
+
+        With ``turn_to=None``, yield everything from the first time on.
+
+        """
+        self._flush_node_val()
+        unpack = self.unpack
+        for (
+                graph, node, key, branch, turn, tick, value
+        ) in self._window(
+            'node_val', graph, branch, turn_from, tick_from, turn_to, tick_to
+        ):
+            yield (
+                unpack(graph),
+                unpack(node),
+                unpack(key),
+                branch,
+                turn,
+                tick,
+                unpack(value)
+            )
+
     def _flush_node_val(self):
         if not self._nodevals2set:
             return
@@ -426,6 +734,21 @@ class QueryEngine(object):
         graph, node, key, value = map(self.pack, (graph, node, key, value))
         self._nodevals2set.append((graph, node, key, branch, turn, tick, value))
 
+    def node_vals_set(self, rows):
+        """Set lots of key-value pairs on nodes.
+
+        Each row is like the arguments to :meth:`node_val_set`.
+
+        """
+        btts = self._btts
+        pack = self.pack
+        nodevals2set = self._nodevals2set
+        for (graph, node, key, branch, turn, tick, value) in rows:
+            if (branch, turn, tick) in btts:
+                raise TimeError
+            btts.add((branch, turn, tick))
+            nodevals2set.append((pack(graph), pack(node), pack(key), branch, turn, tick, pack(value)))
+
     def node_val_del_time(self, branch, turn, tick):
         self._flush_node_val()
         self.sql('node_val_del_time', branch, turn, tick)
@@ -449,6 +772,31 @@ class QueryEngine(object):
                 bool(extant)
             )
 
+    def edges_window(self, graph, branch, turn_from, tick_from, turn_to=None, tick_to=None):
+        """Yield the comings and goings of a graph's edges between two
+        times in a branch
+
+        With ``turn_to=None``, yield everything from the first time on.
+
+        """
+        self._flush_edges()
+        unpack = self.unpack
+        for (
+                graph, orig, dest, idx, branch, turn, tick, extant
+        ) in self._window(
+            'edges', graph, branch, turn_from, tick_from, turn_to, tick_to
+        ):
+            yield (
+                unpack(graph),
+                unpack(orig),
+                unpack(dest),
+                idx,
+                branch,
+                turn,
+                tick,
+                bool(extant)
+            )
+
     def _pack_edge2set(self, tup):
         graph, orig, dest, idx, branch, turn, tick, extant = tup
         pack = self.pack
@@ -459,7 +807,7 @@ class QueryEngine(object):
         if not self._edges2set:
             return
         self.sqlmany('edges_insert', *map(self._pack_edge2set, self._edges2set))
-        self._edges2set = []
+        self._edges2set.clear()
         QueryEngine.flush_edges_t += monotonic() - start
 
     def exist_edge(self, graph, orig, dest, idx, branch, turn, tick, extant):
@@ -470,6 +818,20 @@ class QueryEngine(object):
         btts.add((branch, turn, tick))
         edges2set.append((graph, orig, dest, idx, branch, turn, tick, extant))
 
+    def exist_edges(self, rows):
+        """Declare whether or not lots of edges exist.
+
+        Each row is like the arguments to :meth:`exist_edge`.
+
+        """
+        btts = self._btts
+        for row in rows:
+            btt = row[-4:-1]
+            if btt in btts:
+                raise TimeError
+            btts.add(btt)
+        self._edges2set.extend(rows)
+
     def edges_del_time(self, branch, turn, tick):
         self._flush_edges()
         self.sql('edges_del_time', branch, turn, tick)
@@ -494,6 +856,32 @@ class QueryEngine(object):
                 unpack(value)
             )
 
+    def edge_val_window(self, graph, branch, turn_from, tick_from, turn_to=None, tick_to=None):
+        """Yield the stats of a graph's edges from between two times in a
+        branch
+
+        With ``turn_to=None``, yield everything from the first time on.
+
+        """
+        self._flush_edge_val()
+        unpack = self.unpack
+        for (
+                graph, orig, dest, idx, key, branch, turn, tick, value
+        ) in self._window(
+            'edge_val', graph, branch, turn_from, tick_from, turn_to, tick_to
+        ):
+            yield (
+                unpack(graph),
+                unpack(orig),
+                unpack(dest),
+                idx,
+                unpack(key),
+                branch,
+                turn,
+                tick,
+                unpack(value)
+            )
+
     def _pack_edgeval2set(self, tup):
         graph, orig, dest, idx, key, branch, turn, tick, value = tup
         pack = self.pack
@@ -514,6 +902,20 @@ class QueryEngine(object):
             (graph, orig, dest, idx, key, branch, turn, tick, value)
         )
 
+    def edge_vals_set(self, rows):
+        """Set lots of keys of edges to values.
+
+        Each row is like the arguments to :meth:`edge_val_set`.
+
+        """
+        btts = self._btts
+        for row in rows:
+            btt = row[-4:-1]
+            if btt in btts:
+                raise TimeError
+            btts.add(btt)
+        self._edgevals2set.extend(rows)
+
     def edge_val_del_time(self, branch, turn, tick):
         self._flush_edge_val()
         self.sql('edge_val_del_time', branch, turn, tick)
@@ -586,8 +988,18 @@ class QueryEngine(object):
         self._flush_edge_val()
 
     def commit(self):
-        """Commit the transaction"""
+        """Commit the transaction
+
+        If I have a writer thread, it'll commit when it gets to it.
+
+        """
         self.flush()
+        if self._writer is None:
+            self._commit()
+        else:
+            self._writer.commit()
+
+    def _commit(self):
         if hasattr(self, 'transaction') and self.transaction.is_active:
             self.transaction.commit()
         elif hasattr(self, 'connection'):
@@ -596,5 +1008,11 @@ class QueryEngine(object):
     def close(self):
         """Commit the transaction, then close the connection"""
         self.commit()
+        if self._writer is not None:
+            self._writer.stop()
+            error = self._writer._error
+            self._writer = None
+            if error is not None:
+                raise error
         if hasattr(self, 'connection'):
             self.connection.close()
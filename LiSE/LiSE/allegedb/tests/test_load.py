@@ -1,6 +1,7 @@
 import pytest
 import os
 from LiSE.allegedb import ORM
+from LiSE.allegedb.cache import Cache, EdgesCache
 import networkx as nx
 
 
@@ -108,4 +109,82 @@ def test_keyframe_load(db):
             if graph.is_multigraph():
                 assert db._edge_val_cache.keyframe[(graph.name,) + edge]['trunk'][0][0] == graph.edges[edge]
             else:
-                assert db._edge_val_cache.keyframe[(graph.name,) + edge + (0,)]['trunk'][0][0] == graph.edges[edge]
\ No newline at end of file
+                assert db._edge_val_cache.keyframe[(graph.name,) + edge + (0,)]['trunk'][0][0] == graph.edges[edge]
+
+
+def _journal(cache):
+    return {
+        branch: {turn: dict(ticks.items()) for (turn, ticks) in turns.items()}
+        for (branch, turns) in cache.settings.items()
+    }, {
+        branch: {turn: dict(ticks.items()) for (turn, ticks) in turns.items()}
+        for (branch, turns) in cache.presettings.items()
+    }
+
+
+@pytest.mark.parametrize('cls', [Cache, EdgesCache])
+def test_fast_load(tmpdbfile, cls):
+    """Loading rows in bulk fills a cache the same as storing them one by one"""
+    with ORM('sqlite:///' + tmpdbfile) as orm:
+        g = orm.new_digraph('g', nx.path_graph(5))
+        for turn in range(1, 6):
+            orm.turn = turn
+            g.nodes[turn % 5]['n'] = turn
+            g.edges[turn % 4, turn % 4 + 1]['e'] = turn
+            if turn == 3:
+                del g.nodes[0]['n']
+        orm.turn = 2
+        orm.branch = 'b'
+        g.nodes[1]['n'] = 'b'
+        g.add_edge(4, 0, e='b')
+        orm.turn = 4
+        orm.branch = 'trunk'
+
+    class SlowCache(cls):
+        __slots__ = ()
+
+        def store(self, *args, **kwargs):
+            return super().store(*args, **kwargs)
+
+    with ORM('sqlite:///' + tmpdbfile) as orm:
+        if cls is Cache:
+            rows = list(orm.query.node_val_dump())
+        else:
+            rows = list(orm.query.edges_dump())
+        fast = cls(orm)
+        slow = SlowCache(orm)
+        assert fast._loads_fast() and not slow._loads_fast()
+        fast.load(rows)
+        slow.load(rows)
+        assert fast.time_entity == slow.time_entity
+        assert _journal(fast) == _journal(slow)
+        for row in rows:
+            for branch in ('trunk', 'b'):
+                for turn in range(6):
+                    args = row[:-4] + (branch, turn, 0)
+                    try:
+                        expected = slow.retrieve(*args)
+                    except KeyError:
+                        with pytest.raises(KeyError):
+                            fast.retrieve(*args)
+                        continue
+                    assert fast.retrieve(*args) == expected
+
+
+def test_write_behind_alchemy(tmpdbfile):
+    """SQLAlchemy's connection can be handed to the writer thread"""
+    pytest.importorskip('sqlalchemy')
+    with ORM('sqlite:///' + tmpdbfile, write_behind=True) as orm:
+        assert hasattr(orm.query, 'alchemist')
+        assert orm.query._writer.is_alive()
+        g = orm.new_digraph('g', nx.path_graph(5))
+        for turn in range(1, 6):
+            orm.turn = turn
+            g.nodes[turn % 5]['n'] = turn
+        orm.query.sync()
+    with ORM('sqlite:///' + tmpdbfile) as orm:
+        g = orm.graph['g']
+        assert set(g.nodes) == set(range(5))
+        for turn in range(1, 6):
+            orm.turn = turn
+            assert g.nodes[turn % 5]['n'] == turn
@@ -1,4 +1,4 @@
-from ..window import WindowDict
+from ..window import WindowDict, ArrayWindowDict
 from .. import HistoryError, ORM
 from itertools import cycle
 import pytest
@@ -19,9 +19,9 @@ for k, v in zip(range(100), cycle(testvs)):
         testdata.append((k, vv))
 
 
-@pytest.fixture
-def windd():
-    return WindowDict(testdata)
+@pytest.fixture(params=[WindowDict, ArrayWindowDict])
+def windd(request):
+    return request.param(testdata)
 
 
 def test_keys(windd):
@@ -87,8 +87,9 @@ def test_future(windd):
         assert item[1] not in windd.future().values()
 
 
-def test_empty():
-    empty = WindowDict()
+@pytest.mark.parametrize('cls', [WindowDict, ArrayWindowDict])
+def test_empty(cls):
+    empty = cls()
     items = empty.items()
     past = empty.past()
     future = empty.future()
@@ -117,6 +118,8 @@ def test_slice(windd):
     assert list(reversed(windd[50:25])) == [windd[i] for i in reversed(range(50, 25, -1))]
     assert list(windd[25:50:2]) == [windd[i] for i in range(25, 50, 2)]
     assert list(windd[50:25:-2]) == [windd[i] for i in range(50, 25, -2)]
+    # nothing was set in these
+    assert list(windd[200:300]) == []
 
 
 def test_del(windd):
@@ -131,8 +134,9 @@ def test_del(windd):
         windd[1]
 
 
-def test_set():
-    wd = WindowDict()
+@pytest.mark.parametrize('cls', [WindowDict, ArrayWindowDict])
+def test_set(cls):
+    wd = cls()
     assert 0 not in wd
     wd[0] = 'foo'
     assert 0 in wd
@@ -164,3 +168,15 @@ def test_set():
         wd[5] = g.node[5]['ham']
         assert wd[5] == {'spam': 'beans'}
         assert wd[5] == g.node[5]['ham']
+
+
+def test_seek_far(windd):
+    """Looking up revisions far apart gets the same results either way"""
+    for rev in (99, 0, 75, 3, 50, 98, -1, 1000):
+        if rev < 0:
+            with pytest.raises(HistoryError):
+                windd[rev]
+            continue
+        assert windd[rev] == testdata[min(rev, 99)][1]
+        assert windd.rev_before(rev) == min(rev, 99)
+        assert list(windd.past()) == list(reversed(range(min(rev, 99) + 1)))
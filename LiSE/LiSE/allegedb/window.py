@@ -21,6 +21,8 @@ you asked for (and thus, keys must be orderable). It is optimized for retrieval
 of the same key and neighboring ones repeatedly and in sequence.
 
 """
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import deque
 from collections.abc import Mapping, MutableMapping, KeysView, ItemsView, ValuesView
 from operator import itemgetter, lt, le
@@ -36,6 +38,10 @@ except ImportError:
         cfunc = locals
         int = None
         bint = None
+        compiled = False
+
+# whether this module's been compiled with Cython
+COMPILED = cython.compiled
 
 get0 = itemgetter(0)
 get1 = itemgetter(1)
@@ -323,11 +329,10 @@ class WindowDictSlice:
                     return
                 cmp = le
             it = iter(past)
-            p0, p1 = next(it)
-            while cmp(p0, left):
-                p0, p1 = next(it)
-            else:
-                yield p1
+            for p0, p1 in it:
+                if not cmp(p0, left):
+                    yield p1
+                    break
             yield from map(get1, it)
         elif slic.start is None:
             stac = dic._past + list(reversed(dic._future))
@@ -659,21 +664,324 @@ class FuturistWindowDict(WindowDict):
         self._keys.add(rev)
 
 
-class TurnDict(FuturistWindowDict):
-    __slots__ = ('_future', '_past')
+class ArrayWindowDictView(Mapping):
+    """Read-only mapping of part of an ArrayWindowDict's history
+
+    Covers the revisions from index ``start`` up to, but not including,
+    ``stop``. Iterates backward if ``reverse`` is true.
+
+    """
+    __slots__ = ('_revs', '_vals', '_start', '_stop', '_reverse')
+
+    def __init__(self, revs, vals, start, stop, reverse=False):
+        self._revs = revs
+        self._vals = vals
+        self._start = start
+        self._stop = stop
+        self._reverse = reverse
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __iter__(self):
+        revs = self._revs
+        if self._reverse:
+            for i in range(self._stop - 1, self._start - 1, -1):
+                yield revs[i]
+        else:
+            yield from revs[self._start:self._stop]
+
+    def __getitem__(self, key):
+        i = bisect_left(self._revs, key, self._start, self._stop)
+        if i < self._stop and self._revs[i] == key:
+            return self._vals[i]
+        raise KeyError
+
+
+class ArrayWindowDictSlice:
+    """A slice of history in an ArrayWindowDict
+
+    Iterates forward through time, unless ``reverse`` is true. As with
+    :class:`WindowDict`, a start later than the stop gets the revisions
+    after the stop, up to and including the start.
+
+    """
+    __slots__ = ['dict', 'slice', 'reverse']
+
+    def __init__(self, dict, slice, reverse=False):
+        self.dict = dict
+        self.slice = slice
+        self.reverse = reverse
+
+    def __reversed__(self):
+        return iter(ArrayWindowDictSlice(
+            self.dict, self.slice, not self.reverse))
+
+    def _bounds(self):
+        revs = self.dict._revs
+        start, stop = self.slice.start, self.slice.stop
+        if start is None:
+            if stop is None:
+                return 0, len(revs)
+            return 0, bisect_left(revs, stop)
+        if stop is None:
+            return bisect_left(revs, start), len(revs)
+        if start < stop:
+            return bisect_left(revs, start), bisect_left(revs, stop)
+        return bisect_right(revs, stop), bisect_right(revs, start)
+
+    def __iter__(self):
+        dic = self.dict
+        if not dic:
+            return
+        slic = self.slice
+        if slic.step is not None:
+            if self.reverse:
+                start = dic.end if slic.start is None else slic.start
+                stop = dic.beginning if slic.stop is None else slic.stop
+            else:
+                start = dic.beginning if slic.start is None else slic.start
+                stop = dic.end + 1 if slic.stop is None else slic.stop
+            for i in range(start, stop, slic.step):
+                yield dic[i]
+            return
+        if slic.start is not None and slic.start == slic.stop:
+            yield dic[slic.stop]
+            return
+        lo, hi = self._bounds()
+        vals = dic._vals
+        if self.reverse:
+            for i in range(hi - 1, lo - 1, -1):
+                yield vals[i]
+        else:
+            yield from vals[lo:hi]
+
+
+class ArrayWindowDictItemsView(ItemsView):
+    """Look through everything an ArrayWindowDict contains."""
+    def __contains__(self, item):
+        (rev, v) = item
+        mapp = self._mapping
+        if rev not in mapp:
+            return False
+        return mapp._vals[bisect_left(mapp._revs, rev)] == v
+
+    def __iter__(self):
+        return zip(self._mapping._revs, self._mapping._vals)
+
+
+class ArrayWindowDictValuesView(ValuesView):
+    """Look through all the values that an ArrayWindowDict contains."""
+    def __contains__(self, value):
+        return value in self._mapping._vals
+
+    def __iter__(self):
+        return iter(self._mapping._vals)
+
+
+class ArrayWindowDict(MutableMapping):
+    """A WindowDict that keeps its revisions in a sorted array.
+
+    :class:`WindowDict` walks from the last revision looked up to the
+    next one, which is cheap for neighbors but costs time in proportion
+    to the distance. This finds any revision with a binary search
+    instead, so it's better for long histories that get looked up all
+    over the place, such as all the turns in a branch.
+
+    Revisions must be integers. The API is the same as :class:`WindowDict`.
+
+    """
+    __slots__ = ('_revs', '_vals', '_idx', '_last')
+
+    def future(self, rev=None):
+        """Return a Mapping of items after the given revision.
+
+        Default revision is the last one looked up.
+
+        """
+        if rev is not None:
+            self.seek(rev)
+        return ArrayWindowDictView(
+            self._revs, self._vals, self._idx, len(self._revs))
+
+    def past(self, rev=None):
+        """Return a Mapping of items at or before the given revision.
+
+        Default revision is the last one looked up.
+
+        """
+        if rev is not None:
+            self.seek(rev)
+        return ArrayWindowDictView(
+            self._revs, self._vals, 0, self._idx, reverse=True)
+
+    def seek(self, rev):
+        """Find the index of the last revision at or before ``rev``."""
+        if rev == self._last:
+            return
+        if type(rev) is not int:
+            raise TypeError("rev must be int")
+        self._idx = bisect_right(self._revs, rev)
+        self._last = rev
+
+    @property
+    def beginning(self):
+        return self._revs[0] if self._revs else None
+
+    @property
+    def end(self):
+        return self._revs[-1] if self._revs else None
+
+    def rev_gettable(self, rev: int) -> bool:
+        return bool(self._revs) and rev >= self._revs[0]
+
+    def rev_before(self, rev: int) -> int:
+        """Return the latest past rev on which the value changed."""
+        self.seek(rev)
+        if self._idx:
+            return self._revs[self._idx - 1]
+
+    def rev_after(self, rev: int) -> int:
+        """Return the earliest future rev on which the value will change."""
+        self.seek(rev)
+        if self._idx < len(self._revs):
+            return self._revs[self._idx]
+
+    def initial(self):
+        """Return the earliest value we have"""
+        if self._vals:
+            return self._vals[0]
+        raise KeyError("No data")
+
+    def final(self):
+        """Return the latest value we have"""
+        if self._vals:
+            return self._vals[-1]
+        raise KeyError("No data")
+
+    def truncate(self, rev: int) -> None:
+        """Delete everything after the given revision."""
+        self.seek(rev)
+        del self._revs[self._idx:]
+        del self._vals[self._idx:]
+
+    def keys(self):
+        return KeysView(self)
+
+    def items(self):
+        return ArrayWindowDictItemsView(self)
+
+    def values(self):
+        return ArrayWindowDictValuesView(self)
+
+    def __bool__(self):
+        return bool(self._revs)
+
+    def __init__(self, data=None):
+        if not data:
+            data = []
+        elif hasattr(data, 'items'):
+            data = sorted(data.items(), key=get0)
+        else:
+            # assume it's an orderable sequence of pairs
+            data = sorted(data, key=get0)
+        self._revs = array('q', map(get0, data))
+        self._vals = list(map(get1, data))
+        self._idx = len(self._revs)
+        self._last = None
+
+    def __iter__(self):
+        return iter(self._revs)
+
+    def __contains__(self, item):
+        if type(item) is not int:
+            return False
+        revs = self._revs
+        i = bisect_left(revs, item)
+        return i < len(revs) and revs[i] == item
+
+    def __len__(self):
+        return len(self._revs)
+
+    def __getitem__(self, rev):
+        if isinstance(rev, slice):
+            return ArrayWindowDictSlice(
+                self, rev, None not in (rev.start, rev.stop)
+                and rev.start > rev.stop
+            )
+        self.seek(rev)
+        if not self._idx:
+            raise HistoryError(
+                "Revision {} is before the start of history".format(rev)
+            )
+        return self._vals[self._idx - 1]
+
+    def __setitem__(self, rev, v):
+        self.seek(rev)
+        i = self._idx
+        if i and self._revs[i - 1] == rev:
+            self._vals[i - 1] = v
+        else:
+            self._revs.insert(i, rev)
+            self._vals.insert(i, v)
+            self._idx = i + 1
+
+    def __delitem__(self, rev):
+        if not self:
+            raise HistoryError("Tried to delete from an empty WindowDict")
+        if not self.beginning <= rev <= self.end:
+            raise HistoryError("Rev outside of history: {}".format(rev))
+        self.seek(rev)
+        i = self._idx
+        if not i or self._revs[i - 1] != rev:
+            raise HistoryError("Rev not present: {}".format(rev))
+        del self._revs[i - 1]
+        del self._vals[i - 1]
+        self._idx = i - 1
+
+    def __repr__(self):
+        return "{}({})".format(
+            self.__class__.__name__, dict(zip(self._revs, self._vals)))
+
+
+class FuturistArrayWindowDict(ArrayWindowDict):
+    """An ArrayWindowDict that does not let you rewrite the past."""
+    __slots__ = ()
+
+    def __setitem__(self, rev, v):
+        if hasattr(v, 'unwrap') and not hasattr(v, 'no_unwrap'):
+            v = v.unwrap()
+        if type(rev) is not int:
+            raise TypeError("rev must be int")
+        revs = self._revs
+        if revs and rev < revs[-1]:
+            raise HistoryError(
+                "Already have some history after {}".format(rev)
+            )
+        if revs and rev == revs[-1]:
+            self._vals[-1] = v
+        else:
+            revs.append(rev)
+            self._vals.append(v)
+        self._idx = len(revs)
+        self._last = rev
+
+
+class TurnDict(FuturistArrayWindowDict):
+    __slots__ = ()
     cls = FuturistWindowDict
 
     def __setitem__(self, turn, value):
         if type(value) is not FuturistWindowDict:
             value = FuturistWindowDict(value)
-        FuturistWindowDict.__setitem__(self, turn, value)
+        FuturistArrayWindowDict.__setitem__(self, turn, value)
 
 
-class SettingsTurnDict(WindowDict):
-    __slots__ = ('_future', '_past')
+class SettingsTurnDict(ArrayWindowDict):
+    __slots__ = ()
     cls = WindowDict
 
     def __setitem__(self, turn, value):
         if type(value) is not WindowDict:
             value = WindowDict(value)
-        WindowDict.__setitem__(self, turn, value)
+        ArrayWindowDict.__setitem__(self, turn, value)
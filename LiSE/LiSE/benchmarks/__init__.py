@@ -0,0 +1,194 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Timing the LiSE core.
+
+Run ``python -m LiSE.benchmarks`` to time the worlds in
+:mod:`LiSE.benchmarks.worlds` at their default sizes, or see
+``python -m LiSE.benchmarks --help`` for how to pick worlds, sizes, and
+numbers of turns. Save the results with ``--output``, and compare them
+with results saved earlier with ``--compare``.
+
+Each world is made in a new directory, then timed doing these:
+
+``install``
+    making the world and committing it
+``load``
+    opening the engine on the world, and closing it
+``next_turn``
+    simulating, one turn at a time
+``commit``
+    committing what was simulated
+``get_delta``
+    computing the changes over the whole history, then each turn's
+``time_travel``
+    going to each turn in random order, and looking where every thing
+    is
+``proxy_ping``
+    asking an engine in a subprocess what branch it's in
+``proxy_time_travel``
+    going to each turn in random order, through a proxy
+``proxy_next_turn``
+    simulating, one turn at a time, through a proxy
+
+"""
+import os
+import platform
+import shutil
+import tempfile
+from random import Random
+from timeit import default_timer
+
+from .worlds import worlds
+
+# results about the same setup can be compared
+format_version = 1
+
+
+def _timed(results, name, n, started):
+    secs = default_timer() - started
+    results.append({
+        'bench': name, 'n': n, 'seconds': secs,
+        'per': secs / n if n else secs
+    })
+
+
+def _look_around(engine):
+    """Read where every thing is, and how many places there are"""
+    for char in engine.character.values():
+        len(char.place)
+        for thing in char.thing.values():
+            thing['location']
+
+
+def bench_world(world, turns=10, seed=0, proxy=True, **params):
+    """Time the world named ``world``, made with ``params``, doing all
+    the things in :mod:`LiSE.benchmarks`
+
+    Return a list of dictionaries with keys ``'bench'``, for what was
+    done; ``'n'``, for how many times; ``'seconds'``, for how long it
+    took in total; and ``'per'``, for the seconds each time.
+
+    """
+    from ..engine import Engine
+    make = worlds[world]
+    results = []
+    prefix = tempfile.mkdtemp()
+    try:
+        started = default_timer()
+        with Engine(prefix, random_seed=seed) as eng:
+            make(eng, **params)
+            eng.commit()
+        _timed(results, 'install', 1, started)
+        started = default_timer()
+        eng = Engine(prefix)
+        eng.close()
+        _timed(results, 'load', 1, started)
+        with Engine(prefix) as eng:
+            started = default_timer()
+            for _ in range(turns):
+                eng.next_turn()
+            _timed(results, 'next_turn', turns, started)
+            started = default_timer()
+            eng.commit()
+            _timed(results, 'commit', 1, started)
+            branch, turn, tick = eng._btt()
+            started = default_timer()
+            eng.get_delta(branch, 0, 0, turn, tick)
+            for t in range(1, turn + 1):
+                eng.get_turn_delta(branch, t)
+            _timed(results, 'get_delta', turn + 1, started)
+            order = list(range(turn + 1))
+            Random(seed).shuffle(order)
+            started = default_timer()
+            for t in order:
+                eng.turn = t
+                _look_around(eng)
+            _timed(results, 'time_travel', len(order), started)
+            eng.turn = turn
+        if proxy:
+            results.extend(_bench_proxy(prefix, turns, seed))
+    finally:
+        shutil.rmtree(prefix, ignore_errors=True)
+    return results
+
+
+def _bench_world_into(queue, args, kwargs):
+    try:
+        queue.put(('ok', bench_world(*args, **kwargs)))
+    except Exception:
+        from traceback import format_exc
+        queue.put(('error', format_exc()))
+
+
+def bench_world_isolated(*args, **kwargs):
+    """Do :func:`bench_world` in a new process, and return its results
+
+    Engines leave garbage behind that makes the garbage collector, and
+    so LiSE, slower, the more of them have run in a process. Timing each
+    world in a process of its own keeps them from affecting each other.
+
+    """
+    from multiprocessing import get_context
+    ctx = get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_bench_world_into, args=(queue, args, kwargs))
+    proc.start()
+    status, result = queue.get()
+    proc.join()
+    if status == 'error':
+        raise RuntimeError("Benchmark failed:\n" + result)
+    return result
+
+
+def _bench_proxy(prefix, turns, seed):
+    from ..proxy import EngineProcessManager
+    results = []
+    manager = EngineProcessManager()
+    eng = manager.start(prefix, loglevel='warning')
+    try:
+        pings = 100
+        started = default_timer()
+        for _ in range(pings):
+            eng.handle('get_branch')
+        _timed(results, 'proxy_ping', pings, started)
+        branch, turn = eng.branch, eng.turn
+        order = list(range(turn + 1))
+        Random(seed).shuffle(order)
+        started = default_timer()
+        for t in order:
+            eng.time_travel(branch, t)
+        _timed(results, 'proxy_time_travel', len(order), started)
+        eng.time_travel(branch, turn)
+        started = default_timer()
+        for _ in range(turns):
+            eng.next_turn(block=True)
+        _timed(results, 'proxy_next_turn', turns, started)
+    finally:
+        manager.shutdown()
+    return results
+
+
+def environment():
+    """Return a dictionary describing what the benchmarks ran on"""
+    from ..allegedb import cache, window
+    return {
+        'format': format_version,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'compiled': {'window': window.COMPILED, 'cache': cache.COMPILED}
+    }
@@ -0,0 +1,135 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Run the benchmarks from the command line.
+
+Sizes take lists, so that, for example::
+
+    python -m LiSE.benchmarks --world wanderers --param things=10,100,1000 \\
+        --turns 10,100 --output wanderers.json
+
+times wandering with three numbers of things, for two numbers of turns
+each. Run it again later with ``--compare wanderers.json`` to see how
+the times changed.
+
+"""
+import json
+import sys
+from argparse import ArgumentParser
+from inspect import signature
+from itertools import product
+
+from . import bench_world, bench_world_isolated, environment
+from .worlds import worlds
+
+
+def _value(s):
+    try:
+        return int(s)
+    except ValueError:
+        try:
+            return float(s)
+        except ValueError:
+            return s
+
+
+def _params(pairs):
+    ret = {}
+    for pair in pairs:
+        key, _, values = pair.partition('=')
+        ret[key] = [_value(v) for v in values.split(',')]
+    return ret
+
+
+def _sweep(world, params):
+    """Iterate over dictionaries of each combination of the ``params``
+    that ``world`` takes"""
+    takes = signature(worlds[world]).parameters
+    mine = {k: v for (k, v) in params.items() if k in takes}
+    keys = sorted(mine)
+    for values in product(*(mine[k] for k in keys)):
+        yield dict(zip(keys, values))
+
+
+def _key(run, result):
+    return (run['world'], json.dumps(run['params'], sort_keys=True),
+            run['turns'], result['bench'])
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        prog='python -m LiSE.benchmarks',
+        description="Time the LiSE core on worlds of different sizes.")
+    parser.add_argument(
+        '--world', action='append', choices=sorted(worlds),
+        help="which world to time; may be given more than once. "
+             "Defaults to all of them")
+    parser.add_argument(
+        '--param', action='append', default=[], metavar='KEY=V1,V2...',
+        help="sizes to make the worlds that take this parameter in")
+    parser.add_argument(
+        '--turns', default='10',
+        help="how many turns to simulate; may be a list")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--no-proxy', action='store_true',
+        help="don't time anything through an engine in a subprocess")
+    parser.add_argument(
+        '--same-process', action='store_true',
+        help="time every world in this process, rather than each in a "
+             "new one")
+    parser.add_argument('--label', help="a note to save with the results")
+    parser.add_argument(
+        '--output', help="file to save the results in, as JSON")
+    parser.add_argument(
+        '--compare', help="file of results saved earlier to compare with")
+    args = parser.parse_args(argv)
+    params = _params(args.param)
+    bench = bench_world if args.same_process else bench_world_isolated
+    doc = {'label': args.label, 'environment': environment(), 'runs': []}
+    for world in args.world or sorted(worlds):
+        for kwargs in _sweep(world, params):
+            for turns in _params(['turns=' + args.turns])['turns']:
+                results = bench(
+                    world, turns=turns, seed=args.seed,
+                    proxy=not args.no_proxy, **kwargs)
+                run = {'world': world, 'params': kwargs, 'turns': turns,
+                       'seed': args.seed, 'results': results}
+                doc['runs'].append(run)
+                for result in results:
+                    print('{} {} turns={} {}: {:.6f}s x {}'.format(
+                        world, kwargs, turns, result['bench'],
+                        result['per'], result['n']))
+    if args.output:
+        with open(args.output, 'w') as outf:
+            json.dump(doc, outf, indent=1)
+    if args.compare:
+        with open(args.compare) as inf:
+            old = json.load(inf)
+        before = {_key(run, result): result['per']
+                  for run in old['runs'] for result in run['results']}
+        print('compared with {}:'.format(old.get('label') or args.compare))
+        for run in doc['runs']:
+            for result in run['results']:
+                k = _key(run, result)
+                if k in before and before[k]:
+                    print('{} {} turns={} {}: {:.2f}x as long'.format(
+                        run['world'], run['params'], run['turns'],
+                        result['bench'], result['per'] / before[k]))
+    return doc
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,80 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Worlds to benchmark, in sizes you choose.
+
+Each of these takes an engine, and keyword arguments for how big the
+world should be, and fills the engine with the world. With the same
+arguments and the same random seed, you get the same world.
+
+"""
+from ..character import grid_2d_8graph
+
+
+def wanderers(engine, size=10, things=10):
+    """A square grid, connected eight ways, with ``things`` wandering it
+    at random"""
+    phys = engine.new_character(
+        'physical', data=grid_2d_8graph(size, size))
+    places = sorted(phys.place)
+    engine.shuffle(places)
+    for i in range(things):
+        phys.add_thing('wanderer{}'.format(i), places[i % len(places)])
+
+    @phys.thing.rule(always=True)
+    def wander(thing):
+        dests = sorted(thing.location.portal)
+        thing.location = thing.character.place[thing.engine.choice(dests)]
+
+
+def kobold(engine, size=10, shrubberies=20):
+    """The dwarf hunting the kobold in :mod:`LiSE.examples.kobold`, on a
+    grid ``size`` on a side"""
+    from ..examples.kobold import inittest
+    inittest(
+        engine, mapsize=(size, size), kobold_pos=(size - 1, size - 1),
+        shrubberies=min(shrubberies, size * size - 2)
+    )
+
+
+def polygons(engine, size=20, shapes=30):
+    """:mod:`LiSE.examples.polygons`, with ``shapes`` of each shape on a
+    grid ``size`` on a side, or as many as fit"""
+    from ..examples.polygons import install
+    install(engine, size=size, shapes=min(shapes, size * size // 2))
+
+
+def college(engine, dorms=3, cells=100):
+    """:mod:`LiSE.examples.college`, with twelve students in each dorm,
+    and ``cells`` brain cells in each student"""
+    from ..examples.college import install
+    install(engine, dorms=dorms, cells=cells)
+
+
+def sickle(engine, creatures=5, size=1):
+    """:mod:`LiSE.examples.sickle`, starting with ``creatures`` critters
+    on a grid ``size`` on a side"""
+    from ..examples.sickle import install
+    install(engine, n_creatures=creatures, n_sickles=min(3, creatures),
+            mapsize=(size, size))
+
+
+worlds = {
+    'wanderers': wanderers,
+    'kobold': kobold,
+    'polygons': polygons,
+    'college': college,
+    'sickle': sickle
+}
@@ -20,7 +20,7 @@ from .allegedb.cache import (
     TurnDict,
     HistoryError
 )
-from .util import singleton_get, sort_set
+from .util import PersistentSet, singleton_get, sort_set
 from collections import OrderedDict
 
 
@@ -110,31 +110,39 @@ class AvatarnessCache(Cache):
         uniqav = self.uniqav[character][branch]
         users = self.users[graph, node][branch]
 
+        # every tick gets its own version of each set, sharing most of
+        # its structure with the version before
+
         def add_something(cache, what):
             if turn in cache:
-                nucache = cache[turn][tick].copy()
-                nucache.add(what)
-                cache[turn][tick] = nucache
+                cache[turn][tick] = cache[turn][tick].with_item(what)
             elif cache.rev_gettable(turn):
                 cacheturn = cache[turn]
-                nucache = cacheturn[cacheturn.end].copy()
-                nucache.add(what)
-                cache[turn] = {tick: nucache}
+                cache[turn] = {
+                    tick: cacheturn[cacheturn.end].with_item(what)}
             else:
-                cache[turn] = {tick: {what}}
+                cache[turn] = {tick: PersistentSet((what,))}
 
         def remove_something(cache, what):
             if turn in cache:
-                nucache = cache[turn][tick].copy()
-                nucache.remove(what)
-                cache[turn][tick] = nucache
+                cache[turn][tick] = cache[turn][tick].without_item(what)
             elif cache.rev_gettable(turn):
                 cacheturn = cache[turn]
-                nucache = cacheturn[cacheturn.end].copy()
-                nucache.remove(what)
-                cache[turn] = {tick: nucache}
+                cache[turn] = {
+                    tick: cacheturn[cacheturn.end].without_item(what)}
             else:
                 raise ValueError
+
+        def set_only(cache, of):
+            if turn in of:
+                only = singleton_get(of[turn][tick])
+            else:
+                ofturn = of[turn]
+                only = singleton_get(ofturn[ofturn.end])
+            if turn in cache:
+                cache[turn][tick] = only
+            else:
+                cache[turn] = {tick: only}
         if is_avatar:
             add_something(graphavs, node)
             add_something(charavs, (graph, node))
@@ -147,50 +155,9 @@ class AvatarnessCache(Cache):
                 remove_something(graphs, graph)
             if not charavs[turn][tick]:
                 remove_something(users, character)
-        graphav = singleton_get(graphavs[turn][tick])
-        if turn in soloav:
-            soloav[turn][tick] = graphav
-        else:
-            soloav[turn] = {tick: graphav}
-        charav = singleton_get(charavs[turn][tick])
-        if turn in uniqav:
-            uniqav[turn][tick] = charav
-        else:
-            uniqav[turn] = {tick: charav}
-        if not graphavs[turn][tick]:
-            graphs[turn][tick].remove(graph)
-            if len(graphs[turn][tick]) == 1:
-                uniqgraph[turn][tick] = next(iter(graphs[turn][tick]))
-            else:
-                uniqgraph[turn][tick] = None
-        if turn in graphavs and tick in graphavs[turn] and len(graphavs[turn][tick]) != 1:
-            if turn in soloav:
-                soloav[turn][tick] = None
-            else:
-                soloav[turn] = soloav.cls({tick: None})
-        else:
-            if turn in soloav:
-                soloav[turn][tick] = node
-            else:
-                soloav[turn] = soloav.cls({tick: None})
-        if turn in charavs and charavs[turn].rev_gettable(tick) and len(charavs[turn][tick]) != 1:
-            if turn in uniqav:
-                uniqav[turn][tick] = None
-            else:
-                uniqav[turn] = uniqav.cls({tick: None})
-        elif turn in uniqav:
-            uniqav[turn][tick] = (graph, node)
-        else:
-            uniqav[turn] = uniqav.cls({tick: (graph, node)})
-        if turn in graphs and graphs[turn].rev_gettable(tick) and len(graphs[turn][tick]) != 1:
-            if turn in uniqgraph:
-                uniqgraph[turn][tick] = None
-            else:
-                uniqgraph[turn] = uniqgraph.cls({tick: None})
-        elif turn in uniqgraph:
-            uniqgraph[turn][tick] = graph
-        else:
-            uniqgraph[turn] = uniqgraph.cls({tick: graph})
+        set_only(soloav, graphavs)
+        set_only(uniqav, charavs)
+        set_only(uniqgraph, graphs)
 
     def get_char_graph_avs(self, char, graph, branch, turn, tick):
         return self._valcache_lookup(
@@ -251,9 +218,21 @@ class RulesHandledCache(object):
     def get_rulebook(self, *args):
         raise NotImplementedError
 
-    def iter_unhandled_rules(self, branch, turn, tick):
+    def iter_unhandled_rules(self, branch, turn, tick, skip=()):
         raise NotImplementedError
 
+    def _skips_rulebook(self, rulebook, skip, branch, turn, tick):
+        """Return whether every rule in ``rulebook`` is in ``skip``, so
+        there's no need to look at what follows it"""
+        if not skip:
+            return False
+        try:
+            rules = self.engine._rulebooks_cache.retrieve(
+                rulebook, branch, turn, tick)
+        except KeyError:
+            return False
+        return all(rule in skip for rule in rules)
+
     def store(self, *args, loading=False):
         entity = args[:-5]
         rulebook, rule, branch, turn, tick = args[-5:]
@@ -321,12 +300,14 @@ class CharacterRulesHandledCache(RulesHandledCache):
         except KeyError:
             return character, 'character'
 
-    def iter_unhandled_rules(self, branch, turn, tick):
+    def iter_unhandled_rules(self, branch, turn, tick, skip=()):
         for character in sort_set(self.engine.character.keys()):
             rb = self.get_rulebook(character, branch, turn, tick)
             for rule in self.unhandled_rulebook_rules(
                 character, rb, branch, turn, tick
             ):
+                if rule in skip:
+                    continue
                 yield character, rb, rule
 
 
@@ -337,10 +318,12 @@ class AvatarRulesHandledCache(RulesHandledCache):
         except KeyError:
             return character, 'avatar'
 
-    def iter_unhandled_rules(self, branch, turn, tick):
+    def iter_unhandled_rules(self, branch, turn, tick, skip=()):
         charm = self.engine.character
         for character in sort_set(charm.keys()):
             rulebook = self.get_rulebook(character, branch, turn, tick)
+            if self._skips_rulebook(rulebook, skip, branch, turn, tick):
+                continue
             charavm = charm[character].avatar
             for graph in sort_set(charavm.keys()):
                 for avatar in sort_set(charavm[graph].keys()):
@@ -349,6 +332,8 @@ class AvatarRulesHandledCache(RulesHandledCache):
                     except KeyError:
                         continue
                     for rule in rules:
+                        if rule in skip:
+                            continue
                         yield character, graph, avatar, rulebook, rule
 
 
@@ -359,10 +344,12 @@ class CharacterThingRulesHandledCache(RulesHandledCache):
         except KeyError:
             return character, 'character_thing'
 
-    def iter_unhandled_rules(self, branch, turn, tick):
+    def iter_unhandled_rules(self, branch, turn, tick, skip=()):
         charm = self.engine.character
         for character in sort_set(charm.keys()):
             rulebook = self.get_rulebook(character, branch, turn, tick)
+            if self._skips_rulebook(rulebook, skip, branch, turn, tick):
+                continue
             things = sort_set(charm[character].thing.keys())
             pass
             for thing in things:
@@ -371,6 +358,8 @@ class CharacterThingRulesHandledCache(RulesHandledCache):
                 except KeyError:
                     continue
                 for rule in rules:
+                    if rule in skip:
+                        continue
                     yield character, thing, rulebook, rule
 
 
@@ -381,16 +370,20 @@ class CharacterPlaceRulesHandledCache(RulesHandledCache):
         except KeyError:
             return character, 'character_place'
 
-    def iter_unhandled_rules(self, branch, turn, tick):
+    def iter_unhandled_rules(self, branch, turn, tick, skip=()):
         charm = self.engine.character
         for character in sort_set(charm.keys()):
             rulebook = self.get_rulebook(character, branch, turn, tick)
+            if self._skips_rulebook(rulebook, skip, branch, turn, tick):
+                continue
             for place in sort_set(charm[character].place.keys()):
                 try:
                     rules = self.unhandled_rulebook_rules(character, place, rulebook, branch, turn, tick)
                 except KeyError:
                     continue
                 for rule in rules:
+                    if rule in skip:
+                        continue
                     yield character, place, rulebook, rule
 
 
@@ -401,13 +394,15 @@ class CharacterPortalRulesHandledCache(RulesHandledCache):
         except KeyError:
             return character, 'character_portal'
 
-    def iter_unhandled_rules(self, branch, turn, tick):
+    def iter_unhandled_rules(self, branch, turn, tick, skip=()):
         charm = self.engine.character
         for character in sort_set(charm.keys()):
             try:
                 rulebook = self.get_rulebook(character, branch, turn, tick)
             except KeyError:
                 continue
+            if self._skips_rulebook(rulebook, skip, branch, turn, tick):
+                continue
             charp = charm[character].portal
             for orig in sort_set(charp.keys()):
                 for dest in sort_set(charp[orig].keys()):
@@ -416,6 +411,8 @@ class CharacterPortalRulesHandledCache(RulesHandledCache):
                     except KeyError:
                         continue
                     for rule in rules:
+                        if rule in skip:
+                            continue
                         yield character, orig, dest, rulebook, rule
 
 
@@ -426,7 +423,7 @@ class NodeRulesHandledCache(RulesHandledCache):
         except KeyError:
             return character, node
 
-    def iter_unhandled_rules(self, branch, turn, tick):
+    def iter_unhandled_rules(self, branch, turn, tick, skip=()):
         charm = self.engine.character
         for character in sort_set(charm.keys()):
             for node in sort_set(charm[character].node.keys()):
@@ -436,6 +433,8 @@ class NodeRulesHandledCache(RulesHandledCache):
                 except KeyError:
                     continue
                 for rule in rules:
+                    if rule in skip:
+                        continue
                     yield character, node, rulebook, rule
 
 
@@ -446,7 +445,7 @@ class PortalRulesHandledCache(RulesHandledCache):
         except KeyError:
             return character, orig, dest
 
-    def iter_unhandled_rules(self, branch, turn, tick):
+    def iter_unhandled_rules(self, branch, turn, tick, skip=()):
         charm = self.engine.character
         for character in sort_set(charm.keys()):
             charp = charm[character].portal
@@ -459,6 +458,8 @@ class PortalRulesHandledCache(RulesHandledCache):
                     except KeyError:
                         continue
                     for rule in rules:
+                        if rule in skip:
+                            continue
                         yield character, orig, dest, rulebook, rule
 
 
@@ -515,6 +516,86 @@ class ThingsCache(Cache):
                     planning=False, contra=False, loading=True
                 )
 
+    def store_many(self, rows, *, forward=None):
+        """Store locations for lots of things that weren't anywhere before
+
+        The contents of their locations are updated thing by thing, as
+        in :meth:`store`, but all in one batch. If any of the things was
+        somewhere already, store each row the slow way instead.
+
+        """
+        retrieve = self.retrieve
+        for row in rows:
+            try:
+                oldloc = retrieve(*row[:-1])
+            except KeyError:
+                continue
+            if oldloc is not None:
+                for row in rows:
+                    self.store(*row, contra=False)
+                return
+        self._store_rows(rows, forward=forward)
+
+    def _loads_fast(self):
+        return True
+
+    def _load_rows(self, rows):
+        """Put chronological rows from one branch into my dictionaries,
+        and the contents they make into the node contents cache
+
+        Unlike :meth:`store`, this doesn't change the contents of any
+        location later than the rows, so it works for windows of history
+        loaded before the ones I have already.
+
+        """
+        retrieve = self.retrieve
+        node_contents_cache = self.db._node_contents_cache
+        locs = {}
+        contents = {}
+
+        def get_contents(character, location, branch, turn, tick):
+            if (character, location) in contents:
+                return contents[character, location]
+            try:
+                return node_contents_cache.retrieve(
+                    character, location, branch, turn, tick)
+            except KeyError:
+                return frozenset()
+
+        contents_rows = []
+        for character, thing, branch, turn, tick, location in rows:
+            if (character, thing) in locs:
+                oldloc = locs[character, thing]
+            else:
+                try:
+                    oldloc = retrieve(character, thing, branch, turn, tick)
+                except KeyError:
+                    oldloc = None
+            locs[character, thing] = location
+            if oldloc == location:
+                continue
+            if oldloc is not None:
+                conts = contents[character, oldloc] = get_contents(
+                    character, oldloc, branch, turn, tick
+                ).difference((thing,))
+                contents_rows.append(
+                    (character, oldloc, branch, turn, tick, conts))
+            if location is not None:
+                conts = contents[character, location] = get_contents(
+                    character, location, branch, turn, tick
+                ).union((thing,))
+                contents_rows.append(
+                    (character, location, branch, turn, tick, conts))
+        super()._load_rows(rows)
+        node_contents_cache._load_rows(contents_rows)
+        # the lookups above remembered what was there before the rows
+        for shallowest, rows in (
+            (self.shallowest, rows),
+            (node_contents_cache.shallowest, contents_rows)
+        ):
+            for row in rows:
+                shallowest.pop(row[:-1], None)
+
     def turn_before(self, character, thing, branch, turn):
         try:
             self.retrieve(character, thing, branch, turn, 0)
@@ -534,16 +615,6 @@ class NodeContentsCache(Cache):
     def _iter_future_contradictions(self, entity, key, turns, branch, turn, tick, value):
         return self.db._things_cache._iter_future_contradictions(entity, key, turns, branch, turn, tick, value)
 
-    def slow_iter_contents(self, character, place, branch, turn, tick):
-        branch_now, turn_now, tick_now = self.db._btt()
-        self.db.time = branch, turn
-        self.db.tick = tick
-        for thing in self.db.character[character].thing.values():
-            if thing['location'] == place:
-                yield thing.name
-        self.db.time = branch_now, turn_now
-        self.db.tick = tick_now
-
     def remove(self, branch, turn, tick):
         """Delete data on or after this tick
 
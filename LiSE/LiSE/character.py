@@ -40,6 +40,7 @@ from collections.abc import (
     Mapping,
     MutableMapping
 )
+from functools import partial
 from itertools import chain
 from time import monotonic
 from operator import ge, gt, le, lt, eq
@@ -63,7 +64,10 @@ from .node import Node
 from .thing import Thing
 from .place import Place
 from .portal import Portal
-from .util import getatt, singleton_get, timer
+from .util import (
+    getatt, singleton_get, timer, perlin_noise, PERLIN_PERMUTATION,
+    PERLIN_GRADIENTS
+)
 from .exc import WorldIntegrityError
 from .query import StatusAlias
 
@@ -114,6 +118,27 @@ def grid_2d_8graph(m, n):
     return me
 
 
+def _node_position(name, get):
+    """Return the (x, y, z) position of a node, or ``None`` if it hasn't any
+
+    That's its name, if it's a tuple of two or three numbers, or else its
+    stats 'x', 'y', and 'z', as got with ``get(stat, default)``.
+
+    """
+    if isinstance(name, tuple) and len(name) in (2, 3):
+        try:
+            pos = tuple(map(float, name))
+        except (TypeError, ValueError):
+            pass
+        else:
+            return pos if len(pos) == 3 else pos + (0.,)
+    x = get('x', None)
+    y = get('y', None)
+    if x is None or y is None:
+        return
+    return float(x), float(y), float(get('z', 0.))
+
+
 class AbstractCharacter(Mapping):
 
     """The Character API, with all requisite mappings and graph generators.
@@ -294,118 +319,108 @@ class AbstractCharacter(Mapping):
         """Apply Perlin noise to my nodes, and return myself.
 
         I'll try to use the name of the node as its spatial position
-        for this purpose, or use its stats 'x', 'y', and 'z', or skip
-        the node if neither are available. z is assumed 0 if not
-        provided for a node.
+        for this purpose, if it's a tuple of two or three numbers, or
+        use its stats 'x', 'y', and 'z', or skip the node if neither
+        are available. z is assumed 0 if not provided for a node.
 
         Result will be stored in a node stat named 'perlin' by default.
         Supply the name of another stat to use it instead.
 
+        With numpy installed, the noise is computed for all the nodes
+        at once, which is a lot faster.
+
         """
-        from math import floor
-        p = self.engine.shuffle([
-            151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7,
-            225, 140, 36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190,
-            6, 148, 247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117,
-            35, 11, 32, 57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136,
-            171, 168, 68, 175, 74, 165, 71, 134, 139, 48, 27, 166, 77, 146,
-            158, 231, 83, 111, 229, 122, 60, 211, 133, 230, 220, 105, 92, 41,
-            55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161, 1, 216, 80,
-            73, 209, 76, 132, 187, 208, 89, 18, 169, 200, 196, 135, 130, 116,
-            188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226,
-            250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207,
-            206, 59, 227, 47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213,
-            119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43,
-            172, 9, 129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178,
-            185, 112, 104, 218, 246, 97, 228, 251, 34, 242, 193, 238, 210, 144,
-            12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14, 239, 107, 49,
-            192, 214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115, 121, 50,
-            45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114, 67, 29, 24, 72,
-            243, 141, 128, 195, 78, 66, 215, 61, 156, 180
-        ]) * 2
-
-        def fade(t):
-            return t * t * t * (t * (t * 6 - 15) + 10)
-
-        def lerp(t, a, b):
-            return a + t * (b - a)
-
-        def grad(hsh, x, y, z):
-            """CONVERT LO 4 BITS OF HASH CODE INTO 12 GRADIENT DIRECTIONS."""
-            h = hsh & 15
-            u = x if h < 8 else y
-            v = y if h < 4 else x if h == 12 or h == 14 else z
-            return (u if h & 1 == 0 else -u) + (v if h & 2 == 0 else -v)
-
-        def noise(x, y, z):
-            # FIND UNIT CUBE THAT CONTAINS POINT.
-            X = int(x) & 255
-            Y = int(y) & 255
-            Z = int(z) & 255
-            # FIND RELATIVE X, Y, Z OF POINT IN CUBE.
-            x -= floor(x)
-            y -= floor(y)
-            z -= floor(z)
-            # COMPUTE FADE CURVES FOR EACH OF X, Y, Z.
-            u = fade(x)
-            v = fade(y)
-            w = fade(z)
-            # HASH COORDINATES OF THE 8 CUBE CORNERS,
-            A = p[X] + Y
-            AA = p[A] + Z
-            AB = p[A+1] + Z
-            B = p[X+1] + y
-            BA = p[B] + Z
-            BB = p[B+1] + Z
-            # AND ADD BLENDED RESULTS FROM 8 CORNERS OF CUBE
-            return lerp(
-                w,
-                lerp(
-                    v,
-                    lerp(
-                        u,
-                        grad(p[AA], x, y, z),
-                        grad(p[BA], x-1, y, z)
-                    ),
-                    lerp(
-                        u,
-                        grad(p[AB], x, y-1, z),
-                        grad(p[BB], x-1, y-1, z)
-                    )
-                ),
-                lerp(
-                    v,
-                    lerp(
-                        u,
-                        grad(p[AA+1], x, y, z-1),
-                        grad(p[BA+1], x-1, y, z-1)
-                    ),
-                    lerp(
-                        u,
-                        grad(p[AB+1], x, y-1, z-1),
-                        grad(p[BB+1], x-1, y-1, z-1)
-                    )
-                )
-            )
+        perm = list(PERLIN_PERMUTATION)
+        self.engine.shuffle(perm)
+        perm *= 2
+        names = []
+        xs = []
+        ys = []
+        zs = []
+        for name, (x, y, z) in self._iter_node_positions():
+            names.append(name)
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+        try:
+            import numpy as np
+        except ImportError:
+            noise = [perlin_noise(x, y, z, perm)
+                     for (x, y, z) in zip(xs, ys, zs)]
+        else:
+            noise = perlin_noise(
+                np.array(xs, dtype=float), np.array(ys, dtype=float),
+                np.array(zs, dtype=float), np.array(perm),
+                tuple(map(np.array, PERLIN_GRADIENTS)),
+                lambda a: np.floor(a).astype(np.int64)
+            ).tolist()
+        self._set_nodes_stat(stat, zip(names, noise))
+        return self
 
-        for node in self.node.values():
-            try:
-                (x, y, z) = node.name
-            except ValueError:
-                try:
-                    (x, y) = node.name
-                    z = 0.0
-                except ValueError:
-                    try:
-                        x = node['x']
-                        y = node['y']
-                        z = node.get('z', 0.0)
-                    except KeyError:
-                        continue
-            x, y, z = map(float, (x, y, z))
-            node[stat] = noise(x, y, z)
+    def _iter_node_positions(self):
+        """Iterate over pairs of node names and their (x, y, z) positions,
+        for :meth:`perlin`"""
+        for name, node in self.node.items():
+            pos = _node_position(name, node.get)
+            if pos is not None:
+                yield name, pos
+
+    def _set_nodes_stat(self, stat, values):
+        """Set ``stat`` on each of the nodes in ``values``, pairs of a
+        node name and a value"""
+        node = self.node
+        for name, value in values:
+            node[name][stat] = value
+
+    def patch_nodes(self, patch):
+        """Change the stats of many nodes according to a dictionary
+
+        ``patch`` maps node names to dictionaries of their new stats,
+        in which a value of ``None`` deletes the stat. A node whose
+        patch is ``None`` is deleted; one that doesn't exist yet is made
+        a place.
 
-        return self
+        """
+        node_map = self.node
+        for name, npatch in patch.items():
+            if npatch is None:
+                del node_map[name]
+                continue
+            if name not in node_map:
+                self.add_place(name, **{
+                    k: v for (k, v) in npatch.items() if v is not None})
+                continue
+            node = node_map[name]
+            for k, v in npatch.items():
+                if v is not None:
+                    node[k] = v
+                elif k in node:
+                    del node[k]
+
+    def patch_portals(self, patch):
+        """Change the stats of many portals according to a dictionary
+
+        ``patch`` maps pairs of origin and destination to dictionaries
+        of the portals' new stats, in which a value of ``None`` deletes
+        the stat. A portal whose patch is ``None`` is deleted; one that
+        doesn't exist yet is made.
+
+        """
+        portal_map = self.portal
+        for (orig, dest), ppatch in patch.items():
+            if ppatch is None:
+                del portal_map[orig][dest]
+                continue
+            if orig not in portal_map or dest not in portal_map[orig]:
+                self.add_portal(orig, dest, **{
+                    k: v for (k, v) in ppatch.items() if v is not None})
+                continue
+            port = portal_map[orig][dest]
+            for k, v in ppatch.items():
+                if v is not None:
+                    port[k] = v
+                elif k in port:
+                    del port[k]
 
     def copy_from(self, g):
         """Copy all nodes and edges from the given graph into this.
@@ -658,9 +673,22 @@ class FacadeNode(FacadeEntity):
         return self.facade.portal[self['name']]
 
     def contents(self):
-        for thing in self.facade.thing.values():
-            # it seems like redundant FacadeNode are being created sometimes
-            if thing['location'] == self.name:
+        things = self.facade.thing
+        name = self.name
+        # the things here in the real character, unless they've moved
+        # in the facade, and the things the facade has moved or made
+        try:
+            candidates = {
+                thing.name for thing in
+                self.facade.character.node[name].contents()}
+        except (AttributeError, KeyError):
+            candidates = set()
+        candidates.update(things._patch)
+        for thingn in candidates:
+            if thingn not in things:
+                continue
+            thing = things[thingn]
+            if thing['location'] == name:
                 yield thing
 
 
@@ -1223,63 +1251,10 @@ class Character(DiGraph, AbstractCharacter, RuleFollower):
             return self.engine._characters_places_rulebooks_cache
 
         def update(self, __m, **kwargs) -> None:
-            engine = self.engine
-            store_node = engine._nodes_cache.store
-            store_node_val = engine._node_val_cache.store
-            iter_node_keys = engine._node_val_cache.iter_keys
-            exist_node = engine.query.exist_node
-            node_val_set = engine.query.node_val_set
-            branch, turn, start_tick = engine._btt()
-            tick = start_tick + 1
-            charn = self.character.name
-            planning = engine._planning
-            forward = engine._forward
+            patch = dict(__m)
+            patch.update(kwargs)
             with timer("seconds spent updating PlaceMapping"):
-                for node, val in chain(__m.items(), kwargs.items()):
-                    if val is None:
-                        for key in iter_node_keys(
-                            charn, node, branch, turn, start_tick,
-                            forward=forward
-                        ):
-                            store_node_val(
-                                charn, node, key, branch, turn, tick, None,
-                                planning=planning, forward=forward,
-                                loading=True
-                            )
-                            node_val_set(
-                                charn, node, key, branch, turn, tick, None
-                            )
-                            tick += 1
-                        store_node(
-                            charn, node, branch, turn, tick, False,
-                            planning=planning, forward=forward,
-                            loading=True
-                        )
-                        exist_node(
-                            charn, node, branch, turn, tick, False
-                        )
-                        tick += 1
-                    else:
-                        store_node(
-                            charn, node, branch, turn, tick, True,
-                            planning=planning, forward=forward,
-                            loading=True
-                        )
-                        exist_node(
-                            charn, node, branch, turn, tick, True
-                        )
-                        tick += 1
-                        for k, v in val.items():
-                            store_node_val(
-                                charn, node, k, branch, turn, tick, v,
-                                planning=planning, forward=forward,
-                                loading=True
-                            )
-                            exist_node(
-                                charn, node, k, branch, turn, tick, v
-                            )
-                            tick += 1
-            engine.tick = tick
+                self.character.patch_nodes(patch)
 
         def __init__(self, character):
             """Store the character."""
@@ -1894,11 +1869,40 @@ class Character(DiGraph, AbstractCharacter, RuleFollower):
         self.place2thing(name, location,)
 
     def add_things_from(self, seq, **attrs):
+        """Make a Thing for each of a sequence of (name, location) pairs
+
+        Triples are acceptable too, in which case the third item is a
+        dictionary of stats for the new Thing; otherwise it gets the
+        keyword arguments. The lot is stored at once, which is a lot
+        faster than calling :meth:`add_thing` for each.
+
+        """
+        charn = self.name
+        engine = self.engine
+        thing_map = self.thing
+        names = set()
+        nodes = []
+        locs = []
         for tup in seq:
             name = tup[0]
             location = tup[1]
             kwargs = tup[2] if len(tup) > 2 else attrs
-            self.add_thing(name, location, **kwargs)
+            if name in names or name in thing_map:
+                raise WorldIntegrityError(
+                    "Already have a Thing named {}".format(name)
+                )
+            names.add(name)
+            if isinstance(location, Node):
+                location = location.name
+            nodes.append((name, kwargs))
+            locs.append((charn, name, location))
+        created, batches = self._node_batches(nodes)
+        batches.append(
+            (engine._things_cache, engine.query.set_thing_locs, locs))
+        engine._store_many(batches)
+        self._send_created(created)
+        for name in names:
+            self._replace_node_obj(name, Thing)
 
     def place2thing(self, name, location):
         """Turn a Place into a Thing with the given location.
@@ -1909,28 +1913,166 @@ class Character(DiGraph, AbstractCharacter, RuleFollower):
         self.engine._set_thing_loc(
             self.name, name, location
         )
-        if (self.name, name) in self.engine._node_objs:
-            obj = self.engine._node_objs[self.name, name]
-            thing = Thing(self, name)
-            for port in obj.portals():
-                port.origin = thing
-            for port in obj.preportals():
-                port.destination = thing
-            self.engine._node_objs[self.name, name] = thing
+        self._replace_node_obj(name, Thing)
 
     def thing2place(self, name):
         """Unset a Thing's location, and thus turn it into a Place."""
         self.engine._set_thing_loc(
             self.name, name, None
         )
-        if (self.name, name) in self.engine._node_objs:
-            thing = self.engine._node_objs[self.name, name]
-            place = Place(self, name)
-            for port in thing.portals():
-                port.origin = place
-            for port in thing.preportals():
-                port.destination = place
-            self.engine._node_objs[self.name, name] = place
+        self._replace_node_obj(name, Place)
+
+    def _replace_node_obj(self, name, cls):
+        """If there's an object for the node ``name``, put one of ``cls``
+        in its place, and move its portals over"""
+        node_objs = self.engine._node_objs
+        if (self.name, name) in node_objs:
+            old = node_objs[self.name, name]
+            new = cls(self, name)
+            for port in old.portals():
+                port.origin = new
+            for port in old.preportals():
+                port.destination = new
+            node_objs[self.name, name] = new
+
+    def _iter_node_positions(self):
+        engine = self.engine
+        charn = self.name
+        btt = engine._btt()
+        retrieve = engine._node_val_cache.retrieve
+
+        def get_stat(name, stat, default):
+            try:
+                return retrieve(charn, name, stat, *btt)
+            except KeyError:
+                return default
+        for name in engine._nodes_cache.iter_entities(charn, *btt):
+            pos = _node_position(name, partial(get_stat, name))
+            if pos is not None:
+                yield name, pos
+
+    def _set_nodes_stat(self, stat, values):
+        _, batches = self._node_batches(
+            (name, {stat: value}) for (name, value) in values)
+        self.engine._store_many(batches)
+
+    def patch_nodes(self, patch):
+        """Change the stats of many nodes according to a dictionary
+
+        ``patch`` maps node names to dictionaries of their new stats,
+        in which a value of ``None`` deletes the stat. A node whose
+        patch is ``None`` is deleted; one that doesn't exist yet is made
+        a place.
+
+        The changed stats are stored all at once, which is a lot faster
+        than setting them one at a time. Only the location of a Thing
+        is set the ordinary way.
+
+        """
+        engine = self.engine
+        charn = self.name
+        node_map = self.node
+        node_exists = engine._node_exists
+        is_thing = engine._is_thing
+        retrieve = engine._node_val_cache.retrieve
+        new = []
+        vals = []
+        special = []
+        for name, npatch in patch.items():
+            if npatch is None:
+                del node_map[name]
+                continue
+            thing = False
+            if not node_exists(charn, name):
+                new.append(name)
+            else:
+                thing = is_thing(charn, name)
+            btt = engine._btt()
+            for key, value in npatch.items():
+                if thing and key in Thing.extrakeys:
+                    special.append((name, key, value))
+                    continue
+                try:
+                    if retrieve(charn, name, key, *btt) == value:
+                        continue
+                except KeyError:
+                    if value is None:
+                        continue
+                vals.append((charn, name, key, value))
+        created, batches = self._node_batches((name, {}) for name in new)
+        batches.append(
+            (engine._node_val_cache, engine.query.node_vals_set, vals))
+        engine._store_many(batches)
+        self._send_created(created)
+        node_objs = engine._node_objs
+        for (_, name, key, value) in vals:
+            if (charn, name) in node_objs:
+                node = node_objs[charn, name]
+                node.send(node, key=key, val=value)
+        for name, key, value in special:
+            node_map[name][key] = value
+
+    def patch_portals(self, patch):
+        """Change the stats of many portals according to a dictionary
+
+        ``patch`` maps pairs of origin and destination to dictionaries
+        of the portals' new stats, in which a value of ``None`` deletes
+        the stat. A portal whose patch is ``None`` is deleted; one that
+        doesn't exist yet is made. Stats of a mirror portal are set on
+        the portal it mirrors.
+
+        The changed stats are stored all at once, which is a lot faster
+        than setting them one at a time. Only ``symmetrical`` is set
+        the ordinary way.
+
+        """
+        engine = self.engine
+        charn = self.name
+        portal_map = self.portal
+        edge_exists = engine._edge_exists
+        retrieve = engine._edge_val_cache.retrieve
+        new = []
+        vals = []
+        special = []
+        for (orig, dest), ppatch in patch.items():
+            if ppatch is None:
+                del portal_map[orig][dest]
+                continue
+            for key in ('origin', 'destination', 'character'):
+                if key in ppatch:
+                    raise KeyError("Can't change " + key)
+            btt = engine._btt()
+            if not edge_exists(charn, orig, dest):
+                new.append((orig, dest, {}))
+            else:
+                try:
+                    if retrieve(charn, orig, dest, 0, 'is_mirror', *btt):
+                        orig, dest = dest, orig
+                except KeyError:
+                    pass
+            for key, value in ppatch.items():
+                if key == 'symmetrical':
+                    special.append((orig, dest, key, value))
+                    continue
+                try:
+                    if retrieve(charn, orig, dest, 0, key, *btt) == value:
+                        continue
+                except KeyError:
+                    if value is None:
+                        continue
+                vals.append((charn, orig, dest, 0, key, value))
+        created_nodes, created_edges, batches = self._edge_batches(new)
+        batches.append(
+            (engine._edge_val_cache, engine.query.edge_vals_set, vals))
+        engine._store_many(batches)
+        self._send_created(created_nodes, created_edges)
+        edge_objs = engine._edge_objs
+        for (_, orig, dest, idx, key, value) in vals:
+            if (charn, orig, dest, idx) in edge_objs:
+                port = edge_objs[charn, orig, dest, idx]
+                port.send(port, key=key, val=value)
+        for orig, dest, key, value in special:
+            portal_map[orig][dest][key] = value
 
     def add_portal(self, origin, destination, symmetrical=False, **kwargs):
         """Connect the origin to the destination with a :class:`Portal`.
@@ -1971,14 +2113,29 @@ class Character(DiGraph, AbstractCharacter, RuleFollower):
         in the opposite direction, which will always have the same
         stats.
 
+        The lot is stored at once, which is a lot faster than calling
+        :meth:`add_portal` for each.
+
         """
+        edges = []
         for tup in seq:
             orig = tup[0]
             dest = tup[1]
-            kwargs = tup[2] if len(tup) > 2 else {}
-            if symmetrical:
-                kwargs['symmetrical'] = True
-            self.add_portal(orig, dest, **kwargs)
+            kwargs = dict(tup[2]) if len(tup) > 2 else {}
+            if isinstance(orig, Node):
+                orig = orig.name
+            if isinstance(dest, Node):
+                dest = dest.name
+            for key in ('origin', 'destination', 'character'):
+                if key in kwargs:
+                    raise KeyError("Can't change " + key)
+            symm = kwargs.pop('symmetrical', symmetrical)
+            edges.append((orig, dest, kwargs))
+            if symm:
+                edges.append((dest, orig, {'is_mirror': True}))
+        created_nodes, created_edges, batches = self._edge_batches(edges)
+        self.engine._store_many(batches)
+        self._send_created(created_nodes, created_edges)
 
     def add_avatar(self, a, b=None):
         """Start keeping track of an avatar"""
@@ -2015,9 +2172,11 @@ class Character(DiGraph, AbstractCharacter, RuleFollower):
                 )
             else:
                 n = b
-        # This will create the node if it doesn't exist. Otherwise
-        # it's redundant but harmless.
-        self.engine._exist_node(g, n)
+        # Create the node if it doesn't exist. Recording that it exists
+        # when it already does would make it, and its graph's set of
+        # nodes, a new version for nothing.
+        if not self.engine._node_exists(g, n):
+            self.engine._exist_node(g, n)
         # Declare that the node is my avatar
         branch, turn, tick = self.engine._nbtt()
         self.engine._remember_avatarness(
@@ -2075,6 +2234,17 @@ class Character(DiGraph, AbstractCharacter, RuleFollower):
                 except KeyError:
                     continue
 
+    def snapshot(self):
+        """Return a :class:`LiSE.snapshot.Snapshot` of my nodes and
+        portals, and their stats, as they are now
+
+        It's read-only, and doesn't change when you time travel. Graph
+        algorithms run much faster on it, or on what it exports, than on
+        me.
+
+        """
+        return self.engine._snapshot(self)
+
     def historical(self, stat):
         """Get a historical view on the given stat
 
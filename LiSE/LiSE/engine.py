@@ -6,8 +6,9 @@ flow of time.
 
 """
 from functools import partial
-from collections import defaultdict
-from operator import attrgetter
+from itertools import chain
+from collections import defaultdict, deque
+from operator import attrgetter, itemgetter
 from types import FunctionType, MethodType
 from abc import ABC, abstractmethod
 
@@ -15,9 +16,9 @@ import msgpack
 from blinker import Signal
 from .allegedb import ORM as gORM
 from .allegedb import HistoryError
-from .allegedb.window import SettingsTurnDict, WindowDict
 from .reify import reify
 from .util import sort_set
+from .wire import Delta, encode_delta, decode_delta
 
 from . import exc
 
@@ -123,6 +124,9 @@ class DummyEntity(dict):
     def __init__(self, engine):
         self.engine = engine
 
+    def _get_cache_history(self, key, branch, turn_from, turn_to):
+        return [(turn_from, self[key])]
+
 
 class FinalRule:
     """A singleton sentinel for the rule iterator"""
@@ -150,6 +154,7 @@ MSGPACK_METHOD = 0x79
 MSGPACK_TRIGGER = 0x78
 MSGPACK_PREREQ = 0x77
 MSGPACK_ACTION = 0x76
+MSGPACK_DELTA = 0x75
 
 
 class AbstractEngine(object):
@@ -194,6 +199,9 @@ class AbstractEngine(object):
             FinalRule: lambda obj: msgpack.ExtType(
                 MSGPACK_FINAL_RULE, b""
             ),
+            # an empty delta is smaller as an empty dictionary
+            Delta: lambda delta: msgpack.ExtType(
+                MSGPACK_DELTA, packer(encode_delta(delta))) if delta else {},
             FunctionType: lambda func: msgpack.ExtType({
                 'method': MSGPACK_METHOD,
                 'function': MSGPACK_FUNCTION,
@@ -342,7 +350,8 @@ class AbstractEngine(object):
             MSGPACK_ACTION: lambda ext: getattr(action, unpacker(ext)),
             MSGPACK_FUNCTION: lambda ext: getattr(function, unpacker(ext)),
             MSGPACK_METHOD: lambda ext: getattr(method, unpacker(ext)),
-            MSGPACK_EXCEPTION: unpack_exception
+            MSGPACK_EXCEPTION: unpack_exception,
+            MSGPACK_DELTA: lambda ext: decode_delta(unpacker(ext))
         }
 
         def unpack_handler(code, data):
@@ -561,7 +570,8 @@ class Engine(AbstractEngine, gORM):
         * 'rulebooks', a dictionary keyed by the name of each changed
         rulebook, the value being a list of rule names
         * 'rules', a dictionary keyed by the name of each changed rule,
-        containing any of the lists 'triggers', 'prereqs', and 'actions'
+        containing any of the lists 'triggers', 'prereqs', 'actions',
+        and 'watches'
 
         """
         from LiSE.allegedb.window import update_window, update_backward_window
@@ -580,6 +590,7 @@ class Engine(AbstractEngine, gORM):
             trigbranches = self._triggers_cache.settings
             preqbranches = self._prereqs_cache.settings
             actbranches = self._actions_cache.settings
+            watchbranches = self._watches_cache.settings
             charrbbranches = self._characters_rulebooks_cache.settings
             avrbbranches = self._avatars_rulebooks_cache.settings
             charthrbbranches = self._characters_things_rulebooks_cache.settings
@@ -598,6 +609,7 @@ class Engine(AbstractEngine, gORM):
             trigbranches = self._triggers_cache.presettings
             preqbranches = self._prereqs_cache.presettings
             actbranches = self._actions_cache.presettings
+            watchbranches = self._watches_cache.presettings
             charrbbranches = self._characters_rulebooks_cache.presettings
             avrbbranches = self._avatars_rulebooks_cache.presettings
             charthrbbranches = \
@@ -652,6 +664,9 @@ class Engine(AbstractEngine, gORM):
         if branch in actbranches:
             updater(partial(updru, 'actions'), actbranches[branch])
 
+        if branch in watchbranches:
+            updater(partial(updru, 'watches'), watchbranches[branch])
+
         def updcrb(key, _, character, rulebook):
             delta.setdefault(character, {})[key] = rulebook
 
@@ -761,6 +776,11 @@ class Engine(AbstractEngine, gORM):
             for _, rule, funs in self._triggers_cache.settings[
                                      branch][turn][start_tick:tick]:
                 rdif.setdefault(rule, {})['actions'] = funs
+        if branch in self._watches_cache.settings \
+                and turn in self._watches_cache.settings[branch]:
+            for _, rule, stats in self._watches_cache.settings[
+                                      branch][turn][start_tick:tick]:
+                rdif.setdefault(rule, {})['watches'] = stats
 
         if branch in self._characters_rulebooks_cache.settings \
                 and turn in self._characters_rulebooks_cache.settings[branch]:
@@ -945,6 +965,8 @@ class Engine(AbstractEngine, gORM):
         self._prereqs_cache.name = 'prereqs_cache'
         self._actions_cache = InitializedEntitylessCache(self)
         self._actions_cache.name = 'actions_cache'
+        self._watches_cache = InitializedEntitylessCache(self)
+        self._watches_cache.name = 'watches_cache'
         self._node_rules_handled_cache = NodeRulesHandledCache(self)
         self._node_rules_handled_cache.name = 'node_rules_handled_cache'
         self._portal_rules_handled_cache = PortalRulesHandledCache(self)
@@ -968,6 +990,12 @@ class Engine(AbstractEngine, gORM):
             'character_portal_rules_handled_cache'
         self._avatarness_cache = AvatarnessCache(self)
         self._avatarness_cache.name = 'avatarness_cache'
+        self._routing_indices = {}
+        """The latest routing index for each character and weight stat,
+        with its branch, and the earliest and latest times it's good for"""
+        self._snapshots = {}
+        """The latest snapshot of each character, with its branch, and the
+        earliest and latest times it's good for"""
         self._turns_completed = defaultdict(lambda: max((0, self.turn - 1)))
         """The last turn when the rules engine ran in each branch"""
         self.universal = UniversalMapping(self)
@@ -1007,7 +1035,13 @@ class Engine(AbstractEngine, gORM):
             random_seed=None,
             logfun=None,
             validate=False,
-            clear=False
+            clear=False,
+            trigger_workers=0,
+            keyframe_interval=None,
+            lazy=False,
+            cache_budget=None,
+            write_behind=False,
+            memoize_triggers=False
     ):
         """Store the connections for the world database and the code database;
         set up listeners; and start a transaction
@@ -1046,6 +1080,32 @@ class Engine(AbstractEngine, gORM):
         loading the game
         :arg clear: whether to delete *any and all* existing data
         and code in ``prefix``. Use with caution!
+        :arg trigger_workers: number of processes to evaluate triggers in.
+        When this is more than zero, triggers get Facades of the world as
+        it was at the start of the turn, and must not try to change it.
+        Default 0, evaluating triggers in this process
+        :arg keyframe_interval: snap a keyframe of the whole world every
+        this many turns, so that looking up the state of the world far
+        into a long game doesn't need to go over all its history.
+        Default ``None``, only snapping keyframes when asked to
+        :arg lazy: only load history from the latest keyframe on, loading
+        the rest when time travel gets to it. Much faster to start up a
+        long game, if it has keyframes
+        :arg cache_budget: the most changes to keep in any one cache.
+        When there are more on commit or load, history is forgotten,
+        least recently used first, down to half that many, to be loaded
+        again if time travel gets to it. Only the history of characters'
+        nodes, portals, stats, and things' locations counts; the caches
+        of avatars, rulebooks, rules handled, and universal stats are
+        always loaded whole. Implies ``lazy=True``
+        :arg write_behind: write to the database in a thread of its own,
+        so that the simulation doesn't wait on the disk. Changes are only
+        sure to be saved after ``self.query.sync()`` or ``self.close()``
+        :arg memoize_triggers: remember what each trigger read from the
+        world, and what it returned, for each entity; and don't call it
+        again while none of that changes. Only for triggers that depend
+        on nothing else: not the time, the randomizer, nor ``eternal``.
+        Doesn't apply to triggers checked by ``trigger_workers``
 
         """
         import os
@@ -1095,7 +1155,11 @@ class Engine(AbstractEngine, gORM):
             connect_string or os.path.join(prefix, 'world.db'),
             connect_args=connect_args,
             alchemy=alchemy,
-            validate=validate
+            validate=validate,
+            keyframe_interval=keyframe_interval,
+            lazy=lazy,
+            cache_budget=cache_budget,
+            write_behind=write_behind
         )
         self._things_cache.setdb = self.query.set_thing_loc
         self._universal_cache.setdb = self.query.universal_set
@@ -1117,6 +1181,20 @@ class Engine(AbstractEngine, gORM):
         self.log = logfun
         self.commit_modulus = commit_modulus
         self.random_seed = random_seed
+        self.trigger_workers = trigger_workers
+        self._trigger_pool = None
+        self._trigger_pool_version = None
+        self._trigger_pool_time = None
+        self._trigger_pool_deltas = deque(maxlen=8)
+        self._profile = None
+        self._profile_caches = None
+        self._profiling = False
+        self.memoize_triggers = memoize_triggers
+        self._trigger_memos = {}
+        self._trigger_memos_time = None
+        self._rules_followed_time = None
+        if isinstance(self.trigger, Signal):
+            self.trigger.connect(self._invalidate_trigger_pool)
         self._rules_iter = self._follow_rules()
         # set up the randomizer
         from random import Random
@@ -1132,26 +1210,9 @@ class Engine(AbstractEngine, gORM):
     def _init_load(self, validate=False):
         from .rule import Rule
         q = self.query
-        self._things_cache.load(q.things_dump())
+        if not self._lazy:
+            self._things_cache.load(q.things_dump())
         super()._init_load(validate=validate)
-        things_kf = self._things_cache.keyframe
-        nv_kf = self._node_val_cache.keyframe
-        for node, branches in nv_kf.items():
-            for branch, turns in branches.items():
-                for turn, ticks in turns.items():
-                    for tick, vals in ticks.items():
-                        if 'location' in vals:
-                            if node not in things_kf or branch not in \
-                                    things_kf[node]:
-                                things_kf[node][branch] = SettingsTurnDict({
-                                    turn: WindowDict({tick: vals})
-                                })
-                            elif turn not in things_kf[node][branch]:
-                                things_kf[node][branch][turn] = WindowDict({
-                                    tick: vals
-                                })
-                            else:
-                                things_kf[node][branch][turn][tick] = vals
         self._avatarness_cache.load(q.avatars_dump())
         self._universal_cache.load(q.universals_dump())
         self._rulebooks_cache.load(q.rulebooks_dump())
@@ -1169,6 +1230,7 @@ class Engine(AbstractEngine, gORM):
         self._triggers_cache.load(q.rule_triggers_dump())
         self._prereqs_cache.load(q.rule_prereqs_dump())
         self._actions_cache.load(q.rule_actions_dump())
+        self._watches_cache.load(q.rule_watches_dump())
         store_crh = self._character_rules_handled_cache.store
         for row in q.character_rules_handled_dump():
             store_crh(*row, loading=True)
@@ -1194,6 +1256,65 @@ class Engine(AbstractEngine, gORM):
         self._rules_cache = {
             name: Rule(self, name, create=False) for name in q.rules_dump()}
 
+    def _load_windows(self, windows):
+        super()._load_windows(windows)
+        q = self.query
+        thingrows = []
+        for window in windows:
+            thingrows.extend(q.things_window(*window))
+        if not thingrows:
+            return
+        thingrows.sort(key=itemgetter(-3, -2))
+        self._things_cache.forget_memos()
+        self._node_contents_cache.forget_memos()
+        self._things_cache.load(thingrows)
+
+    def _window_caches(self):
+        # The caches of avatars, rulebooks, rules handled, and the
+        # universal stats get loaded whole, and aren't limited by
+        # cache_budget
+        return super()._window_caches() + (
+            self._things_cache, self._node_contents_cache)
+
+    def _forget_windows(self, windows):
+        super()._forget_windows(windows)
+        # what's left of the journal might not cover the time these
+        # were made
+        forgot = {window[:2] for window in windows}
+        for k, (branch, _, _, _) in list(self._routing_indices.items()):
+            if (k[0], branch) in forgot:
+                del self._routing_indices[k]
+        for charn, (branch, _, _, _) in list(self._snapshots.items()):
+            if (charn, branch) in forgot:
+                del self._snapshots[charn]
+        memos_time = self._trigger_memos_time
+        if memos_time is not None and any(
+                branch == memos_time[0] for (_, branch) in forgot):
+            self._trigger_memos_time = None
+        followed_time = self._rules_followed_time
+        if followed_time is not None and any(
+                branch == followed_time[0] for (_, branch) in forgot):
+            self._rules_followed_time = None
+
+    def _snap_keyframe(self, graph, branch, turn, tick, nodes, edges, graph_val):
+        super()._snap_keyframe(graph, branch, turn, tick, nodes, edges, graph_val)
+        # locations of things are kept in their own cache, and the
+        # contents of nodes are derived from them
+        things_cache = self._things_cache
+        locs = {}
+        contents = defaultdict(set)
+        for node, vals in nodes.items():
+            if vals and 'location' in vals:
+                things_cache.set_keyframe(
+                    (graph, node), branch, turn, tick, vals)
+                locs[node] = vals['location']
+                contents[vals['location']].add(node)
+        things_cache.set_keyframe((graph,), branch, turn, tick, locs)
+        self._node_contents_cache.set_keyframe(
+            (graph,), branch, turn, tick,
+            {loc: frozenset(things) for (loc, things) in contents.items()}
+        )
+
     @property
     def stores(self):
         return (
@@ -1239,6 +1360,9 @@ class Engine(AbstractEngine, gORM):
     def close(self):
         """Commit changes and close the database."""
         import sys, os
+        if self._trigger_pool is not None:
+            self._trigger_pool.shutdown()
+            self._trigger_pool = None
         for store in self.stores:
             if hasattr(store, 'save'):
                 store.save(reimport=False)
@@ -1386,6 +1510,297 @@ class Engine(AbstractEngine, gORM):
             character, orig, dest, rulebook, rule, branch, turn, tick
         )
 
+    def _invalidate_trigger_pool(self, *args, **kwargs):
+        self._trigger_pool_time = None
+
+    def _trigger_pool_snapshot(self):
+        from .triggerpool import snapshot_character, trigger_source
+        return 'snapshot', {
+            name: snapshot_character(char)
+            for (name, char) in self.character.items()
+        }, trigger_source(self.trigger)
+
+    def _check_triggers_in_pool(self, branch, turn, tick, tasks):
+        """Evaluate triggers in my process pool
+
+        ``tasks`` are as for :func:`LiSE.triggerpool.check_triggers`.
+        Return a list of booleans for whether each task's triggers fired.
+
+        The workers' replicas of the world are brought up to date with
+        the deltas since the last few times I called this, if I can;
+        otherwise with a snapshot of every character.
+
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from .triggerpool import check_triggers
+        if self._trigger_pool is None:
+            self._trigger_pool = ProcessPoolExecutor(self.trigger_workers)
+        submit = self._trigger_pool.submit
+        synced = self._trigger_pool_time
+        prev = self._trigger_pool_version
+        version = 0 if prev is None else prev + 1
+        deltas = self._trigger_pool_deltas
+        if (
+            synced is None or synced[0] != branch
+            or synced[1:] > (turn, tick)
+        ):
+            deltas.clear()
+            snapshot = payload = self._trigger_pool_snapshot()
+        else:
+            snapshot = None
+            if synced[1:] == (turn, tick):
+                deltas.append((version, {}))
+            else:
+                deltas.append((version, self.get_delta(
+                    branch, synced[1], synced[2], turn, tick)))
+            payload = 'deltas', list(deltas)
+        size = -(-len(tasks) // self.trigger_workers)
+        chunks = [tasks[i:i+size] for i in range(0, len(tasks), size)]
+        futs = [
+            submit(check_triggers, version, payload, chunk)
+            for chunk in chunks
+        ]
+        results = [fut.result() for fut in futs]
+        # workers that missed too many deltas get the chunk back with a
+        # snapshot, all at once, after everyone else has answered
+        missed = [i for (i, res) in enumerate(results) if res is None]
+        if missed:
+            if snapshot is None:
+                snapshot = self._trigger_pool_snapshot()
+            refuts = [
+                submit(check_triggers, version, snapshot, chunks[i])
+                for i in missed
+            ]
+            for i, fut in zip(missed, refuts):
+                results[i] = fut.result()
+        self._trigger_pool_version = version
+        self._trigger_pool_time = branch, turn, tick
+        return list(chain.from_iterable(results))
+
+    def _changed_since_triggers(self, branch, turn, tick):
+        """Return a set of what's changed since the triggers were last
+        checked, or ``None`` if they weren't checked earlier in ``branch``
+
+        The changes are pairs of a cache and the beginning of the entity
+        and key that changed in it, as compared with the reads recorded
+        by :meth:`LiSE.allegedb.cache.Cache.record_reads`.
+
+        """
+        prev = self._trigger_memos_time
+        self._trigger_memos_time = branch, turn, tick
+        if prev is None or prev[0] != branch or prev[1:] > (turn, tick):
+            return
+        since = prev[1:]
+        until = turn, tick
+        contents_cache = self._node_contents_cache
+        changed = set()
+        for cache in self._caches().values():
+            if cache is contents_cache:
+                continue
+            for change in cache.iter_changes(branch, since, until):
+                entikey = change[:-1]
+                for i in range(len(entikey) + 1):
+                    changed.add((cache, entikey[:i]))
+        # a thing moving changes the contents of two places in one tick,
+        # and the contents cache only keeps one of them in its settings
+        things_cache = self._things_cache
+        for before in (False, True):
+            for charn, _, loc in things_cache.iter_changes(
+                    branch, since, until, before=before):
+                changed.update((
+                    (contents_cache, ()),
+                    (contents_cache, (charn,)),
+                    (contents_cache, (charn, loc))
+                ))
+        return changed
+
+    def _memoized_trigger_caller(self, branch, turn, tick):
+        """Return a function to call triggers with, that returns what the
+        trigger returned last time, if nothing it read has changed
+
+        It takes the trigger, the entity, and the name of the character
+        and the path of the entity in it, as for the trigger pool.
+        Memos that aren't used this time are forgotten.
+
+        Once a trigger has to be called, the caches record what's read
+        from them until :meth:`_stop_recording_reads`.
+
+        """
+        memos = self._trigger_memos
+        changed = self._changed_since_triggers(branch, turn, tick)
+        self._trigger_memos = new_memos = {}
+        caches = list(self._caches().values())
+        # avatars are looked up in too many ways to keep track of
+        everything = {(self._avatarness_cache, ())}
+        # Changing the caches' classes to record reads and back is slow,
+        # so they keep recording for the rest of the pass, and the set is
+        # emptied before each trigger.
+        reads = set()
+        recording = False
+
+        def call_trigger(trigger, entity, charn, path):
+            nonlocal recording
+            key = getattr(trigger, '__wrapped__', trigger), charn, path
+            if key in new_memos:
+                return new_memos[key][0]
+            if changed is not None and key in memos:
+                memo = memos[key]
+                if changed.isdisjoint(memo[1]):
+                    new_memos[key] = memo
+                    return memo[0]
+            if not recording:
+                for cache in caches:
+                    cache.record_reads(reads)
+                recording = True
+            reads.clear()
+            try:
+                res = trigger(entity)
+            except BaseException:
+                self._stop_recording_reads()
+                raise
+            new_memos[key] = res, reads | everything
+            return res
+        return call_trigger
+
+    def _stop_recording_reads(self):
+        for cache in self._caches().values():
+            cache.stop_recording_reads()
+
+    def _stat_changes_since(self, branch, turn, tick):
+        """Return the turn and tick after which to look for changes to
+        watched stats, and remember that the rules were followed now
+
+        That's when the rules were last followed, if it was earlier in
+        ``branch``; otherwise, the start of the previous turn.
+
+        """
+        prev = self._rules_followed_time
+        self._rules_followed_time = branch, turn, tick
+        if prev is None or prev[0] != branch or prev[1:] > (turn, tick):
+            return turn - 1, -1
+        return prev[1:]
+
+    def _iter_stat_changes(self, since, branch, turn, tick):
+        """Iterate over the stats that changed after the turn and tick
+        ``since``
+
+        Yields triples of the kind of entity, ``'character'``,
+        ``'node'``, or ``'portal'``; the key of the entity, starting with
+        the name of its character; and the stat. Things moving count as
+        changes to their ``'location'``.
+
+        """
+        until = turn, tick
+        graph_val_cache = self._graph_val_cache
+        node_val_cache = self._node_val_cache
+        edge_val_cache = self._edge_val_cache
+        things_cache = self._things_cache
+        while True:
+            for charn, key, _ in graph_val_cache.iter_changes(
+                    branch, since, until):
+                yield 'character', (charn,), key
+            for charn, node, key, _ in node_val_cache.iter_changes(
+                    branch, since, until):
+                yield 'node', (charn, node), key
+            for charn, thing, _ in things_cache.iter_changes(
+                    branch, since, until):
+                yield 'node', (charn, thing), 'location'
+            for charn, orig, dest, _, key, _ in edge_val_cache.iter_changes(
+                    branch, since, until):
+                yield 'portal', (charn, orig, dest), key
+            if branch not in self._branches:
+                return
+            parent, parent_turn, parent_tick, _, _ = self._branches[branch]
+            if parent is None or (parent_turn, parent_tick) <= since:
+                return
+            branch = parent
+            until = parent_turn, parent_tick
+
+    def _iter_watched_rules(self, watched, since, branch, turn, tick):
+        """Iterate over the rules that watch stats changed after the turn
+        and tick ``since``, and haven't been followed for the entities
+        they changed in yet
+
+        ``watched`` maps rule names to the stats they watch. Yields the
+        rulebook, the rule name, a function to call when the rule's been
+        handled, the entity, its character's name, and its path in the
+        character.
+
+        """
+        stats = set().union(*watched.values())
+        charmap = self.character
+        node_exists = self._node_exists
+        edge_exists = self._edge_exists
+        get_node = self._get_node
+        get_edge = self._get_edge
+        seen = set()
+        for kind, key, stat in self._iter_stat_changes(
+                since, branch, turn, tick):
+            if stat not in stats:
+                continue
+            charn = key[0]
+            if charn not in charmap:
+                continue
+            if kind == 'character':
+                entity = charmap[charn]
+                path = ()
+                followers = [
+                    (self._character_rules_handled_cache, key,
+                     self._handled_char)]
+            elif kind == 'node':
+                noden = key[1]
+                if not node_exists(charn, noden):
+                    continue
+                entity = get_node(charn, noden)
+                path = ('node', noden)
+                if self._is_thing(charn, noden):
+                    followers = [(self._character_thing_rules_handled_cache,
+                                  key, self._handled_char_thing)]
+                else:
+                    followers = [(self._character_place_rules_handled_cache,
+                                  key, self._handled_char_place)]
+                followers.append(
+                    (self._node_rules_handled_cache, key, self._handled_node))
+                followers.extend(
+                    (self._avatar_rules_handled_cache, (user,) + key,
+                     self._handled_av) for user in entity.users)
+            else:
+                if not edge_exists(*key):
+                    continue
+                entity = get_edge(*key)
+                path = ('portal',) + key[1:]
+                followers = [
+                    (self._character_portal_rules_handled_cache, key,
+                     self._handled_char_port),
+                    (self._portal_rules_handled_cache, key,
+                     self._handled_portal)
+                ]
+            for rhcache, entkey, handled_fun in followers:
+                # the rulebooks shared by a character's entities are keyed
+                # by the name of the character using them
+                if rhcache in (self._node_rules_handled_cache,
+                               self._portal_rules_handled_cache):
+                    rbkey = entkey
+                else:
+                    rbkey = entkey[:1]
+                try:
+                    rulebook = rhcache.get_rulebook(
+                        *rbkey, branch, turn, tick)
+                    rules = rhcache.unhandled_rulebook_rules(
+                        *entkey, rulebook, branch, turn, tick)
+                except KeyError:
+                    continue
+                for rulen in rules:
+                    if stat not in watched.get(rulen, ()):
+                        continue
+                    seen_key = (rhcache, entkey, rulen)
+                    if seen_key in seen:
+                        continue
+                    seen.add(seen_key)
+                    yield rulebook, rulen, partial(
+                        handled_fun, *entkey, rulebook, rulen,
+                        branch, turn, tick), entity, charn, path
+
     def _follow_rule(self, rule, handled_fun, *args):
         self.debug("following rule: " + repr(rule))
 
@@ -1394,22 +1809,66 @@ class Engine(AbstractEngine, gORM):
         # TODO: if there's a paradox while following some rule,
         #  start a new branch, copying handled rules
         from collections import defaultdict
+        from timeit import default_timer
         branch, turn, tick = self._btt()
         charmap = self.character
         rulemap = self.rule
         todo = defaultdict(list)
+        profile = self._profile if self._profiling else None
+        if profile is None:
+            get_triggers = attrgetter('triggers')
+            get_prereqs = attrgetter('prereqs')
+            get_actions = attrgetter('actions')
+        else:
+            get_triggers = partial(profile.timed, kind='triggers')
+            get_prereqs = partial(profile.timed, kind='prereqs')
+            get_actions = partial(profile.timed, kind='actions')
 
-        def check_triggers(rule, handled_fun, entity):
-            for trigger in rule.triggers:
-                res = trigger(entity)
-                if res:
-                    return True
-            else:
-                handled_fun()
-                return False
+        watched = {}
+        watches_retr = self._watches_cache.retrieve
+        for rulen in self._watches_cache.iter_keys(branch, turn, tick):
+            try:
+                stats = watches_retr(rulen, branch, turn, tick)
+            except KeyError:
+                continue
+            if stats:
+                watched[rulen] = frozenset(stats)
+        stat_changes_since = self._stat_changes_since(branch, turn, tick)
+
+        if self.memoize_triggers and not self.trigger_workers:
+            call_trigger = self._memoized_trigger_caller(branch, turn, tick)
+        else:
+            call_trigger = None
+
+        if self.trigger_workers:
+            pending = []
+
+            def check_triggers(rulebook, rule, handled_fun, entity, charn,
+                               path=()):
+                if profile is not None:
+                    profile.count(rule, 'checked')
+                pending.append((rulebook, rule, handled_fun, entity, charn,
+                                path))
+        else:
+            def check_triggers(rulebook, rule, handled_fun, entity, charn,
+                               path=()):
+                if profile is not None:
+                    profile.count(rule, 'checked')
+                for trigger in get_triggers(rule):
+                    if call_trigger is None:
+                        res = trigger(entity)
+                    else:
+                        res = call_trigger(trigger, entity, charn, path)
+                    if res:
+                        if profile is not None:
+                            profile.count(rule, 'triggered')
+                        todo[rulebook].append((rule, handled_fun, entity))
+                        return
+                else:
+                    handled_fun()
 
         def check_prereqs(rule, handled_fun, entity):
-            for prereq in rule.prereqs:
+            for prereq in get_prereqs(rule):
                 res = prereq(entity)
                 if not res:
                     handled_fun()
@@ -1417,25 +1876,20 @@ class Engine(AbstractEngine, gORM):
             return True
 
         def do_actions(rule, handled_fun, entity):
+            if profile is not None:
+                profile.count(rule, 'performed')
             actres = []
-            for action in rule.actions:
+            for action in get_actions(rule):
                 res = action(entity)
                 if res:
                     actres.append(res)
             handled_fun()
             return actres
 
-        # TODO: triggers that don't mutate anything should be
-        #  evaluated in parallel
-        #  Ideally this would be implemented with a pool of
-        #  "engines" that serve Facades
-        #  mirroring the state of the world on turn start,
-        #  kept in sync with deltas.
-        #  I think I could do it with regular concurrent.futures pools though.
         for (
             charactername, rulebook, rulename
         ) in self._character_rules_handled_cache.iter_unhandled_rules(
-                branch, turn, tick
+                branch, turn, tick, skip=watched
         ):
             if charactername not in charmap:
                 continue
@@ -1444,15 +1898,14 @@ class Engine(AbstractEngine, gORM):
                 self._handled_char, charactername, rulebook, rulename,
                 branch, turn, tick)
             entity = charmap[charactername]
-            if check_triggers(rule, handled, entity):
-                todo[rulebook].append((rule, handled, entity))
+            check_triggers(rulebook, rule, handled, entity, charactername)
         avcache_retr = self._avatarness_cache._base_retrieve
         node_exists = self._node_exists
         get_node = self._get_node
         for (
             charn, graphn, avn, rulebook, rulen
         ) in self._avatar_rules_handled_cache.iter_unhandled_rules(
-                branch, turn, tick
+                branch, turn, tick, skip=watched
         ):
             if not node_exists(graphn, avn) or avcache_retr(
                     (charn, graphn, avn, branch, turn, tick)
@@ -1463,14 +1916,14 @@ class Engine(AbstractEngine, gORM):
                 self._handled_av, charn, graphn, avn, rulebook, rulen,
                 branch, turn, tick)
             entity = get_node(graphn, avn)
-            if check_triggers(rule, handled, entity):
-                todo[rulebook].append((rule, handled, entity))
+            check_triggers(
+                rulebook, rule, handled, entity, graphn, ('node', avn))
         is_thing = self._is_thing
         handled_char_thing = self._handled_char_thing
         for (
             charn, thingn, rulebook, rulen
         ) in self._character_thing_rules_handled_cache.iter_unhandled_rules(
-                branch, turn, tick):
+                branch, turn, tick, skip=watched):
             if not node_exists(charn, thingn) or not is_thing(charn, thingn):
                 continue
             rule = rulemap[rulen]
@@ -1478,13 +1931,13 @@ class Engine(AbstractEngine, gORM):
                 handled_char_thing, charn, thingn, rulebook, rulen,
                 branch, turn, tick)
             entity = get_node(charn, thingn)
-            if check_triggers(rule, handled, entity):
-                todo[rulebook].append((rule, handled, entity))
+            check_triggers(
+                rulebook, rule, handled, entity, charn, ('node', thingn))
         handled_char_place = self._handled_char_place
         for (
             charn, placen, rulebook, rulen
         ) in self._character_place_rules_handled_cache.iter_unhandled_rules(
-            branch, turn, tick
+            branch, turn, tick, skip=watched
         ):
             if not node_exists(charn, placen) or is_thing(charn, placen):
                 continue
@@ -1493,15 +1946,15 @@ class Engine(AbstractEngine, gORM):
                 handled_char_place, charn, placen, rulebook, rulen,
                 branch, turn, tick)
             entity = get_node(charn, placen)
-            if check_triggers(rule, handled, entity):
-                todo[rulebook].append((rule, handled, entity))
+            check_triggers(
+                rulebook, rule, handled, entity, charn, ('node', placen))
         edge_exists = self._edge_exists
         get_edge = self._get_edge
         handled_char_port = self._handled_char_port
         for (
             charn, orign, destn, rulebook, rulen
         ) in self._character_portal_rules_handled_cache.iter_unhandled_rules(
-            branch, turn, tick
+            branch, turn, tick, skip=watched
         ):
             if not edge_exists(charn, orign, destn):
                 continue
@@ -1510,13 +1963,13 @@ class Engine(AbstractEngine, gORM):
                 handled_char_port, charn, orign, destn, rulebook, rulen,
                 branch, turn, tick)
             entity = get_edge(charn, orign, destn)
-            if check_triggers(rule, handled, entity):
-                todo[rulebook].append((rule, handled, entity))
+            check_triggers(rulebook, rule, handled, entity, charn,
+                           ('portal', orign, destn))
         handled_node = self._handled_node
         for (
                 charn, noden, rulebook, rulen
         ) in self._node_rules_handled_cache.iter_unhandled_rules(
-            branch, turn, tick
+            branch, turn, tick, skip=watched
         ):
             if not node_exists(charn, noden):
                 continue
@@ -1525,13 +1978,13 @@ class Engine(AbstractEngine, gORM):
                 handled_node, charn, noden, rulebook, rulen,
                 branch, turn, tick)
             entity = get_node(charn, noden)
-            if check_triggers(rule, handled, entity):
-                todo[rulebook].append((rule, handled, entity))
+            check_triggers(
+                rulebook, rule, handled, entity, charn, ('node', noden))
         handled_portal = self._handled_portal
         for (
                 charn, orign, destn, rulebook, rulen
         ) in self._portal_rules_handled_cache.iter_unhandled_rules(
-                branch, turn, tick
+                branch, turn, tick, skip=watched
         ):
             if not edge_exists(charn, orign, destn):
                 continue
@@ -1540,8 +1993,44 @@ class Engine(AbstractEngine, gORM):
                 handled_portal, charn, orign, destn, rulebook, rulen,
                 branch, turn, tick)
             entity = get_edge(charn, orign, destn)
-            if check_triggers(rule, handled, entity):
+            check_triggers(rulebook, rule, handled, entity, charn,
+                           ('portal', orign, destn))
+        if watched:
+            for (
+                rulebook, rulen, handled, entity, charn, path
+            ) in self._iter_watched_rules(
+                watched, stat_changes_since, branch, turn, tick):
+                rule = rulemap[rulen]
+                if rule.triggers:
+                    check_triggers(
+                        rulebook, rule, handled, entity, charn, path)
+                    continue
+                # the change is all that triggers it
+                if profile is not None:
+                    profile.count(rule, 'checked')
+                    profile.count(rule, 'triggered')
                 todo[rulebook].append((rule, handled, entity))
+        if call_trigger is not None:
+            self._stop_recording_reads()
+        if self.trigger_workers and pending:
+            get_trigs = self._triggers_cache.retrieve
+            started = default_timer()
+            fired = self._check_triggers_in_pool(branch, turn, tick, [
+                (charn, path, get_trigs(rule.name, branch, turn, tick))
+                for (_, rule, _, _, charn, path) in pending
+            ])
+            if profile is not None:
+                profile.trigger_pool['calls'] += 1
+                profile.trigger_pool['seconds'] += default_timer() - started
+            for (rulebook, rule, handled, entity, _, _), res in zip(
+                    pending, fired
+            ):
+                if res:
+                    if profile is not None:
+                        profile.count(rule, 'triggered')
+                    todo[rulebook].append((rule, handled, entity))
+                else:
+                    handled()
 
         # TODO: rulebook priorities (not individual rule priorities, just follow the order of the rulebook)
         for rulebook in sort_set(todo.keys()):
@@ -1571,6 +2060,70 @@ class Engine(AbstractEngine, gORM):
         #     self._rules_iter = self._follow_rules()
         #     return ex
 
+    def _caches(self):
+        from .allegedb.cache import Cache
+        return {
+            name.lstrip('_'): cache for (name, cache) in vars(self).items()
+            if isinstance(cache, Cache)
+        }
+
+    def start_profiling(self):
+        """Start counting and timing what the rules do, and how often the
+        caches find what they're asked for in their memos
+
+        This forgets any profile made before. Profiling takes effect from
+        the next turn simulated.
+
+        """
+        from .profiling import RuleProfile
+        self._profile = RuleProfile()
+        self._profiling = True
+        for cache in self._caches().values():
+            cache.count_retrievals()
+
+    def stop_profiling(self):
+        """Stop profiling, and return the report of it
+
+        The report is as for :meth:`profiling_report`, which will keep
+        returning it until profiling starts again.
+
+        """
+        if not self._profiling:
+            raise ValueError("Not profiling")
+        self._profile_caches = {
+            name: dict(zip(('hits', 'misses'),
+                           cache.stop_counting_retrievals()))
+            for (name, cache) in self._caches().items()
+            if cache.retrievals is not None
+        }
+        self._profiling = False
+        return self.profiling_report()
+
+    def profiling_report(self):
+        """Return a dictionary of what the rules did since profiling
+        started, and how long it took
+
+        It has the keys of :class:`LiSE.profiling.RuleProfile`, and
+        ``'caches'``, keyed by the names of caches, each with how many
+        retrievals were ``'hits'`` in the cache's memo, and how many
+        were ``'misses'``.
+
+        """
+        if self._profile is None:
+            raise ValueError("Never profiled")
+        report = self._profile.report()
+        if self._profiling:
+            report['caches'] = {
+                name: dict(zip(('hits', 'misses'), cache.retrievals))
+                for (name, cache) in self._caches().items()
+                if cache.retrievals is not None
+            }
+        else:
+            report['caches'] = {
+                name: dict(counts)
+                for (name, counts) in self._profile_caches.items()}
+        return report
+
     def new_character(self, name, data=None, **kwargs):
         """Create and return a new :class:`Character`."""
         self.add_character(name, data, **kwargs)
@@ -1670,6 +2223,150 @@ class Engine(AbstractEngine, gORM):
                 character, node, *self._btt()
         )
 
+    def _settled_btt(self):
+        """Return the present, or the end of the branch if nothing has
+        happened since then, or ``None`` if the present is in a plan
+
+        Nothing can change what's true before the end of a branch, so
+        whatever's computed from the world at that time can be kept.
+
+        """
+        branch, turn, tick = self._btt()
+        end = turn_end, tick_end = self._branches[branch][3:5]
+        if (turn, tick) <= end:
+            return branch, turn, tick
+        # plans may be contradicted, so there's no telling how long
+        # anything computed from the planned future would be good
+        turn_end_plan = self._turn_end_plan
+        if turn_end_plan.get((branch, turn_end), 0) > tick_end or any(
+                turn_end_plan.get((branch, t), 0)
+                for t in range(turn_end + 1, turn + 1)):
+            return
+        return (branch,) + end
+
+    def _routing_changed(self, character, weight, branch, since, until):
+        """Return whether the nodes or portals of ``character``, or the
+        ``weight`` stat of its portals, changed in ``branch`` after the
+        time ``since`` and up to ``until``
+
+        Those are pairs of a turn and a tick.
+
+        """
+        for change in self._nodes_cache.iter_changes(branch, since, until):
+            if change[0] == character:
+                return True
+        for change in self._edges_cache.iter_changes(branch, since, until):
+            if change[0] == character:
+                return True
+        if weight is None:
+            return False
+        for change in self._edge_val_cache.iter_changes(
+                branch, since, until):
+            if change[0] == character and change[4] == weight:
+                return True
+        return False
+
+    def _routing_index(self, character, weight=None):
+        """Return a :class:`LiSE.routing.RoutingIndex` of the character's
+        portals at present, or ``None`` if the present is in a plan
+
+        The index is reused for as long as the character's nodes, its
+        portals, and the ``weight`` stat of its portals stay the same.
+
+        """
+        from .routing import RoutingIndex
+        settled = self._settled_btt()
+        if settled is None:
+            return
+        branch, turn, tick = settled
+        now = turn, tick
+        charn = character.name
+        routing = self._routing_indices
+        if (charn, weight) in routing:
+            built_branch, earliest, latest, index = routing[charn, weight]
+            if built_branch == branch:
+                if earliest <= now <= latest:
+                    return index
+                if now > latest and not self._routing_changed(
+                        charn, weight, branch, latest, now):
+                    routing[charn, weight] = branch, earliest, now, index
+                    return index
+                if now < earliest and not self._routing_changed(
+                        charn, weight, branch, now, earliest):
+                    routing[charn, weight] = branch, now, latest, index
+                    return index
+        index = RoutingIndex.from_character(character, weight)
+        routing[charn, weight] = branch, now, now, index
+        return index
+
+    def _snapshot_changes(self, character, branch, since, until):
+        """Return what changed in ``character`` in ``branch`` after the
+        time ``since`` and up to ``until``
+
+        That's a tuple of dictionaries with ``True`` for values: the
+        nodes that were made or deleted, the nodes whose stats changed,
+        the nodes whose portals were made or deleted, and the pairs of
+        origin and destination of portals whose stats changed.
+
+        """
+        nodes = {}
+        node_stats = {}
+        origs = {}
+        portals = {}
+        for change in self._nodes_cache.iter_changes(branch, since, until):
+            if change[0] == character:
+                nodes[change[1]] = True
+        for change in self._node_val_cache.iter_changes(
+                branch, since, until):
+            if change[0] == character:
+                node_stats[change[1]] = True
+        for change in self._edges_cache.iter_changes(branch, since, until):
+            if change[0] == character:
+                origs[change[1]] = True
+        for change in self._edge_val_cache.iter_changes(
+                branch, since, until):
+            if change[0] == character:
+                portals[change[1], change[2]] = True
+        return nodes, node_stats, origs, portals
+
+    def _snapshot(self, character):
+        """Return a :class:`LiSE.snapshot.Snapshot` of the character at
+        present
+
+        Snapshots are kept, and when asked for one at another time in
+        the same branch, only what changed in between is read again.
+
+        """
+        from .snapshot import Snapshot
+        settled = self._settled_btt()
+        if settled is None:
+            return Snapshot.from_character(character)
+        branch, turn, tick = settled
+        now = turn, tick
+        charn = character.name
+        snapshots = self._snapshots
+        if charn in snapshots:
+            built_branch, earliest, latest, snap = snapshots[charn]
+            if built_branch == branch:
+                if earliest <= now <= latest:
+                    return snap
+                if now > latest:
+                    changes = self._snapshot_changes(
+                        charn, branch, latest, now)
+                else:
+                    changes = self._snapshot_changes(
+                        charn, branch, now, earliest)
+                if not any(changes):
+                    snapshots[charn] = (
+                        branch, min(now, earliest), max(now, latest), snap)
+                    return snap
+                snap = snap.patched(character, *changes)
+                snapshots[charn] = branch, now, now, snap
+                return snap
+        snap = Snapshot.from_character(character)
+        snapshots[charn] = branch, now, now, snap
+        return snap
+
     def apply_choice(self, entity, key, value, dry_run=False):
         schema = self.schema
         assert schema.entity_permitted(entity)
@@ -34,7 +34,7 @@ as you ran this script from.
 """
 
 
-def install(eng):
+def install(eng, dorms=3, cells=100):
     phys = eng.new_character('physical')
     phys.stat['hour'] = 0
 
@@ -183,11 +183,11 @@ def install(eng):
     catch_up.prereq(in_class)
     catch_up.prereq(class_in_session)
 
-    # 3 dorms of 12 students each.
+    # 3 dorms of 12 students each, by default.
     # Each dorm has 6 rooms.
     # Modeling the teachers would be a logical way to extend this.
     student_body.stat['characters'] = []
-    for n in range(0, 3):
+    for n in range(0, dorms):
         dorm = eng.new_character('dorm{}'.format(n))
         common = phys.new_place('common{}'.format(n))  # A common room for students to meet in
         dorm.add_avatar(common)
@@ -217,7 +217,7 @@ def install(eng):
                     student_body.stat['characters'].append(student)
                 # Students' nodes are their brain cells.
                 # They are useless if drunk or slow, but recover from both conditions a bit every hour.
-                for k in range(0, 100):
+                for k in range(0, cells):
                     cell = student.new_node('cell{}'.format(k), drunk=0, slow=0)
                     #  ``new_node`` is just an alias for ``new_place``;
                     #  perhaps more logical when the places don't really
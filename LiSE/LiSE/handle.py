@@ -23,6 +23,7 @@ from collections import defaultdict
 from functools import partial
 from importlib import import_module
 from .engine import Engine
+from .wire import Delta
 
 
 def dict_delta(old, new):
@@ -54,6 +55,13 @@ def set_delta(old, new):
     return r
 
 
+# what the journal says about a character in which nothing changed
+_untouched = {
+    'stat': False, 'avatars': False, 'rulebooks': False,
+    'nodes': frozenset(), 'portals': frozenset()
+}
+
+
 def timely(fun):
     def run_timely(self, *args, **kwargs):
         ret = fun(self, *args, **kwargs)
@@ -120,6 +128,10 @@ class EngineHandle(object):
         self._rule_cache = {}
         self._rulebook_cache = defaultdict(list)
         self._stores_cache = defaultdict(dict)
+        # time at which the caches above were last made to match each
+        # character, so that I can find what's changed since in the journal
+        self._char_observed = {}
+        self._journal_memo = None
 
     def log(self, level, message):
         if isinstance(level, str):
@@ -165,7 +177,7 @@ class EngineHandle(object):
 
     def get_char_deltas(self, chars, *, store=True):
         """Return a dict describing changes to characters since last call"""
-        ret = {}
+        ret = Delta()
         if chars == 'all':
             it = iter(self._real.character.keys())
         else:
@@ -214,43 +226,25 @@ class EngineHandle(object):
         updd(self._strings_cache, delta.pop('strings', {}))
         for rule, d in delta.pop('rules', {}).items():
             updd(self._rulebook_cache.setdefault(rule, {}), d)
-        for char, d in delta.items():
-            nodeset = set(self._char_nodes_cache.setdefault(char, ()))
-            for n, ex in d.pop('nodes', {}).items():
-                if ex:
-                    nodeset.add(n)
-                else:
-                    nodeset.remove(n)
-            nodevd = self._node_stat_cache.setdefault(char, {})
-            for node, val in d.pop('node_val', {}).items():
-                nodenvd = nodevd.setdefault(node, {})
-                for k, v in val.items():
-                    if k != 'location' and v is None:
-                        if k in nodenvd:
-                            del nodenvd[k]
-                    else:
-                        nodenvd[k] = v
-            edges = set(self._char_portals_cache.setdefault(char, ()))
-            for orig, dests in d.pop('edges', {}).items():
-                for dest, exists in dests.items():
-                    if exists:
-                        edges.add((orig, dest))
-                    else:
-                        edges.remove((orig, dest))
-            edgevd = self._portal_stat_cache.setdefault(char, {})
-            for orig, dests in d.pop('edge_val', {}).items():
-                for dest, val in dests.items():
-                    updd(edgevd.setdefault(orig, {}).setdefault(dest, {}), val)
+        # the journal knows which characters changed, and which entities
+        # in them
+        for char in list(self._char_observed):
+            if char not in self._real.character:
+                continue
+            if self._journal_touched(char) is _untouched:
+                self._observe(char)
+            else:
+                self.character_delta(char)
 
     @timely
     def next_turn(self):
         self.debug('calling next_turn at {}, {}, {}'.format(*self._real._btt()))
         ret, delta = self._real.next_turn()
         self._after_ret = partial(self._upd_local_caches, delta)
-        return ret, delta
+        return ret, Delta(delta)
 
     def get_slow_delta(self, chars='all', store=True):
-        delta = {}
+        delta = Delta()
         if chars:
             delta = self.get_char_deltas(chars, store=store)
         etd = self.eternal_delta(store=store)
@@ -283,7 +277,7 @@ class EngineHandle(object):
         else:
             delta = self._real.get_delta(branch, turn_from, tick_from, turn, tick)
             self._after_ret = partial(self._upd_local_caches, delta)
-        return None, delta
+        return None, Delta(delta)
 
     @timely
     def increment_branch(self, chars=[]):
@@ -329,6 +323,15 @@ class EngineHandle(object):
     def close(self):
         self._real.close()
 
+    def start_profiling(self):
+        self._real.start_profiling()
+
+    def stop_profiling(self):
+        return self._real.stop_profiling()
+
+    def profiling_report(self):
+        return self._real.profiling_report()
+
     def get_branch(self):
         return self._real.branch
 
@@ -467,7 +470,8 @@ class EngineHandle(object):
                 self._char_nodes_rulebooks_cache,
                 self._char_portals_rulebooks_cache,
                 self._char_nodes_cache,
-                self._char_portals_cache
+                self._char_portals_cache,
+                self._char_observed
         ):
             if char in cache:
                 del cache[char]
@@ -625,7 +629,32 @@ class EngineHandle(object):
         return ret
 
     def character_delta(self, char, *, store=True):
-        """Return a dictionary of changes to ``char`` since previous call."""
+        """Return a dictionary of changes to ``char`` since previous call.
+
+        If I've looked at the character before, this only compares the
+        entities that the caches' journal says have changed since.
+
+        """
+        touched = self._journal_touched(char)
+        if touched is None:
+            ret = self._character_slow_delta(char, store=store)
+        else:
+            ret = self._character_journal_delta(char, touched, store=store)
+        if store:
+            self._observe(char)
+        return ret
+
+    def _observe(self, char):
+        """Remember that my caches match ``char`` as it is now"""
+        branch, turn, tick = now = self._real._btt()
+        if (turn, tick) <= self._real._branches[branch][3:5]:
+            self._char_observed[char] = now
+        else:
+            # I'm looking at plans, and if they're contradicted,
+            # they'll be deleted from the journal
+            self._char_observed.pop(char, None)
+
+    def _character_slow_delta(self, char, *, store=True):
         ret = self.character_stat_delta(char, store=store)
         nodes = self.character_nodes_delta(char, store=store)
         chara = self._real.character[char]
@@ -640,6 +669,12 @@ class EngineHandle(object):
         rbs = self.character_rulebooks_delta(char, store=store)
         if rbs:
             ret['rulebooks'] = rbs
+        nv = self.character_nodes_stat_delta(char, store=store)
+        if nv:
+            ret['node_val'] = nv
+        ev = self.character_portals_stat_delta(char, store=store)
+        if ev:
+            ret['edge_val'] = ev
         nrbs = self.character_nodes_rulebooks_delta(char, store=store)
         if nrbs:
             for node, rb in nrbs.items():
@@ -656,12 +691,219 @@ class EngineHandle(object):
                     if dest not in portals:
                         continue
                     ret.setdefault('edge_val', {}).setdefault(orig, {}).setdefault(dest, {})['rulebook'] = rb
-        nv = self.character_nodes_stat_delta(char, store=store)
-        if nv:
-            ret['node_val'] = nv
-        ev = self.character_portals_stat_delta(char, store=store)
-        if ev:
-            ret['edge_val'] = ev
+        return ret
+
+    def _journal_windows(self, since, now):
+        """Return a list of ``(branch, lo, hi)``, where ``lo`` and ``hi`` are
+        pairs of turn and tick, covering every change between two times
+
+        Return ``None`` if the caches' journal might be missing some of
+        those changes.
+
+        """
+        real = self._real
+        branches = real._branches
+        branch_from, turn_from, tick_from = since
+        branch_to, turn_to, tick_to = now
+        # Go up from where I looked, and from where I am, to the nearest
+        # branch that both are descended from. Either time might be
+        # earlier in that branch.
+        left = {}
+        branch, time = branch_from, (turn_from, tick_from)
+        while branch is not None:
+            left[branch] = time
+            parent, turn, tick, _, _ = branches[branch]
+            branch, time = parent, (turn, tick)
+        windows = []
+        branch, time = branch_to, (turn_to, tick_to)
+        while branch not in left:
+            parent, turn, tick, _, _ = branches[branch]
+            windows.append((branch, (turn, tick), time))
+            branch, time = parent, (turn, tick)
+        common = branch
+        windows.append(
+            (common, min(time, left[common]), max(time, left[common])))
+        branch, time = branch_from, (turn_from, tick_from)
+        while branch != common:
+            parent, turn, tick, _, _ = branches[branch]
+            windows.append((branch, (turn, tick), time))
+            branch = parent
+        if real._lazy:
+            loaded = real._loaded
+            for branch, lo, hi in windows:
+                for graph in real._graph_objs:
+                    if (graph, branch) not in loaded:
+                        return
+                    turn_from, tick_from, turn_to, tick_to \
+                        = loaded[graph, branch]
+                    if (turn_from, tick_from) > lo or (
+                            turn_to is not None and (turn_to, tick_to) < hi):
+                        return
+        return windows
+
+    def _journal_touched(self, char):
+        """Return what the journal says changed in ``char`` since I last
+        looked at it, or ``None`` if I can't tell that way
+
+        """
+        since = self._char_observed.get(char)
+        if since is None:
+            return
+        now = self._real._btt()
+        memo = self._journal_memo
+        if memo is None or memo[:2] != (since, now):
+            windows = self._journal_windows(since, now)
+            if windows is None:
+                touched = None
+            else:
+                touched = self._journal_collect(windows)
+            memo = self._journal_memo = since, now, touched
+        touched = memo[2]
+        if touched is None:
+            return
+        return touched.get(char, _untouched)
+
+    def _journal_collect(self, windows):
+        """Return a dictionary, keyed by character, of what changed in
+        these windows of history"""
+        real = self._real
+        touched = {}
+
+        def get(char):
+            if char not in touched:
+                touched[char] = {
+                    'stat': False, 'avatars': False, 'rulebooks': False,
+                    'nodes': set(), 'portals': set(),
+                    'portal_rulebooks': set()
+                }
+            return touched[char]
+
+        def stat(char, *args):
+            get(char)['stat'] = True
+
+        def node(char, node, *args):
+            get(char)['nodes'].add(node)
+
+        def portal(char, orig, dest, *args):
+            get(char)['portals'].add((orig, dest))
+
+        def portal_rulebook(char, orig, dest, *args):
+            portal(char, orig, dest)
+            get(char)['portal_rulebooks'].add((orig, dest))
+
+        def avatar(char, *args):
+            get(char)['avatars'] = True
+
+        def rulebook(_, char, *args):
+            get(char)['rulebooks'] = True
+        collectors = (
+            (real._graph_val_cache, stat),
+            (real._nodes_cache, node),
+            (real._node_val_cache, node),
+            (real._things_cache, node),
+            (real._nodes_rulebooks_cache, node),
+            (real._edges_cache, portal),
+            (real._edge_val_cache, portal),
+            (real._portals_rulebooks_cache, portal_rulebook),
+            (real._avatarness_cache, avatar),
+            (real._characters_rulebooks_cache, rulebook),
+            (real._avatars_rulebooks_cache, rulebook),
+            (real._characters_things_rulebooks_cache, rulebook),
+            (real._characters_places_rulebooks_cache, rulebook),
+            (real._characters_portals_rulebooks_cache, rulebook)
+        )
+        for branch, lo, hi in windows:
+            for cache, collect in collectors:
+                for change in cache.iter_changes(branch, lo, hi):
+                    collect(*change)
+        return touched
+
+    def _character_journal_delta(self, char, touched, *, store=True):
+        """Return changes to ``char``, comparing only the entities in
+        ``touched``"""
+        chara = self._real.character[char]
+        ret = {}
+        if touched['stat']:
+            ret = self.character_stat_delta(char, store=store)
+        if touched['avatars']:
+            avs = self.character_avatars_delta(char, store=store)
+            if avs:
+                ret['avatars'] = avs
+        if touched['rulebooks']:
+            rbs = self.character_rulebooks_delta(char, store=store)
+            if rbs:
+                ret['rulebooks'] = rbs
+        nodeset = self._char_nodes_cache.get(char, frozenset())
+        if store and type(nodeset) is not set:
+            nodeset = self._char_nodes_cache[char] = set(nodeset)
+        node_stats = self._node_stat_cache[char]
+        node_rbs = self._char_nodes_rulebooks_cache[char]
+        nodes = {}
+        node_val = {}
+        for node in touched['nodes']:
+            exists = node in chara.node
+            if exists != (node in nodeset):
+                nodes[node] = exists
+            if not exists:
+                if store:
+                    nodeset.discard(node)
+                    node_stats.pop(node, None)
+                    node_rbs.pop(node, None)
+                continue
+            if store:
+                nodeset.add(node)
+            delt = self.node_stat_delta(char, node, store=store) or {}
+            rb = chara.node[node].rulebook.name
+            if node_rbs.get(node) != rb:
+                delt['rulebook'] = rb
+                if store:
+                    node_rbs[node] = rb
+            if delt:
+                node_val[node] = delt
+        if nodes:
+            ret['nodes'] = nodes
+        if node_val:
+            ret['node_val'] = node_val
+        portset = self._char_portals_cache.get(char, set())
+        if store:
+            self._char_portals_cache[char] = portset
+        portal_stats = self._portal_stat_cache[char]
+        portal_rbs = self._char_portals_rulebooks_cache[char]
+        edges = {}
+        edge_val = {}
+        for orig, dest in touched['portals']:
+            exists = orig in chara.portal and dest in chara.portal[orig]
+            if exists != ((orig, dest) in portset):
+                edges.setdefault(orig, {})[dest] = exists
+            if not exists:
+                if store:
+                    portset.discard((orig, dest))
+                    if orig in portal_stats:
+                        portal_stats[orig].pop(dest, None)
+                    if orig in portal_rbs:
+                        portal_rbs[orig].pop(dest, None)
+                continue
+            if store:
+                portset.add((orig, dest))
+            delt = self.portal_stat_delta(
+                char, orig, dest, store=store) or {}
+            if (orig, dest) not in touched['portal_rulebooks']:
+                # like ``character_portals_rulebooks_delta``, only report
+                # rulebooks that were set
+                if delt:
+                    edge_val.setdefault(orig, {})[dest] = delt
+                continue
+            rb = chara.portal[orig][dest].rulebook.name
+            if portal_rbs.get(orig, {}).get(dest) != rb:
+                delt['rulebook'] = rb
+                if store:
+                    portal_rbs.setdefault(orig, {})[dest] = rb
+            if delt:
+                edge_val.setdefault(orig, {})[dest] = delt
+        if edges:
+            ret['edges'] = edges
+        if edge_val:
+            ret['edge_val'] = edge_val
         return ret
     
     @timely
@@ -799,8 +1041,7 @@ class EngineHandle(object):
             )
             tick_now = self._real.tick
             self._real.tick = parrev
-        for i, (n, npatch) in enumerate(patch.items(), 1):
-            self.update_node(char, n, npatch)
+        self._real.character[char].patch_nodes(patch)
         if backdate:
             self._real.tick = tick_now
 
@@ -1091,10 +1332,7 @@ class EngineHandle(object):
 
     @timely
     def update_portals(self, char, patch):
-        branch = self.branch
-        for ((orig, dest), ppatch) in patch.items():
-            branch = self.update_portal(char, orig, dest, ppatch)
-        return branch
+        self._real.character[char].patch_portals(patch)
 
     @timely
     def add_avatar(self, char, graph, node):
@@ -1160,6 +1398,10 @@ class EngineHandle(object):
     def set_rule_actions(self, rule, actions):
         self._real.rule[rule].actions = actions
 
+    @timely
+    def set_rule_watches(self, rule, watches):
+        self._real.rule[rule].watches = watches
+
     @timely
     def set_character_rulebook(self, char, rulebook):
         self._real.character[char].rulebook = rulebook
@@ -1194,14 +1436,20 @@ class EngineHandle(object):
 
     def rule_copy(self, rule):
         branch, turn, tick = self.branch, self.turn, self.tick
+        try:
+            watches = list(self._real._watches_cache.retrieve(
+                rule, branch, turn, tick))
+        except KeyError:
+            watches = []
         return {
             'triggers': list(self._real._triggers_cache.retrieve(rule, branch, turn, tick)),
             'prereqs': list(self._real._prereqs_cache.retrieve(rule, branch, turn, tick)),
-            'actions': list(self._real._actions_cache.retrieve(rule, branch, turn, tick))
+            'actions': list(self._real._actions_cache.retrieve(rule, branch, turn, tick)),
+            'watches': watches
         }
 
     def rule_delta(self, rule, *, store=True):
-        old = self._rule_cache.get(rule, {'triggers': [], 'prereqs': [], 'actions': []})
+        old = self._rule_cache.get(rule, {'triggers': [], 'prereqs': [], 'actions': [], 'watches': []})
         new = self.rule_copy(rule)
         if store:
             self._rule_cache[rule] = new
@@ -1212,6 +1460,8 @@ class EngineHandle(object):
             ret['prereqs'] = new['prereqs']
         if new['actions'] != old['actions']:
             ret['actions'] = new['actions']
+        if new['watches'] != old['watches']:
+            ret['watches'] = new['watches']
         return ret
 
     def all_rules_delta(self, *, store=True):
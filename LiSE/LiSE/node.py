@@ -137,17 +137,15 @@ class NodeContent(Mapping):
 
     def __iter__(self):
         try:
-            yield from self.node.engine._node_contents_cache.retrieve(
-                self.node.character.name, self.node.name, *self.node.engine._btt()
-            )
+            yield from self.node.engine._node_contents(
+                self.node.character.name, self.node.name)
         except KeyError:
             return
 
     def __len__(self):
         try:
-            return len(self.node.engine._node_contents_cache.retrieve(
-                self.node.character.name, self.node.name, *self.node.engine._btt()
-            ))
+            return len(self.node.engine._node_contents(
+                self.node.character.name, self.node.name))
         except KeyError:
             return 0
 
@@ -404,9 +402,11 @@ class Node(graph.Node, rule.RuleFollower):
 
         """
 
-        return shortest_path_length(
-            self.character, self.name, self._plain_dest_name(dest), weight
-        )
+        destn = self._plain_dest_name(dest)
+        index = self.engine._routing_index(self.character, weight)
+        if index is not None:
+            return index.shortest_path_length(self.name, destn)
+        return shortest_path_length(self.character, self.name, destn, weight)
 
     def shortest_path(self, dest, weight=None):
         """Return a list of node names leading from me to ``dest``.
@@ -415,9 +415,11 @@ class Node(graph.Node, rule.RuleFollower):
         or the name of one.
 
         """
-        return shortest_path(
-            self.character, self.name, self._plain_dest_name(dest), weight
-        )
+        destn = self._plain_dest_name(dest)
+        index = self.engine._routing_index(self.character, weight)
+        if index is not None:
+            return index.shortest_path(self.name, destn)
+        return shortest_path(self.character, self.name, destn, weight)
 
     def path_exists(self, dest, weight=None):
         """Return whether there is a path leading from me to ``dest``.
@@ -37,6 +37,11 @@ class Place(Node):
             return self.name
         return super().__getitem__(key)
 
+    def _get_cache_history(self, key, branch, turn_from, turn_to):
+        if key == 'name':
+            return [(turn_from, self.name)]
+        return super()._get_cache_history(key, branch, turn_from, turn_to)
+
     def __repr__(self):
         return "{}.character[{}].place[{}]".format(
             repr(self.engine),
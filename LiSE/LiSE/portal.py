@@ -135,6 +135,26 @@ class Portal(Edge, RuleFollower):
         else:
             return super().__getitem__(key)
 
+    def _get_cache_history(self, key, branch, turn_from, turn_to):
+        if key == 'origin':
+            return [(turn_from, self.orig)]
+        elif key == 'destination':
+            return [(turn_from, self.dest)]
+        elif key == 'character':
+            return [(turn_from, self.character.name)]
+        mirror = super()._get_cache_history(
+            'is_mirror', branch, turn_from, turn_to)
+        if key == 'is_mirror':
+            ret = []
+            for turn, v in mirror:
+                if not ret or ret[-1][1] != bool(v):
+                    ret.append((turn, bool(v)))
+            return ret
+        if any(v for (_, v) in mirror):
+            # the values are in the preportal some of the time
+            return None
+        return super()._get_cache_history(key, branch, turn_from, turn_to)
+
     def __setitem__(self, key, value):
         """Set ``key``=``value`` at the present game-time.
 
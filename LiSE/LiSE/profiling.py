@@ -0,0 +1,100 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Finding out which rules take up the time.
+
+Call :meth:`LiSE.engine.Engine.start_profiling`, simulate some turns,
+then call :meth:`LiSE.engine.Engine.stop_profiling` to get a report of
+what the rules did, and how long they took. While profiling, the caches
+count how often they find what they're asked for in their memos, too.
+
+"""
+from collections import defaultdict
+from functools import wraps
+from timeit import default_timer
+
+
+def _rule_stats():
+    return {'checked': 0, 'triggered': 0, 'performed': 0, 'seconds': 0.}
+
+
+def _function_stats():
+    return {'calls': 0, 'seconds': 0.}
+
+
+class RuleProfile(object):
+    """Counts and times of following rules
+
+    ``rules`` is keyed by the names of rules. For each, ``'checked'`` is
+    how many entities it checked the triggers of, ``'triggered'`` how
+    many of those set it off, and ``'performed'`` how many got past the
+    prereqs to have the actions done to them. ``'seconds'`` is the time
+    spent in all of its functions.
+
+    ``triggers``, ``prereqs``, and ``actions`` are keyed by the names of
+    functions, each with the number of ``'calls'`` and the ``'seconds'``
+    they took.
+
+    Triggers checked in the engine's process pool aren't timed one by
+    one; ``trigger_pool`` has the number of times the pool was used and
+    the seconds that took, instead.
+
+    """
+    __slots__ = ('rules', 'triggers', 'prereqs', 'actions', 'trigger_pool')
+
+    def __init__(self):
+        self.rules = defaultdict(_rule_stats)
+        self.triggers = defaultdict(_function_stats)
+        self.prereqs = defaultdict(_function_stats)
+        self.actions = defaultdict(_function_stats)
+        self.trigger_pool = _function_stats()
+
+    def timed(self, rule, kind):
+        """Return a list of ``rule``'s functions of ``kind``, which is
+        ``'triggers'``, ``'prereqs'``, or ``'actions'``, that record how
+        long they take"""
+        rulestats = self.rules[rule.name]
+        funstats = getattr(self, kind)
+
+        def timer(fun):
+            stats = funstats[fun.__name__]
+
+            @wraps(fun)
+            def timed(entity):
+                start = default_timer()
+                try:
+                    return fun(entity)
+                finally:
+                    secs = default_timer() - start
+                    stats['calls'] += 1
+                    stats['seconds'] += secs
+                    rulestats['seconds'] += secs
+            return timed
+        return [timer(fun) for fun in getattr(rule, kind)]
+
+    def count(self, rule, what):
+        """Add one to how many entities ``rule`` has done ``what`` to"""
+        self.rules[rule.name][what] += 1
+
+    def report(self):
+        """Return a dictionary of plain dictionaries of my counts and
+        times"""
+        return {
+            'rules': {k: dict(v) for (k, v) in self.rules.items()},
+            'triggers': {k: dict(v) for (k, v) in self.triggers.items()},
+            'prereqs': {k: dict(v) for (k, v) in self.prereqs.items()},
+            'actions': {k: dict(v) for (k, v) in self.actions.items()},
+            'trigger_pool': dict(self.trigger_pool)
+        }
@@ -21,7 +21,10 @@ entity in the LiSE core.
 
 """
 import sys
+import os
 import logging
+import pickle
+import struct
 from abc import abstractmethod
 from random import Random
 from collections.abc import (
@@ -31,7 +34,9 @@ from collections.abc import (
 )
 from functools import partial
 from threading import Thread, Lock
-from multiprocessing import Process, Pipe, Queue, ProcessError
+from multiprocessing import (
+    Process, Pipe, Queue, ProcessError, Semaphore
+)
 from concurrent.futures import ThreadPoolExecutor
 from queue import Empty
 
@@ -317,9 +322,25 @@ class ThingProxy(NodeProxy):
                 character.engine, '_initialized', True):
             raise ValueError("Thing must have location")
         super().__init__(character, name)
+        self._loc = None
         self._location = location
         self._cache.update(kwargs)
 
+    @property
+    def _location(self):
+        return self._loc
+
+    @_location.setter
+    def _location(self, v):
+        # keep the engine's index of what's where up to date
+        contents = self.engine._node_contents_cache
+        if self._loc is not None:
+            contents.get((self._charname, self._loc), set()).discard(
+                self.name)
+        self._loc = v
+        if v is not None:
+            contents.setdefault((self._charname, v), set()).add(self.name)
+
     def __iter__(self):
         yield from super().__iter__()
         yield 'location'
@@ -1089,6 +1110,17 @@ class RuleProxy(Signal):
             actions=self._nominate(v), block=False)
         self.send(self, actions=v)
 
+    @property
+    def watches(self):
+        return self._cache.setdefault('watches', [])
+
+    @watches.setter
+    def watches(self, v):
+        self._cache['watches'] = v = list(v)
+        self.engine.handle(
+            'set_rule_watches', rule=self.name, watches=v, block=False)
+        self.send(self, watches=v)
+
     def __init__(self, engine, rulename):
         super().__init__()
         self.engine = engine
@@ -1769,7 +1801,7 @@ class StringStoreProxy(Signal):
 
     def __setattr__(self, k, v):
         if k in ('_cache', 'engine', 'language', '_language', 'receivers',
-                 '_by_receiver', '_by_sender', '_weak_senders'):
+                 '_by_receiver', '_by_sender', '_weak_senders', 'is_muted'):
             super().__setattr__(k, v)
             return
         self._cache[k] = v
@@ -1970,7 +2002,8 @@ class FuncStoreProxy(Signal):
 
     def __setattr__(self, func_name, source):
         if func_name in ('engine', '_store', '_cache', 'receivers',
-                         '_by_sender', '_by_receiver', '_weak_senders'):
+                         '_by_sender', '_by_receiver', '_weak_senders',
+                         'is_muted'):
             super().__setattr__(func_name, source)
             return
         self.engine.handle(
@@ -2179,6 +2212,8 @@ class EngineProxy(AbstractEngine):
         self._portal_stat_cache = StructuredDefaultDict(2, UnwrappingDict)
         self._char_stat_cache = PickyDefaultDict(UnwrappingDict)
         self._things_cache = StructuredDefaultDict(1, ThingProxy)
+        # names of things, keyed by their character and location
+        self._node_contents_cache = {}
         self._character_places_cache = StructuredDefaultDict(1, PlaceProxy)
         self._character_rulebooks_cache = StructuredDefaultDict(
             1, RuleBookProxy, kwargs_munger=lambda inst, k: {
@@ -2245,6 +2280,9 @@ class EngineProxy(AbstractEngine):
         self._handle_in_lock.acquire(blocking, timeout)
         data = self._handle_in.recv()
         self._handle_in_lock.release()
+        if type(data[-1]) is tuple:
+            # too big for the pipe, so it's in shared memory
+            data = data[:-1] + (unshare(*data[-1]),)
         return data
 
     def debug(self, msg):
@@ -2628,15 +2666,187 @@ class EngineProxy(AbstractEngine):
         self.handle('close')
         self.send('shutdown')
 
+    def start_profiling(self):
+        """Start profiling the rules in the core, as
+        :meth:`LiSE.engine.Engine.start_profiling`"""
+        self.handle('start_profiling')
+
+    def stop_profiling(self):
+        """Stop profiling the rules in the core, and return the report"""
+        return self.handle('stop_profiling')
+
+    def profiling_report(self):
+        """Return the report of profiling the rules in the core"""
+        return self.handle('profiling_report')
+
     def _node_contents(self, character, node):
-        # very slow. do better
-        for thing in self.character[character].thing.values():
-            if thing['location'] == node:
-                yield thing.name
+        # things deleted since they got here may still be in the index
+        things = self._things_cache[character]
+        return frozenset(
+            thing for thing in self._node_contents_cache.get(
+                (character, node), ())
+            if thing in things and things[thing]._location == node
+        )
+
+
+def share(data):
+    """Put ``data`` in a new block of shared memory
+
+    Return the name of the block and the length of the data, for
+    :func:`unshare`, which frees the block.
+
+    Requires Python 3.8 or later.
+
+    """
+    # not at the top, so LiSE still imports on older Pythons
+    from multiprocessing import resource_tracker
+    from multiprocessing.shared_memory import SharedMemory
+    size = len(data)
+    shm = SharedMemory(create=True, size=size)
+    shm.buf[:size] = data
+    # the block belongs to whoever unshares it now
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    shm.close()
+    return shm.name, size
+
+
+def unshare(name, size):
+    """Return the data that :func:`share` put in shared memory, and free it"""
+    from multiprocessing.shared_memory import SharedMemory
+    shm = SharedMemory(name)
+    data = bytes(shm.buf[:size])
+    shm.close()
+    shm.unlink()
+    return data
+
+
+# bytes of messages that a RingConnection can hold at once
+RING_SIZE = 1 << 22
+# messages take up a whole number of slots of this many bytes
+SLOT_SIZE = 1 << 12
+
+
+class RingConnection(object):
+    """One direction of a connection, through a ring buffer in shared memory
+
+    Stands in for one end of a ``Pipe(duplex=False)``: one process
+    calls :meth:`send`, the other calls :meth:`recv`. The ring is cut
+    into slots, and each message takes up as many slots as it needs, in
+    order. One semaphore counts the free slots, so the sender sleeps
+    until there's room; another counts the messages waiting, so the
+    receiver sleeps until there's something to read. Messages too big
+    for the ring go through :func:`share` instead.
+
+    Only one thread may send at a time, and only one may receive.
+    Requires Python 3.8 or later.
+
+    """
+    __slots__ = ('_shm', '_buf', '_slot_size', '_slots', '_ready', '_free',
+                 '_send_pos', '_recv_pos', '_owner')
+    # each message is prefixed with its length and what kind it is
+    _prefix = struct.Struct('=IB')
+    _PICKLED = 0
+    _SHARED = 1
+    # the rest of the ring is empty, and the next message is at its start
+    _WRAP = 2
+
+    def __init__(self, size=RING_SIZE, slot_size=SLOT_SIZE):
+        from multiprocessing.shared_memory import SharedMemory
+        self._slot_size = slot_size
+        self._slots = slots = max((size // slot_size, 2))
+        self._shm = SharedMemory(create=True, size=slots * slot_size)
+        self._buf = self._shm.buf
+        self._ready = Semaphore(0)
+        self._free = Semaphore(slots)
+        # the sender and receiver each keep track of their own position,
+        # so neither has to be in shared memory
+        self._send_pos = self._recv_pos = 0
+        self._owner = os.getpid()
+
+    def __getstate__(self):
+        return (
+            self._shm.name, self._slot_size, self._slots, self._ready,
+            self._free, self._send_pos, self._recv_pos, self._owner
+        )
+
+    def __setstate__(self, state):
+        from multiprocessing import resource_tracker
+        from multiprocessing.shared_memory import SharedMemory
+        (name, self._slot_size, self._slots, self._ready, self._free,
+         self._send_pos, self._recv_pos, self._owner) = state
+        self._shm = SharedMemory(name)
+        # the block belongs to the process that made it
+        resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._buf = self._shm.buf
+
+    def _slots_for(self, size):
+        return -(-(self._prefix.size + size) // self._slot_size)
+
+    def send(self, obj):
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        kind = self._PICKLED
+        n = self._slots_for(len(data))
+        if n > self._slots:
+            data = pickle.dumps(share(data), pickle.HIGHEST_PROTOCOL)
+            kind = self._SHARED
+            n = self._slots_for(len(data))
+        acquire = self._free.acquire
+        prefix = self._prefix
+        pos = self._send_pos
+        if pos + n > self._slots:
+            # messages don't wrap around, so skip to the start
+            for _ in range(self._slots - pos):
+                acquire()
+            prefix.pack_into(
+                self._buf, pos * self._slot_size, 0, self._WRAP)
+            self._ready.release()
+            pos = 0
+        for _ in range(n):
+            acquire()
+        start = pos * self._slot_size
+        prefix.pack_into(self._buf, start, len(data), kind)
+        start += prefix.size
+        self._buf[start:start+len(data)] = data
+        self._send_pos = (pos + n) % self._slots
+        self._ready.release()
+
+    def recv(self):
+        prefix = self._prefix
+        release = self._free.release
+        while True:
+            self._ready.acquire()
+            pos = self._recv_pos
+            start = pos * self._slot_size
+            size, kind = prefix.unpack_from(self._buf, start)
+            if kind == self._WRAP:
+                self._recv_pos = 0
+                for _ in range(self._slots - pos):
+                    release()
+                continue
+            start += prefix.size
+            # unpickle straight out of the ring, before freeing its slots
+            obj = pickle.loads(self._buf[start:start+size])
+            n = self._slots_for(size)
+            self._recv_pos = (pos + n) % self._slots
+            for _ in range(n):
+                release()
+            if kind == self._SHARED:
+                obj = pickle.loads(unshare(*obj))
+            return obj
+
+    def close(self):
+        """Stop using the shared memory, freeing it if I made it"""
+        if self._buf is None:
+            return
+        self._buf = None
+        self._shm.close()
+        if os.getpid() == self._owner:
+            self._shm.unlink()
 
 
 def subprocess(
-    args, kwargs, handle_out_pipe, handle_in_pipe, logq, loglevel
+    args, kwargs, handle_out_pipe, handle_in_pipe, logq, loglevel,
+    shm_threshold=None
 ):
     def log(typ, data):
         from os import getpid
@@ -2655,6 +2865,14 @@ def subprocess(
             )
     engine_handle = EngineHandle(args, kwargs, logq, loglevel=loglevel)
 
+    def send_result(cmd, packed):
+        if shm_threshold is not None and len(packed) > shm_threshold:
+            packed = share(packed)
+        handle_in_pipe.send((
+            cmd, engine_handle.branch, engine_handle.turn, engine_handle.tick,
+            packed
+        ))
+
     while True:
         inst = handle_out_pipe.recv()
         if inst == 'shutdown':
@@ -2678,18 +2896,11 @@ def subprocess(
                 r = getattr(engine_handle, cmd)(**instruction)
         except Exception as e:
             log('exception', repr(e))
-            handle_in_pipe.send((
-                cmd, engine_handle.branch,
-                engine_handle.turn, engine_handle.tick,
-                engine_handle.pack(e)
-            ))
+            send_result(cmd, engine_handle.pack(e))
             continue
         if silent:
             continue
-        handle_in_pipe.send((
-            cmd, engine_handle.branch, engine_handle.turn, engine_handle.tick,
-            engine_handle.pack(r)
-        ))
+        send_result(cmd, engine_handle.pack(r))
         if hasattr(engine_handle, '_after_ret'):
             engine_handle._after_ret()
             del engine_handle._after_ret
@@ -2703,8 +2914,20 @@ class EngineProcessManager(object):
     def start(self, *args, **kwargs):
         if hasattr(self, 'engine_proxy'):
             raise RedundantProcessError("Already started")
-        (handle_out_pipe_recv, self._handle_out_pipe_send) = Pipe(duplex=False)
-        (handle_in_pipe_recv, handle_in_pipe_send) = Pipe(duplex=False)
+        # 'pipe' or 'shm', for ring buffers in shared memory (Python 3.8+)
+        transport = kwargs.pop('transport', 'pipe')
+        if transport == 'pipe':
+            (handle_out_pipe_recv, self._handle_out_pipe_send) \
+                = Pipe(duplex=False)
+            (handle_in_pipe_recv, handle_in_pipe_send) = Pipe(duplex=False)
+            self._rings = []
+        elif transport == 'shm':
+            handle_out_pipe_recv = self._handle_out_pipe_send \
+                = RingConnection()
+            handle_in_pipe_recv = handle_in_pipe_send = RingConnection()
+            self._rings = [handle_out_pipe_recv, handle_in_pipe_recv]
+        else:
+            raise ValueError("Unknown transport: {}".format(transport))
         self.logq = Queue()
         handlers = []
         logl = {
@@ -2742,6 +2965,9 @@ class EngineProcessManager(object):
                         if 'do_game_start' in kwargs else False
         install_modules = kwargs.pop('install_modules') \
                           if 'install_modules' in kwargs else []
+        # results bigger than this many bytes go through shared memory,
+        # on Python 3.8 or later
+        shm_threshold = kwargs.pop('shm_threshold', None)
         formatter = logging.Formatter(
             fmt='[{levelname}] LiSE.proxy({process})\t{message}',
             style='{'
@@ -2758,7 +2984,8 @@ class EngineProcessManager(object):
                 handle_out_pipe_recv,
                 handle_in_pipe_send,
                 self.logq,
-                loglevel
+                loglevel,
+                shm_threshold
             )
         )
         self._p.daemon = True
@@ -2803,4 +3030,6 @@ class EngineProcessManager(object):
     def shutdown(self):
         self.engine_proxy.close()
         self._p.join()
+        for ring in self._rings:
+            ring.close()
         del self.engine_proxy
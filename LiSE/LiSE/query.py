@@ -204,7 +204,8 @@ class Query(object):
             )
         else:
             new_windows = [(0, end)]
-        return type(self)(self.leftside, self.rightside, windows=new_windows)
+        return type(self)(
+            self.engine, self.leftside, self.rightside, windows=new_windows)
     before = and_before
 
     def or_before(self, end):
@@ -212,14 +213,16 @@ class Query(object):
             new_windows = windows_union(self.windows + [(None, end)])
         else:
             new_windows = [(None, end)]
-        return type(self)(self.leftside, self.rightside, windows=new_windows)
+        return type(self)(
+            self.engine, self.leftside, self.rightside, windows=new_windows)
 
     def and_after(self, start):
         if self.windows:
             new_windows = windows_intersection(self.windows + [(start, None)])
         else:
             new_windows = [(start, None)]
-        return type(self)(self.leftside, self.rightside, windows=new_windows)
+        return type(self)(
+            self.engine, self.leftside, self.rightside, windows=new_windows)
     after = and_after
 
     def or_between(self, start, end):
@@ -227,14 +230,16 @@ class Query(object):
             new_windows = windows_union(self.windows + [(start, end)])
         else:
             new_windows = [(start, end)]
-        return type(self)(self.leftside, self.rightside, windows=new_windows)
+        return type(self)(
+            self.engine, self.leftside, self.rightside, windows=new_windows)
 
     def and_between(self, start, end):
         if self.windows:
             new_windows = windows_intersection(self.windows + [(start, end)])
         else:
             new_windows = [(start, end)]
-        return type(self)(self.leftside, self.rightside, windows=new_windows)
+        return type(self)(
+            self.engine, self.leftside, self.rightside, windows=new_windows)
     between = and_between
 
     def or_during(self, tick):
@@ -253,7 +258,34 @@ class ComparisonQuery(Query):
     oper = lambda x, y: NotImplemented
 
     def iter_turns(self):
-        return slow_iter_turns_eval_cmp(self, self.oper, engine=self.engine)
+        windows = self.true_windows()
+        if windows is None:
+            return slow_iter_turns_eval_cmp(
+                self, self.oper, engine=self.engine)
+        return _iter_windows_turns(self.engine, windows)
+
+    def true_windows(self):
+        """Return a list of ``(beginning, end)`` windows of turns, up to
+        the present, when the comparison held, inclusive
+
+        This works on the stats' change points, so it takes time in
+        proportion to the number of changes, not turns. If either side
+        can't get its history from the caches, return ``None``.
+
+        """
+        engine = self.engine
+        branch = engine.branch
+        turn_to = engine.turn
+        left = _side_history(self.leftside, branch, 0, turn_to)
+        if left is None:
+            return
+        right = _side_history(self.rightside, branch, 0, turn_to)
+        if right is None:
+            return
+        windows = _compare_histories(self.oper, left, right, turn_to)
+        if self.windows:
+            windows = _clip_windows(windows, self.windows)
+        return windows
 
 
 class EqQuery(ComparisonQuery):
@@ -310,6 +342,99 @@ class StatusAlias(EntityStatAccessor):
         return LeQuery(self.engine, self, other)
 
 
+def _side_history(side, branch, turn_from, turn_to):
+    """Return the change points of one side of a comparison, or ``None``
+    if they aren't in the caches"""
+    if isinstance(side, Query):
+        return
+    if not isinstance(side, EntityStatAccessor):
+        return [(turn_from, side)]
+    get_history = getattr(side.entity, '_get_cache_history', None)
+    if get_history is None:
+        return
+    changes = get_history(side.stat, branch, turn_from, turn_to)
+    if changes is None or not side.mungers:
+        return changes
+    ret = []
+    for turn, val in changes:
+        if val is not None:
+            for munger in side.mungers:
+                val = munger(val)
+        ret.append((turn, val))
+    return ret
+
+
+def _compare_histories(oper, left, right, turn_to):
+    """Return windows of turns when ``oper`` held between two lists of
+    change points
+
+    Turns when either side is ``None`` are never in the windows.
+
+    """
+    windows = []
+    start = None
+    left_val = right_val = None
+    left_i = right_i = 0
+    for turn in sorted({t for (t, _) in left} | {t for (t, _) in right}):
+        while left_i < len(left) and left[left_i][0] <= turn:
+            left_val = left[left_i][1]
+            left_i += 1
+        while right_i < len(right) and right[right_i][0] <= turn:
+            right_val = right[right_i][1]
+            right_i += 1
+        # a stat that isn't set yet doesn't compare to anything
+        held = left_val is not None and right_val is not None \
+            and bool(oper(left_val, right_val))
+        if held and start is None:
+            start = turn
+        elif not held and start is not None:
+            windows.append((start, turn - 1))
+            start = None
+    if start is not None:
+        windows.append((start, turn_to))
+    return windows
+
+
+def _clip_windows(windows, bounds):
+    """Return the parts of ``windows`` that are within ``bounds``
+
+    Either end of a window in ``bounds`` may be ``None``, meaning there's
+    no limit in that direction.
+
+    """
+    clipped = []
+    for (beginning, end) in windows:
+        for (lo, hi) in bounds:
+            lo = beginning if lo is None else max((beginning, lo))
+            hi = end if hi is None else min((end, hi))
+            if lo <= hi:
+                clipped.append((lo, hi))
+    if not clipped:
+        return clipped
+    return windows_union(clipped)
+
+
+def _iter_windows_turns(engine, windows):
+    """Iterate over ``(branch, turn)`` for every turn in ``windows``
+
+    The branch is whichever one the turn is in, following the present
+    branch back to its ancestors.
+
+    """
+    lineage = []
+    branch = engine.branch
+    while branch is not None:
+        parent, turn_start = engine._branches[branch][:2]
+        lineage.append((turn_start, branch))
+        branch = parent
+    for (beginning, end) in windows:
+        for turn in range(beginning, end + 1):
+            for (turn_start, branch) in lineage:
+                if turn >= turn_start:
+                    yield branch, turn
+                    break
+
+
 def slow_iter_turns_eval_cmp(qry, oper, start_branch=None, engine=None):
     """Iterate over all turns on which a comparison holds.
 
@@ -347,6 +472,39 @@ class QueryEngine(query.QueryEngine):
     IntegrityError = IntegrityError
     OperationalError = OperationalError
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._char_rules_handled = []
+        self._avatar_rules_handled = []
+        self._char_thing_rules_handled = []
+        self._char_place_rules_handled = []
+        self._char_portal_rules_handled = []
+        self._node_rules_handled = []
+        self._portal_rules_handled = []
+        self._rules_handled_stuff = (
+            ('character_rules_handled_insert', self._char_rules_handled),
+            ('avatar_rules_handled_insert', self._avatar_rules_handled),
+            ('character_thing_rules_handled_insert',
+             self._char_thing_rules_handled),
+            ('character_place_rules_handled_insert',
+             self._char_place_rules_handled),
+            ('character_portal_rules_handled_insert',
+             self._char_portal_rules_handled),
+            ('node_rules_handled_insert', self._node_rules_handled),
+            ('portal_rules_handled_insert', self._portal_rules_handled)
+        )
+
+    def _flush_rules_handled(self):
+        """Send records of the rules that have been handled to the database"""
+        for qry, rows in self._rules_handled_stuff:
+            if rows:
+                self.sqlmany(qry, *rows)
+                rows.clear()
+
+    def flush(self):
+        super().flush()
+        self._flush_rules_handled()
+
     def universals_dump(self):
         unpack = self.unpack
         for key, branch, turn, tick, value in self.sql('universals_dump'):
@@ -371,6 +529,9 @@ class QueryEngine(query.QueryEngine):
     def rule_actions_dump(self):
         return self._rule_dump('actions')
 
+    def rule_watches_dump(self):
+        return self._rule_dump('watches')
+
     def characters_dump(self):
         unpack = self.unpack
         for graph, typ in self.sql('graphs_dump'):
@@ -403,6 +564,7 @@ class QueryEngine(query.QueryEngine):
     character_portal_rulebook_dump = partialmethod(_charactery_rulebook_dump, 'character_portal')
 
     def character_rules_handled_dump(self):
+        self._flush_rules_handled()
         unpack = self.unpack
         for character, rulebook, rule, branch, turn, tick in self.sql('character_rules_handled_dump'):
             yield unpack(character), unpack(rulebook), rule, branch, turn, tick
@@ -418,6 +580,7 @@ class QueryEngine(query.QueryEngine):
             )
 
     def avatar_rules_handled_dump(self):
+        self._flush_rules_handled()
         unpack = self.unpack
         for character, rulebook, rule, graph, avatar, branch, turn, tick in self.sql('avatar_rules_handled_dump'):
             yield (
@@ -436,6 +599,7 @@ class QueryEngine(query.QueryEngine):
             )
 
     def character_thing_rules_handled_dump(self):
+        self._flush_rules_handled()
         unpack = self.unpack
         for character, rulebook, rule, thing, branch, turn, tick in self.sql('character_thing_rules_handled_dump'):
             yield unpack(character), unpack(rulebook), rule, unpack(thing), branch, turn, tick
@@ -451,6 +615,7 @@ class QueryEngine(query.QueryEngine):
             )
 
     def character_place_rules_handled_dump(self):
+        self._flush_rules_handled()
         unpack = self.unpack
         for character, rulebook, rule, place, branch, turn, tick in self.sql('character_place_rules_handled_dump'):
             yield unpack(character), unpack(rulebook), rule, unpack(place), branch, turn, tick
@@ -466,6 +631,7 @@ class QueryEngine(query.QueryEngine):
             )
 
     def character_portal_rules_handled_dump(self):
+        self._flush_rules_handled()
         unpack = self.unpack
         for character, rulebook, rule, orig, dest, branch, turn, tick in self.sql('character_portal_rules_handled_dump'):
             yield (
@@ -484,6 +650,7 @@ class QueryEngine(query.QueryEngine):
             )
 
     def node_rules_handled_dump(self):
+        self._flush_rules_handled()
         for character, node, rulebook, rule, branch, turn, tick in self.sql('node_rules_handled_dump'):
             yield self.unpack(character), self.unpack(node), self.unpack(rulebook), rule, branch, turn, tick
 
@@ -498,6 +665,7 @@ class QueryEngine(query.QueryEngine):
             )
 
     def portal_rules_handled_dump(self):
+        self._flush_rules_handled()
         unpack = self.unpack
         for character, orig, dest, rulebook, rule, branch, turn, tick in self.sql('portal_rules_handled_dump'):
             yield (
@@ -528,6 +696,22 @@ class QueryEngine(query.QueryEngine):
                 unpack(location)
             )
 
+    def things_window(self, character, branch, turn_from, tick_from, turn_to=None, tick_to=None):
+        """Yield the locations of a character's things from between two
+        times in a branch
+
+        With ``turn_to=None``, yield everything from the first time on.
+
+        """
+        unpack = self.unpack
+        for character, thing, branch, turn, tick, location in self._window(
+                'things', character, branch, turn_from, tick_from, turn_to, tick_to
+        ):
+            yield (
+                unpack(character), unpack(thing), branch, turn, tick,
+                unpack(location)
+            )
+
     def avatars_dump(self):
         unpack = self.unpack
         for character_graph, avatar_graph, avatar_node, branch, turn, tick, is_av in self.sql('avatars_dump'):
@@ -575,6 +759,7 @@ class QueryEngine(query.QueryEngine):
     set_rule_triggers = partialmethod(_set_rule_something, 'triggers')
     set_rule_prereqs = partialmethod(_set_rule_something, 'prereqs')
     set_rule_actions = partialmethod(_set_rule_something, 'actions')
+    set_rule_watches = partialmethod(_set_rule_something, 'watches')
 
     def set_rule(self, rule, branch, turn, tick, triggers=None, prereqs=None, actions=None):
         self.sql('rules_insert', rule)
@@ -638,22 +823,20 @@ class QueryEngine(query.QueryEngine):
         (character, rulebook) = map(
             self.pack, (character, rulebook)
         )
-        return self.sql(
-            'character_rules_handled_insert',
+        self._char_rules_handled.append((
             character,
             rulebook,
             rule,
             branch,
             turn,
-            tick,
-        )
+            tick
+        ))
 
     def handled_avatar_rule(self, character,  rulebook, rule, graph, av, branch, turn, tick):
         character, graph, av, rulebook = map(
             self.pack, (character, graph, av, rulebook)
         )
-        return self.sql(
-            'avatar_rules_handled_insert',
+        self._avatar_rules_handled.append((
             character,
             rulebook,
             rule,
@@ -662,14 +845,13 @@ class QueryEngine(query.QueryEngine):
             branch,
             turn,
             tick
-        )
+        ))
 
     def handled_character_thing_rule(self, character, rulebook, rule, thing, branch, turn, tick):
         character, thing, rulebook = map(
             self.pack, (character, thing, rulebook)
         )
-        return self.sql(
-            'character_thing_rules_handled_insert',
+        self._char_thing_rules_handled.append((
             character,
             rulebook,
             rule,
@@ -677,14 +859,13 @@ class QueryEngine(query.QueryEngine):
             branch,
             turn,
             tick
-        )
+        ))
 
     def handled_character_place_rule(self, character, rulebook, rule, place, branch, turn, tick):
         character, rulebook, place = map(
             self.pack, (character, rulebook, place)
         )
-        return self.sql(
-            'character_place_rules_handled_insert',
+        self._char_place_rules_handled.append((
             character,
             rulebook,
             rule,
@@ -692,14 +873,13 @@ class QueryEngine(query.QueryEngine):
             branch,
             turn,
             tick
-        )
+        ))
 
     def handled_character_portal_rule(self, character, rulebook, rule, orig, dest, branch, turn, tick):
         character, rulebook, orig, dest = map(
             self.pack, (character, rulebook, orig, dest)
         )
-        return self.sql(
-            'character_portal_rules_handled_insert',
+        self._char_portal_rules_handled.append((
             character,
             rulebook,
             rule,
@@ -708,7 +888,7 @@ class QueryEngine(query.QueryEngine):
             branch,
             turn,
             tick
-        )
+        ))
 
     def handled_node_rule(
             self, character, node, rulebook, rule, branch, turn, tick
@@ -716,8 +896,7 @@ class QueryEngine(query.QueryEngine):
         (character, node, rulebook) = map(
             self.pack, (character, node, rulebook)
         )
-        return self.sql(
-            'node_rules_handled_insert',
+        self._node_rules_handled.append((
             character,
             node,
             rulebook,
@@ -725,7 +904,7 @@ class QueryEngine(query.QueryEngine):
             branch,
             turn,
             tick
-        )
+        ))
 
     def handled_portal_rule(
             self, character, orig, dest, rulebook, rule, branch, turn, tick
@@ -733,8 +912,7 @@ class QueryEngine(query.QueryEngine):
         (character, orig, dest, rulebook) = map(
             self.pack, (character, orig, dest, rulebook)
         )
-        return self.sql(
-            'portal_rules_handled_insert',
+        self._portal_rules_handled.append((
             character,
             orig,
             dest,
@@ -743,7 +921,7 @@ class QueryEngine(query.QueryEngine):
             branch,
             turn,
             tick
-        )
+        ))
 
     def get_rulebook_char(self, rulemap, character):
         character = self.pack(character)
@@ -772,6 +950,20 @@ class QueryEngine(query.QueryEngine):
             loc
         )
 
+    def set_thing_locs(self, rows):
+        """Insert the locations of lots of things that had none before
+
+        Each row is like the arguments to :meth:`set_thing_loc`. There
+        must be nothing later for any of the things, so there's nothing
+        to delete first.
+
+        """
+        pack = self.pack
+        self.sqlmany('things_insert', *(
+            (pack(character), pack(thing), branch, turn, tick, pack(loc))
+            for (character, thing, branch, turn, tick, loc) in rows
+        ))
+
     def avatar_set(self, character, graph, node, branch, turn, tick, isav):
         (character, graph, node) = map(
             self.pack, (character, graph, node)
@@ -799,10 +991,11 @@ class QueryEngine(query.QueryEngine):
         # what if the rulebook has other values set afterward? wipe them out, right?
         # should that happen in the query engine or elsewhere?
         rulebook, rules = map(self.pack, (rulebook, rules))
-        try:
-            self.sql('rulebooks_insert', rulebook, branch, turn, tick, rules)
-        except IntegrityError:
-            self.sql('rulebooks_update', rules, rulebook, branch, turn, tick)
+        self._run(
+            self._upsert,
+            'rulebooks_insert', (rulebook, branch, turn, tick, rules),
+            'rulebooks_update', (rules, rulebook, branch, turn, tick)
+        )
 
     def rulebook_del_time(self, branch, turn, tick):
         self.sql('rulebooks_del_time', branch, turn, tick)
@@ -816,10 +1009,20 @@ class QueryEngine(query.QueryEngine):
         return self.sql('turns_completed_dump')
 
     def complete_turn(self, branch, turn):
-        try:
-            self.sql('turns_completed_insert', branch, turn)
-        except IntegrityError:
-            self.sql('turns_completed_update', turn, branch)
+        # records of rules handled this turn that haven't been written yet
+        # never need to be
+        for rows in (
+                self._char_rules_handled, self._avatar_rules_handled,
+                self._char_thing_rules_handled,
+                self._char_place_rules_handled,
+                self._char_portal_rules_handled
+        ):
+            rows[:] = [row for row in rows if row[-3:-1] != (branch, turn)]
+        self._run(
+            self._upsert,
+            'turns_completed_insert', (branch, turn),
+            'turns_completed_update', (turn, branch)
+        )
         self.sql('del_character_rules_handled_turn', branch, turn)
         self.sql('del_avatar_rules_handled_turn', branch, turn)
         self.sql('del_character_thing_rules_handled_turn', branch, turn)
@@ -857,6 +1060,7 @@ class QueryEngine(query.QueryEngine):
             'rule_triggers',
             'rule_prereqs',
             'rule_actions',
+            'rule_watches',
             'turns_completed'
         ):
             init_table(table)
@@ -0,0 +1,188 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Fast pathfinding in characters.
+
+A :class:`RoutingIndex` is a snapshot of a character's portals at one
+time, in compressed sparse rows of plain integers, so that searching it
+doesn't go through the time-travelling caches. The engine keeps one per
+character and reuses it until the portals change.
+
+Searches start from the destination and go backward along the portals,
+making a tree of the shortest paths *to* that destination from
+everywhere. Those trees are kept, so once one thing has looked for a path
+to a place, anything else looking for a path there gets it right away.
+
+"""
+from array import array
+from collections import deque
+from heapq import heappush, heappop
+
+from networkx import NetworkXNoPath, NodeNotFound
+
+# in a tree, the destination itself, or a node with no path there
+NOWHERE = -1
+
+
+class RoutingIndex(object):
+    """The portals of a character at one time, for finding paths
+
+    With ``weight``, paths are as short as possible in the sum of that
+    stat of their portals; portals without it count 1. Otherwise, paths
+    have as few portals as possible.
+
+    """
+    __slots__ = ('names', 'index', 'indptr', 'indices', 'weights', 'weight',
+                 '_trees')
+
+    def __init__(self, names, origs, weight=None, weights=None):
+        """Index nodes ``names``, with the portals into each given by
+        ``origs``, a list of lists of the indices of their origins
+
+        ``weights``, if ``weight`` is given, is a list of lists of the
+        weights of those portals.
+
+        """
+        self.names = names
+        self.index = {name: i for (i, name) in enumerate(names)}
+        self.weight = weight
+        indptr = array('I', [0])
+        indices = array('I')
+        for row in origs:
+            indices.extend(row)
+            indptr.append(len(indices))
+        self.indptr = indptr
+        self.indices = indices
+        if weight is None:
+            self.weights = None
+        else:
+            self.weights = [w for row in weights for w in row]
+        self._trees = {}
+
+    @classmethod
+    def from_character(cls, character, weight=None):
+        """Make an index of the portals in ``character`` at present"""
+        engine = character.engine
+        charn = character.name
+        btt = engine._btt()
+        names = list(engine._nodes_cache.iter_entities(charn, *btt))
+        index = {name: i for (i, name) in enumerate(names)}
+        origs = [[] for _ in names]
+        weights = None if weight is None else [[] for _ in names]
+        iter_successors = engine._edges_cache.iter_successors
+        portal = character.portal
+        for o, orig in enumerate(names):
+            for dest in iter_successors(charn, orig, *btt):
+                d = index[dest]
+                origs[d].append(o)
+                if weight is not None:
+                    weights[d].append(portal[orig][dest].get(weight, 1))
+        return cls(names, origs, weight, weights)
+
+    def _tree(self, dest):
+        """Return the distances to node ``dest``, and the next node on
+        the way there, indexed by node"""
+        if dest in self._trees:
+            return self._trees[dest]
+        if self.weight is None:
+            tree = self._bfs_tree(dest)
+        else:
+            tree = self._dijkstra_tree(dest)
+        self._trees[dest] = tree
+        return tree
+
+    def _bfs_tree(self, dest):
+        indptr = self.indptr
+        indices = self.indices
+        dist = [None] * len(self.names)
+        nxt = array('i', [NOWHERE]) * len(self.names)
+        dist[dest] = 0
+        queue = deque([dest])
+        while queue:
+            node = queue.popleft()
+            d = dist[node] + 1
+            for i in range(indptr[node], indptr[node + 1]):
+                orig = indices[i]
+                if dist[orig] is None:
+                    dist[orig] = d
+                    nxt[orig] = node
+                    queue.append(orig)
+        return dist, nxt
+
+    def _dijkstra_tree(self, dest):
+        indptr = self.indptr
+        indices = self.indices
+        weights = self.weights
+        dist = [None] * len(self.names)
+        nxt = array('i', [NOWHERE]) * len(self.names)
+        done = set()
+        dist[dest] = 0
+        heap = [(0, dest)]
+        while heap:
+            d, node = heappop(heap)
+            if node in done:
+                continue
+            done.add(node)
+            for i in range(indptr[node], indptr[node + 1]):
+                orig = indices[i]
+                if orig in done:
+                    continue
+                od = d + weights[i]
+                if dist[orig] is None or od < dist[orig]:
+                    dist[orig] = od
+                    nxt[orig] = node
+                    heappush(heap, (od, orig))
+        return dist, nxt
+
+    def _indices(self, orig, dest):
+        index = self.index
+        if orig not in index:
+            raise NodeNotFound("Source {} is not in G".format(orig))
+        if dest not in index:
+            raise NodeNotFound("Target {} is not in G".format(dest))
+        return index[orig], index[dest]
+
+    def shortest_path_length(self, orig, dest):
+        """Return the length of the shortest path from ``orig`` to
+        ``dest``
+
+        Raise ``networkx.NetworkXNoPath`` if there isn't one.
+
+        """
+        o, d = self._indices(orig, dest)
+        dist = self._tree(d)[0][o]
+        if dist is None:
+            raise NetworkXNoPath(
+                "Target {} cannot be reached from given sources".format(dest))
+        return dist
+
+    def shortest_path(self, orig, dest):
+        """Return a list of the names of the nodes on the shortest path
+        from ``orig`` to ``dest``, including both
+
+        Raise ``networkx.NetworkXNoPath`` if there isn't one.
+
+        """
+        o, d = self._indices(orig, dest)
+        dist, nxt = self._tree(d)
+        if dist[o] is None:
+            raise NetworkXNoPath(
+                "No path between {} and {}.".format(orig, dest))
+        names = self.names
+        path = [names[o]]
+        while o != d:
+            o = nxt[o]
+            path.append(names[o])
+        return path
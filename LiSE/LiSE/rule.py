@@ -64,6 +64,11 @@ When run, this code will:
 * copy `do_something_else` to `action.py`
 * append `do_something_else` to the actions list of the rule
 
+If a rule only needs checking when some stats change, decorate its
+triggers with `on_change` instead, like `@do_something.on_change('hunger')`,
+and LiSE will only check it for the entities whose `'hunger'` changed
+since the rules were last followed.
+
 The `trigger`, `prereq`, and `action` attributes of Rule objects
 may also be used like lists. You can put functions in them yourself,
 provided they are already present in the correct module. If it's
@@ -347,6 +352,45 @@ class Rule(object):
         self.actions.append(fun)
         return fun
 
+    @property
+    def watches(self):
+        """Names of stats that I only need to be checked when they change
+
+        A rule watching some stats isn't checked on every entity each
+        turn, only on those where one of the stats changed since the
+        rules were last followed. If it has no triggers, it's triggered
+        by the change.
+
+        """
+        try:
+            return self.engine._watches_cache.retrieve(
+                self.name, *self.engine._btt())
+        except KeyError:
+            return ()
+
+    @watches.setter
+    def watches(self, stats):
+        stats = tuple(stats)
+        branch, turn, tick = self.engine._nbtt()
+        self.engine._watches_cache.store(self.name, branch, turn, tick, stats)
+        self.engine.query.set_rule_watches(self.name, branch, turn, tick, stats)
+
+    def on_change(self, *stats):
+        """Watch the stats, and return a decorator to append a function to
+        my triggers list
+
+        Use it like ``trigger``, to check a trigger only on the entities
+        where one of the ``stats`` changed::
+
+            @rule.on_change('hunger')
+            def starving(thing):
+                return thing['hunger'] > 10
+
+        """
+        self.watches = tuple(self.watches) + tuple(
+            stat for stat in stats if stat not in self.watches)
+        return self.trigger
+
     def duplicate(self, newname):
         """Return a new rule that's just like this one, but under a new
         name.
@@ -354,13 +398,16 @@ class Rule(object):
         """
         if self.engine.rule.query.haverule(newname):
             raise KeyError("Already have a rule called {}".format(newname))
-        return Rule(
+        rule = Rule(
             self.engine,
             newname,
             list(self.triggers),
             list(self.prereqs),
             list(self.actions)
         )
+        if self.watches:
+            rule.watches = self.watches
+        return rule
 
     def always(self):
         """Arrange to be triggered every tick, regardless of circumstance."""
@@ -0,0 +1,341 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Read-only copies of characters, for analysis.
+
+A character's nodes and portals live in caches that remember every time,
+so each lookup has to work out which time you mean. That's slow for
+graph algorithms that look at every portal many times over.
+:meth:`LiSE.character.Character.snapshot` copies the character as it is
+now into a :class:`Snapshot`: its portals in compressed sparse rows of
+plain integers, and its stats in columns.
+
+"""
+from array import array
+from copy import copy
+
+
+class Snapshot(object):
+    """The nodes and portals of a character, and their stats, at one time
+
+    Nodes are numbered in the order of ``names``. The portals from node
+    ``i`` go to the nodes numbered in ``indices[indptr[i]:indptr[i+1]]``.
+    ``node_stats`` is a dictionary of stats, each a list of its values
+    for every node, in order; ``portal_stats`` is the same for portals,
+    in the order of ``indices``. Where a node or portal doesn't have a
+    stat, its value is ``None``.
+
+    Don't change any of these. They may be shared with later snapshots.
+
+    """
+    __slots__ = ('names', 'index', 'indptr', 'indices', 'node_stats',
+                 'portal_stats')
+
+    def __init__(self, names, rows, node_stats, portal_stats):
+        """Make a snapshot of the nodes ``names``, with the portals from
+        each given by ``rows``, a list of lists of the names of their
+        destinations"""
+        self.names = tuple(names)
+        self.index = index = {name: i for (i, name) in enumerate(names)}
+        indptr = array('I', [0])
+        indices = array('I')
+        for row in rows:
+            indices.extend(index[dest] for dest in row)
+            indptr.append(len(indices))
+        self.indptr = indptr
+        self.indices = indices
+        self.node_stats = node_stats
+        self.portal_stats = portal_stats
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, node):
+        return node in self.index
+
+    def __repr__(self):
+        return "<Snapshot of {} nodes and {} portals>".format(
+            len(self.names), len(self.indices))
+
+    def number_of_portals(self):
+        return len(self.indices)
+
+    def successors(self, node):
+        """Return a list of the nodes that ``node`` has portals to"""
+        i = self.index[node]
+        names = self.names
+        return [names[j] for j in
+                self.indices[self.indptr[i]:self.indptr[i+1]]]
+
+    def has_portal(self, orig, dest):
+        index = self.index
+        if orig not in index or dest not in index:
+            return False
+        i = index[orig]
+        return index[dest] in self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def portals(self):
+        """Iterate over pairs of origin and destination of my portals"""
+        names = self.names
+        indptr = self.indptr
+        indices = self.indices
+        for i, orig in enumerate(names):
+            for k in range(indptr[i], indptr[i+1]):
+                yield orig, names[indices[k]]
+
+    def to_networkx(self):
+        """Return a ``networkx.DiGraph`` with my nodes, portals, and stats"""
+        from networkx import DiGraph
+        names = self.names
+        node_stats = self.node_stats
+        portal_stats = self.portal_stats
+        g = DiGraph()
+        for i, name in enumerate(names):
+            g.add_node(name, **{
+                key: col[i] for (key, col) in node_stats.items()
+                if col[i] is not None})
+        indptr = self.indptr
+        indices = self.indices
+        for i, orig in enumerate(names):
+            for k in range(indptr[i], indptr[i+1]):
+                g.add_edge(orig, names[indices[k]], **{
+                    key: col[k] for (key, col) in portal_stats.items()
+                    if col[k] is not None})
+        return g
+
+    def to_scipy(self, weight=None, default=1):
+        """Return a ``scipy.sparse.csr_matrix`` of my portals
+
+        Rows are origins and columns destinations, in the order of
+        ``names``. With ``weight``, the values are that stat of the
+        portals, or ``default`` where they don't have it; otherwise,
+        they're all ``default``.
+
+        Requires scipy.
+
+        """
+        from scipy.sparse import csr_matrix
+        n = len(self.names)
+        if weight is None or weight not in self.portal_stats:
+            data = [default] * len(self.indices)
+        else:
+            data = [default if w is None else w
+                    for w in self.portal_stats[weight]]
+        return csr_matrix(
+            (data, list(self.indices), list(self.indptr)), shape=(n, n))
+
+    @classmethod
+    def from_character(cls, character):
+        """Make a snapshot of ``character`` as it is now"""
+        engine = character.engine
+        charn = character.name
+        btt = engine._btt()
+        names = list(engine._nodes_cache.iter_entities(charn, *btt))
+        iter_successors = engine._edges_cache.iter_successors
+        rows = [list(iter_successors(charn, orig, *btt)) for orig in names]
+        node_stats = _stats_getter(engine._node_val_cache, charn, btt)
+        portal_stats = _stats_getter(engine._edge_val_cache, charn, btt)
+        node_fresh = dict(enumerate(node_stats(n) for n in names))
+        portal_fresh = dict(enumerate(
+            portal_stats(orig, dest, 0)
+            for (orig, row) in zip(names, rows) for dest in row))
+        return cls(
+            names, rows,
+            _patch_columns(
+                {}, len(node_fresh), [(None, len(node_fresh))], node_fresh),
+            _patch_columns(
+                {}, len(portal_fresh), [(None, len(portal_fresh))],
+                portal_fresh)
+        )
+
+    def patched(self, character, nodes, node_stats, origs, portals):
+        """Return a snapshot of ``character`` as it is now, reading again
+        only what might have changed since I was made
+
+        ``nodes`` are nodes that might have been made or deleted;
+        ``node_stats`` are nodes whose stats might have changed;
+        ``origs`` are nodes that might have gotten or lost portals;
+        ``portals`` are pairs of origin and destination of portals whose
+        stats might have changed.
+
+        """
+        engine = character.engine
+        charn = character.name
+        btt = engine._btt()
+        contains = engine._nodes_cache.contains_entity
+        iter_successors = engine._edges_cache.iter_successors
+        get_node_stats = _stats_getter(engine._node_val_cache, charn, btt)
+        get_portal_stats = _stats_getter(engine._edge_val_cache, charn, btt)
+        old_names = self.names
+        old_index = self.index
+        old_indptr = self.indptr
+        old_indices = self.indices
+        gone = set()
+        new = []
+        for node in nodes:
+            if contains(charn, node, *btt):
+                if node not in old_index:
+                    new.append(node)
+            elif node in old_index:
+                gone.add(old_index[node])
+        names = [name for (i, name) in enumerate(old_names)
+                 if i not in gone] + new
+        node_segments = _runs(len(old_names), gone)
+        if new:
+            node_segments.append((None, len(new)))
+        index = {name: i for (i, name) in enumerate(names)}
+        node_fresh = {
+            index[name]: get_node_stats(name)
+            for name in set(node_stats).union(nodes) if name in index}
+        # the portals from each origin are either where they were in me,
+        # or read again
+        rows = []
+        portal_segments = []
+        portal_fresh = {}
+        k = 0
+        for orig in names:
+            i = old_index.get(orig)
+            if i is not None and orig not in origs and orig not in nodes:
+                lo, hi = old_indptr[i], old_indptr[i+1]
+                if not gone or gone.isdisjoint(old_indices[lo:hi]):
+                    row = [old_names[j] for j in old_indices[lo:hi]]
+                    _extend_segments(portal_segments, lo, hi)
+                    for dest in row:
+                        if (orig, dest) in portals:
+                            portal_fresh[k] = get_portal_stats(orig, dest, 0)
+                        k += 1
+                    rows.append(row)
+                    continue
+            row = list(iter_successors(charn, orig, *btt))
+            _extend_segments(portal_segments, None, len(row))
+            for dest in row:
+                portal_fresh[k] = get_portal_stats(orig, dest, 0)
+                k += 1
+            rows.append(row)
+        if not gone and not new:
+            node_segments = None
+        if portal_segments == [(0, len(old_indices))] or (
+                not portal_segments and not old_indices):
+            portal_segments = None
+        node_stats = _patch_columns(
+            self.node_stats, len(names), node_segments, node_fresh)
+        portal_stats = _patch_columns(
+            self.portal_stats, k, portal_segments, portal_fresh)
+        if node_segments is None and portal_segments is None:
+            # same nodes and portals, so share them
+            snap = copy(self)
+            snap.node_stats = node_stats
+            snap.portal_stats = portal_stats
+            return snap
+        return type(self)(names, rows, node_stats, portal_stats)
+
+
+def _stats_getter(cache, charn, btt):
+    """Return a function taking the rest of an entity in the character
+    named ``charn``, and returning a dictionary of its stats at the time
+    ``btt``"""
+    iter_keys = cache.iter_keys
+    retrieve = cache.retrieve
+
+    def get_stats(*entity):
+        return {
+            key: retrieve(charn, *entity, key, *btt)
+            for key in iter_keys(charn, *entity, *btt)
+        }
+    return get_stats
+
+
+def _runs(n, gone):
+    """Return a list of pairs of the start and end of each run of
+    positions in ``range(n)`` that aren't in ``gone``"""
+    runs = []
+    lo = 0
+    for i in sorted(gone):
+        if i > lo:
+            runs.append((lo, i))
+        lo = i + 1
+    if lo < n:
+        runs.append((lo, n))
+    return runs
+
+
+def _extend_segments(segments, lo, hi):
+    """Append the segment ``(lo, hi)`` to ``segments``, merging it with
+    the last one if they're contiguous"""
+    if hi == (0 if lo is None else lo):
+        return
+    if segments:
+        last_lo, last_hi = segments[-1]
+        if lo is None and last_lo is None:
+            segments[-1] = (None, last_hi + hi)
+            return
+        if lo is not None and last_lo is not None and last_hi == lo:
+            segments[-1] = (last_lo, hi)
+            return
+    segments.append((lo, hi))
+
+
+def _patch_columns(old, size, segments, fresh):
+    """Return a dictionary of stats, each a list of its values at each of
+    ``size`` positions
+
+    ``segments`` says where the positions come from, in order. Each is
+    either the start and end of a run of positions in the columns of
+    ``old``, or ``None`` and a number of new positions. If ``segments``
+    is ``None``, the positions are the same as in ``old``. ``fresh`` is a
+    dictionary of the stats at the positions that were read again,
+    including all the new ones.
+
+    Columns that don't change are shared with ``old``, and the others
+    are copied before they're changed.
+
+    """
+    ret = {}
+    copied = set()
+    if segments is None:
+        ret.update(old)
+    else:
+        for key, col in old.items():
+            ret[key] = col = []
+            for lo, hi in segments:
+                if lo is None:
+                    col.extend([None] * hi)
+                else:
+                    col.extend(old[key][lo:hi])
+            copied.add(key)
+
+    def setval(key, i, val):
+        col = ret[key]
+        if key not in copied:
+            ret[key] = col = list(col)
+            copied.add(key)
+        col[i] = val
+    for i, stats in fresh.items():
+        for key, col in list(ret.items()):
+            if key not in stats and col[i] is not None:
+                setval(key, i, None)
+        for key, val in stats.items():
+            if key not in ret:
+                ret[key] = [None] * size
+                copied.add(key)
+            if ret[key][i] != val:
+                setval(key, i, val)
+    for key in copied:
+        if all(v is None for v in ret[key]):
+            del ret[key]
+    return ret
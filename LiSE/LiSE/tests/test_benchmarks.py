@@ -0,0 +1,34 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import pytest
+
+from LiSE.benchmarks import bench_world
+
+
+@pytest.mark.parametrize('world,params', [
+    ('wanderers', {'size': 3, 'things': 2}),
+    ('kobold', {'size': 3, 'shrubberies': 2}),
+    ('polygons', {'size': 3, 'shapes': 2}),
+    ('college', {'dorms': 1, 'cells': 3}),
+    ('sickle', {'creatures': 2, 'size': 2})
+])
+def test_bench_world(world, params):
+    results = bench_world(world, turns=2, proxy=False, **params)
+    assert [r['bench'] for r in results] == [
+        'install', 'load', 'next_turn', 'commit', 'get_delta',
+        'time_travel']
+    for result in results:
+        assert result['seconds'] >= 0
@@ -18,6 +18,7 @@ import tempfile
 import pytest
 import LiSE.allegedb.tests.test_all
 from LiSE.engine import Engine
+from LiSE.exc import WorldIntegrityError
 
 
 class CharacterTest(LiSE.allegedb.tests.test_all.AllegedTest):
@@ -257,4 +258,230 @@ def test_facade(character_updates):
     for o in character.edge:
         for d in character.edge[o]:
             end_edge.setdefault(o, {})[d] = dict(character.edge[o][d])
-    assert start_edge == end_edge
\ No newline at end of file
+    assert start_edge == end_edge
+
+
+def test_snapshot(engy):
+    """Snapshots have what the character had when they were taken, and
+    are patched when it changes"""
+    import networkx as nx
+    from LiSE.snapshot import Snapshot
+    phys = engy.new_character(
+        'physical', data=nx.grid_2d_graph(4, 4).to_directed())
+    phys.place[0, 0]['height'] = 1
+    phys.portal[0, 0][0, 1]['length'] = 2
+
+    def contents(snap):
+        g = snap.to_networkx()
+        return dict(g.nodes(data=True)), {
+            (orig, dest): stats for (orig, dest, stats) in g.edges(data=True)}
+    snap = phys.snapshot()
+    assert set(snap) == set(phys.node)
+    assert snap.number_of_portals() == 48
+    assert set(snap.successors((0, 0))) == {(0, 1), (1, 0)}
+    assert snap.has_portal((0, 0), (0, 1))
+    assert not snap.has_portal((0, 0), (1, 1))
+    assert snap.node_stats['height'][snap.index[0, 0]] == 1
+    assert contents(snap)[1][(0, 0), (0, 1)] == {'length': 2}
+    assert contents(snap) == contents(Snapshot.from_character(phys))
+    assert phys.snapshot() is snap
+    engy.next_turn()
+    assert phys.snapshot() is snap
+    engy.next_turn()
+    phys.place[0, 0]['height'] = 2
+    phys.place[3, 3]['height'] = 3
+    del phys.portal[0, 0][0, 1]['length']
+    phys.portal[1, 0][0, 0]['length'] = 4
+    phys.new_place('nowhere', height=0)
+    phys.new_portal('nowhere', (3, 3), length=5)
+    phys.new_portal((2, 2), 'nowhere')
+    del phys.portal[2, 2][2, 3]
+    del phys.place[1, 1]
+    snap2 = phys.snapshot()
+    assert (1, 1) not in snap2
+    assert (1, 1) not in snap2.successors((0, 1))
+    assert snap2 is not snap
+    assert snap2.has_portal('nowhere', (3, 3))
+    assert not snap2.has_portal((2, 2), (2, 3))
+    assert snap2.node_stats['height'][snap2.index['nowhere']] == 0
+    assert contents(snap2) == contents(Snapshot.from_character(phys))
+    # going back is patched the same way
+    engy.turn = 1
+    snap1 = phys.snapshot()
+    assert snap1 is not snap2
+    assert contents(snap1) == contents(snap)
+    engy.turn = 2
+    assert contents(phys.snapshot()) == contents(snap2)
+    with engy.plan():
+        engy.turn = 3
+        phys.place[0, 0]['height'] = 5
+    planned = phys.snapshot()
+    assert planned.node_stats['height'][planned.index[0, 0]] == 5
+    engy.turn = 2
+    assert contents(phys.snapshot()) == contents(snap2)
+
+
+def test_snapshot_scipy(engy):
+    pytest.importorskip('scipy')
+    phys = engy.new_character('physical')
+    phys.add_portal(0, 1, length=2)
+    phys.add_portal(1, 2)
+    snap = phys.snapshot()
+    mat = snap.to_scipy('length')
+    i = snap.index
+    assert mat[i[0], i[1]] == 2
+    assert mat[i[1], i[2]] == 1
+    assert mat[i[2], i[0]] == 0
+
+
+def test_avatars_over_time(engy):
+    phys = engy.new_character('physical')
+    other = engy.new_character('other')
+    for i in range(5):
+        phys.add_place(i)
+    other.add_place('x')
+    char = engy.new_character('char')
+    char.add_avatar(phys.place[0])
+    assert char.avatar.only.name == 0
+    for i in range(1, 5):
+        char.add_avatar(phys.place[i])
+    char.add_avatar(other.place['x'])
+    engy.next_turn()
+    for i in range(4):
+        char.remove_avatar(phys.place[i])
+    assert set(char.avatar['physical']) == {4}
+    assert set(char.avatar) == {'physical', 'other'}
+    char.remove_avatar(other.place['x'])
+    assert char.avatar.only.name == 4
+    assert set(phys.place[4].users) == {'char'}
+    engy.turn = 0
+    assert set(char.avatar['physical']) == {0, 1, 2, 3, 4}
+    assert set(char.avatar['other']) == {'x'}
+    assert set(phys.place[0].users) == {'char'}
+
+
+def test_add_from(tempdir):
+    with Engine(tempdir) as eng:
+        phys = eng.new_character('physical')
+        phys.add_place('old', size=1)
+        phys.add_places_from([(0, {'size': 2}), 1, 2, 'old'], kind='room')
+        phys.add_portals_from([(0, 1, {'length': 3}), (1, 2), (2, 3)],
+                              symmetrical=True)
+        phys.add_things_from([('cat', 0), ('dog', 0, {'legs': 4})],
+                             legs=3)
+        with pytest.raises(WorldIntegrityError):
+            phys.add_things_from([('bird', 1), ('cat', 1)])
+        assert 'bird' not in phys.node
+        assert set(phys.place) == {0, 1, 2, 3, 'old'}
+        assert phys.place['old']['size'] == 1
+        assert phys.place['old']['kind'] == 'room'
+        assert phys.place[0]['size'] == 2
+        assert 'kind' not in phys.place[3]
+        assert phys.portal[0][1]['length'] == 3
+        assert phys.portal[1][0]['length'] == 3
+        assert set(phys.portal[3]) == {2}
+        assert phys.thing['cat']['legs'] == 3
+        assert phys.thing['dog']['legs'] == 4
+        assert set(phys.place[0].content) == {'cat', 'dog'}
+        eng.next_turn()
+        phys.thing['cat'].location = phys.place[1]
+        assert set(phys.place[0].content) == {'dog'}
+        eng.turn = 0
+        assert set(phys.place[0].content) == {'cat', 'dog'}
+    with Engine(tempdir) as eng:
+        phys = eng.character['physical']
+        eng.turn = 1
+        assert set(phys.node) == {0, 1, 2, 3, 'old', 'cat', 'dog'}
+        assert phys.portal[0][1]['length'] == 3
+        assert phys.portal[3][2]['is_mirror']
+        assert phys.thing['dog']['legs'] == 4
+        assert set(phys.place[1].content) == {'cat'}
+
+
+def test_perlin(tempdir):
+    noises = []
+    for i in range(2):
+        prefix = os.path.join(tempdir, str(i))
+        os.mkdir(prefix)
+        with Engine(prefix, random_seed=69105) as eng:
+            phys = eng.new_character('physical')
+            phys.add_places_from([(x, y) for x in range(4) for y in range(4)])
+            phys.add_place('stats', x=0.5, y=1.5, z=2.5)
+            phys.add_place('nowhere')
+            phys.add_thing('thing', (0, 0))
+            assert phys.perlin() is phys
+            assert 'perlin' not in phys.place['nowhere']
+            assert 'perlin' not in phys.thing['thing']
+            noise = {name: node['perlin'] for (name, node)
+                     in phys.node.items() if 'perlin' in node}
+            assert set(noise) == set(phys.place) - {'nowhere'}
+            assert all(-1 <= n <= 1 for n in noise.values())
+            assert any(noise.values())
+            noises.append(noise)
+    assert noises[0] == noises[1]
+
+
+def test_perlin_numpy():
+    np = pytest.importorskip('numpy')
+    from random import Random
+    from LiSE.util import perlin_noise, PERLIN_PERMUTATION, PERLIN_GRADIENTS
+    perm = list(PERLIN_PERMUTATION)
+    Random(0).shuffle(perm)
+    perm *= 2
+    rando = Random(1)
+    xs, ys, zs = ([rando.uniform(-50, 50) for _ in range(100)]
+                  for _ in range(3))
+    noise = perlin_noise(
+        np.array(xs), np.array(ys), np.array(zs), np.array(perm),
+        tuple(map(np.array, PERLIN_GRADIENTS)),
+        lambda a: np.floor(a).astype(np.int64))
+    assert noise.tolist() == pytest.approx(
+        [perlin_noise(x, y, z, perm) for (x, y, z) in zip(xs, ys, zs)])
+
+
+def test_patch(tempdir):
+    with Engine(tempdir) as eng:
+        phys = eng.new_character('physical')
+        phys.add_places_from([(0, {'size': 1}), 1, 2, 'doomed'])
+        phys.add_portals_from([(0, 1, {'length': 2})], symmetrical=True)
+        phys.add_portal(1, 2)
+        phys.add_thing('cat', 0, legs=4)
+        eng.next_turn()
+        phys.patch_nodes({
+            0: {'size': None, 'color': 'red'},
+            1: {'size': 3},
+            'cat': {'location': 1, 'legs': 3},
+            'new': {'size': 5, 'color': None},
+            'doomed': None
+        })
+        phys.patch_portals({
+            (1, 0): {'length': 4},
+            (2, 0): {'length': 7},
+            (1, 2): None
+        })
+        assert dict(phys.place[0]) == {'name': 0, 'color': 'red'}
+        assert phys.place[1]['size'] == 3
+        assert phys.thing['cat']['location'] == 1
+        assert phys.thing['cat']['legs'] == 3
+        assert set(phys.place[1].content) == {'cat'}
+        assert set(phys.place['new'].keys()) == {'name', 'size'}
+        assert 'doomed' not in phys.node
+        assert phys.portal[0][1]['length'] == phys.portal[1][0]['length'] == 4
+        assert phys.portal[2][0]['length'] == 7
+        assert 2 not in phys.portal[1]
+        eng.turn = 0
+        assert phys.place[0]['size'] == 1
+        assert 'size' not in phys.place[1]
+        assert 'new' not in phys.node
+        assert phys.portal[1][0]['length'] == 2
+        assert 0 not in phys.portal[2]
+    with Engine(tempdir) as eng:
+        phys = eng.character['physical']
+        eng.turn = 1
+        assert dict(phys.place[0]) == {'name': 0, 'color': 'red'}
+        assert phys.place['new']['size'] == 5
+        assert 'doomed' not in phys.node
+        assert phys.thing['cat']['location'] == 1
+        assert phys.portal[0][1]['length'] == 4
+        assert phys.portal[2][0]['length'] == 7
+        assert 2 not in phys.portal[1]
@@ -97,3 +97,17 @@ def test_contents_in_plan(chara):
     assert set(place.content) == {1, 2, 3, 4, 5, 6, 7, 8, 10, 11, 15}
     chara.engine.turn = 10
     assert set(place.content) == {1, 2, 3, 4, 5, 6, 7, 8, 10, 11, 15}
+
+
+def test_facade_contents(chara):
+    place = chara.new_place(0)
+    chara.new_place(1)
+    for i in range(2, 5):
+        place.new_thing(i)
+    fac = chara.facade()
+    assert {thing.name for thing in fac.place[0].contents()} == {2, 3, 4}
+    fac.thing[2]['location'] = 1
+    fac.add_thing(5, 0)
+    assert {thing.name for thing in fac.place[0].contents()} == {3, 4, 5}
+    assert [thing.name for thing in fac.place[1].contents()] == [2]
+    assert set(place.content) == {2, 3, 4}
@@ -22,3 +22,196 @@ def test_keyframe_load_init(tempdir):
     assert (0, 0) in eng.character['physical'].place
     assert (0, 1) in eng.character['physical'].portal[0, 0]
     eng.close()
+
+
+def test_keyframe_interval(tempdir):
+    """Keyframes get snapped every ``keyframe_interval`` turns, and persist"""
+    eng = Engine(tempdir, keyframe_interval=2)
+    phys = eng.new_character('physical')
+    for n in range(6):
+        phys.new_place(n)
+    kobold = phys.new_thing('kobold', 0)
+    for turn in range(1, 6):
+        eng.next_turn()
+        kobold.location = phys.place[turn]
+    assert ('physical', 'trunk', 2, 0) in eng._new_keyframes
+    assert ('physical', 'trunk', 4, 0) in eng._new_keyframes
+    kf = eng._things_cache.keyframe['physical',]['trunk']
+    assert kf[2][0] == {'kobold': 1}
+    assert kf[4][0] == {'kobold': 3}
+    for turn in range(6):
+        eng.turn = turn
+        assert kobold.location.name == turn
+        assert set(phys.thing) == {'kobold'}
+        assert len(phys.place) == 6
+    eng.close()
+    eng = Engine(tempdir)
+    assert eng._nodes_cache.keyframe['physical',]['trunk'][4][0]
+    phys = eng.character['physical']
+    for turn in range(6):
+        eng.turn = turn
+        assert phys.thing['kobold'].location.name == turn
+    eng.close()
+
+
+def test_lazy_load(tempdir):
+    """Lazy loading starts from a keyframe and loads the rest on demand"""
+    with Engine(tempdir, keyframe_interval=3) as eng:
+        phys = eng.new_character('physical')
+        for n in range(10):
+            phys.new_place(n)
+        kobold = phys.new_thing('kobold', 0)
+        for turn in range(1, 10):
+            eng.next_turn()
+            kobold.location = phys.place[turn]
+            phys.place[turn]['visited'] = turn
+            if turn == 5:
+                phys.add_portal(5, 6)
+        eng.turn = 4
+        eng.branch = 'b'
+        kobold.location = phys.place[0]
+        eng.turn = 9
+        eng.branch = 'trunk'
+    with Engine(tempdir, lazy=True) as eng:
+        assert eng._loaded == {('physical', 'trunk'): (9, 0, None, None)}
+        phys = eng.character['physical']
+        phys.place[9]['new'] = True
+        for turn in range(9, -1, -1):
+            eng.turn = turn
+            assert phys.thing['kobold'].location.name == turn
+            assert (5 in phys.portal and 6 in phys.portal[5]) == (turn >= 5)
+            assert phys.place[turn].get('visited') == (turn or None)
+            assert list(phys.place[turn].contents()) == [phys.thing['kobold']]
+        assert eng._loaded == {('physical', 'trunk'): (0, 0, None, None)}
+        eng.turn = 9
+        assert phys.place[9]['new']
+        eng.branch = 'b'
+        assert phys.thing['kobold'].location.name == 0
+        eng.turn = 4
+        assert phys.thing['kobold'].location.name == 0
+        assert ('physical', 'b') in eng._loaded
+
+
+def test_lazy_load_earlier(tempdir):
+    """Loading an earlier window keeps what's loaded, and loads no more"""
+    with Engine(tempdir, keyframe_interval=3) as eng:
+        phys = eng.new_character('physical')
+        for n in range(10):
+            phys.new_place(n)
+        kobold = phys.new_thing('kobold', 0)
+        for turn in range(1, 10):
+            eng.next_turn()
+            kobold.location = phys.place[turn]
+            phys.place[turn]['visited'] = turn
+    with Engine(tempdir, lazy=True) as eng:
+        loads = []
+        load_windows = eng._load_windows
+
+        def record_load(windows):
+            loads.append(windows)
+            load_windows(windows)
+        eng._load_windows = record_load
+        visited = eng._node_val_cache.branches[
+            'physical', 9, 'visited']['trunk']
+        eng.turn = 7
+        assert loads == [[('physical', 'trunk', 6, 0, 9, -1)]]
+        assert eng._node_val_cache.branches[
+            'physical', 9, 'visited']['trunk'] is visited
+        phys = eng.character['physical']
+        assert phys.thing['kobold'].location.name == 7
+        assert list(phys.place[9].contents()) == []
+        eng.turn = 8
+        assert len(loads) == 1
+        eng.turn = 2
+        assert loads[1] == [('physical', 'trunk', 0, 0, 6, -1)]
+        assert phys.thing['kobold'].location.name == 2
+        eng.turn = 9
+        assert len(loads) == 2
+        assert phys.place[9]['visited'] == 9
+        assert list(phys.place[9].contents()) == [phys.thing['kobold']]
+
+
+def test_cache_budget(tempdir):
+    """Caches over budget forget history, and load it again when needed"""
+    with Engine(tempdir, cache_budget=20) as eng:
+        phys = eng.new_character('physical')
+        for n in range(30):
+            phys.new_place(n)
+        kobold = phys.new_thing('kobold', 0)
+        for turn in range(1, 30):
+            eng.next_turn()
+            kobold.location = phys.place[turn]
+            phys.place[turn]['visited'] = turn
+        eng.commit()
+        for cache in (eng._nodes_cache, eng._node_val_cache,
+                      eng._things_cache):
+            assert len(cache.time_entity) <= 20
+        for turn in range(29, -1, -1):
+            eng.turn = turn
+            assert phys.thing['kobold'].location.name == turn
+            assert phys.place[turn].get('visited') == (turn or None)
+            assert list(phys.place[turn].contents()) == [phys.thing['kobold']]
+        eng.turn = 29
+        phys.place[29]['new'] = True
+        eng.commit()
+        eng.turn = 0
+        eng.turn = 29
+        assert phys.place[29]['new']
+
+
+def test_cache_budget_lru(tempdir):
+    """Loading over budget forgets the windows used longest ago first"""
+    with Engine(tempdir) as eng:
+        phys = eng.new_character('physical')
+        for n in range(5):
+            phys.new_place(n)
+        for i in range(5):
+            eng.branch = 'b{}'.format(i)
+            for turn in range(1, 6):
+                eng.next_turn()
+                phys.place[i]['visited'] = turn
+            eng.branch = 'trunk'
+            eng.turn = 0
+    with Engine(tempdir, cache_budget=22) as eng:
+        phys = eng.character['physical']
+        for i in (0, 1, 2, 3, 0):
+            eng.branch = 'b{}'.format(i)
+        assert len(eng._node_val_cache.time_entity) == 20
+        eng.branch = 'b4'
+        assert len(eng._node_val_cache.time_entity) == 10
+        assert ('physical', 'b0') in eng._loaded
+        assert ('physical', 'b4') in eng._loaded
+        for i in (1, 2, 3):
+            assert ('physical', 'b{}'.format(i)) not in eng._loaded
+        eng.turn = 5
+        assert phys.place[4]['visited'] == 5
+        eng.branch = 'b1'
+        assert phys.place[1]['visited'] == 5
+        eng.turn = 2
+        assert phys.place[1]['visited'] == 2
+
+
+def test_write_behind(tempdir):
+    """Changes written in a thread of their own get saved all the same"""
+    with Engine(tempdir, write_behind=True) as eng:
+        assert eng.query._writer.is_alive()
+        phys = eng.new_character('physical')
+        for n in range(10):
+            phys.new_place(n)
+        kobold = phys.new_thing('kobold', 0)
+        phys.rulebook = 'physics'
+        for turn in range(1, 10):
+            eng.next_turn()
+            kobold.location = phys.place[turn]
+            eng.universal['turn'] = turn
+        eng.commit()
+        eng.query.sync()
+        writer = eng.query._writer
+    assert not writer.is_alive()
+    with Engine(tempdir) as eng:
+        phys = eng.character['physical']
+        assert phys.rulebook.name == 'physics'
+        assert eng.universal['turn'] == 9
+        for turn in range(10):
+            eng.turn = turn
+            assert phys.thing['kobold'].location.name == turn
@@ -94,6 +94,136 @@ def test_fast_delta(handle_initialized):
     assert diff4 == slowd4, "Fast delta differs from slow delta"
 
 
+def test_journal_delta(handle_initialized):
+    hand = handle_initialized
+    eng = hand._real
+    hand.get_char_deltas('all')
+
+    def check():
+        observed = dict(hand._char_observed)
+        hand._char_observed.clear()
+        slow = hand.get_char_deltas('all', store=False)
+        hand._char_observed.update(observed)
+        fast = hand.get_char_deltas('all', store=False)
+        assert hand._journal_memo[2] is not None
+        assert fast == slow
+        hand.get_char_deltas('all')
+    hand.next_turn()
+    hand._after_ret()
+    check()
+    phys = eng.character['physical']
+    phys.place[(0, 0)]['spam'] = 'eggs'
+    phys.add_place('new')
+    phys.add_portal((0, 0), 'new', weight=3)
+    phys.portal[(1, 1)][(1, 2)]['weight'] = 5
+    check()
+    hand.time_travel('trunk', 0)
+    check()
+    hand.time_travel('branch', 0)
+    phys.place[(0, 0)]['spam'] = 'ham'
+    phys.thing['kobold']['location'] = (2, 2)
+    check()
+    hand.time_travel('trunk', 1)
+    check()
+    hand.time_travel('branch', 0)
+    check()
+
+
+def test_packed_delta(handle_initialized):
+    from LiSE.wire import Delta
+    hand = handle_initialized
+    eng = hand._real
+    # with no baseline, the delta has the whole world in it
+    diff = hand.get_slow_delta()
+    assert isinstance(diff, Delta)
+    assert diff
+    packed = eng.pack(diff)
+    assert eng.unpack(packed) == diff
+    assert len(packed) < len(eng.pack(dict(diff)))
+    ret, diff = hand.next_turn()
+    assert isinstance(diff, Delta)
+    assert eng.unpack(eng.pack(diff)) == diff
+
+
+@pytest.mark.parametrize('transport', ['pipe', 'shm'])
+def test_shared_memory(tempdir, transport):
+    from multiprocessing import Pipe, Queue
+    from threading import Thread
+    import msgpack
+    from LiSE.proxy import subprocess, unshare, RingConnection
+    if transport == 'pipe':
+        handle_out_pipe_recv, handle_out_pipe_send = Pipe(duplex=False)
+        handle_in_pipe_recv, handle_in_pipe_send = Pipe(duplex=False)
+    else:
+        handle_out_pipe_recv = handle_out_pipe_send = RingConnection()
+        handle_in_pipe_recv = handle_in_pipe_send = RingConnection()
+    # send every result through shared memory
+    thread = Thread(target=subprocess, args=(
+        (tempdir,), {'connect_string': 'sqlite:///:memory:'},
+        handle_out_pipe_recv, handle_in_pipe_send, Queue(), None, 0
+    ))
+    thread.start()
+    try:
+        handle_out_pipe_send.send(msgpack.packb({
+            'command': 'add_character', 'char': 'physical',
+            'data': {}, 'attr': {'foo': 'bar'}
+        }))
+        handle_out_pipe_send.send(msgpack.packb({
+            'command': 'character_stat_copy', 'char': 'physical'}))
+        results = []
+        for cmd in ('add_character', 'character_stat_copy'):
+            got, branch, turn, tick, result = handle_in_pipe_recv.recv()
+            assert got == cmd
+            assert type(result) is tuple
+            results.append(msgpack.unpackb(unshare(*result)))
+        assert results[1]['foo'] == 'bar'
+    finally:
+        handle_out_pipe_send.send('shutdown')
+        thread.join()
+        if transport == 'shm':
+            handle_out_pipe_recv.close()
+            handle_in_pipe_recv.close()
+
+
+def _echo(ring_in, ring_out):
+    while True:
+        msg = ring_in.recv()
+        ring_out.send(msg)
+        if msg == 'shutdown':
+            return
+
+
+def test_ring_connection():
+    from multiprocessing import Process
+    from threading import Thread
+    from LiSE.proxy import RingConnection
+    # ten slots of 100 bytes, so messages wrap around, and some don't fit
+    out_ring = RingConnection(1000, 100)
+    in_ring = RingConnection(1000, 100)
+    proc = Process(target=_echo, args=(out_ring, in_ring))
+    proc.start()
+    try:
+        msgs = [(i, 'x' * (i * 37)) for i in range(30)]
+        for msg in msgs:
+            out_ring.send(msg)
+            assert in_ring.recv() == msg
+        # more than fits in the rings at once
+        got = []
+        reader = Thread(target=lambda: got.extend(
+            in_ring.recv() for _ in msgs))
+        reader.start()
+        for msg in msgs:
+            out_ring.send(msg)
+        reader.join()
+        assert got == msgs
+        out_ring.send('shutdown')
+        assert in_ring.recv() == 'shutdown'
+    finally:
+        proc.join()
+        out_ring.close()
+        in_ring.close()
+
+
 def test_assignment(handle):
     hand = handle
     eng = hand._real
@@ -146,3 +276,25 @@ def test_manip_deleted(engy):
     assert 1 not in phys
     assert 0 not in phys.adj
     assert 1 not in phys.adj
+
+
+def test_contents(tempdir):
+    from LiSE import Engine
+    with Engine(tempdir) as eng:
+        phys = eng.new_character('physical')
+        phys.add_place(0)
+        phys.add_place(1)
+        for i in range(2, 5):
+            phys.add_thing(i, 0)
+    manager = EngineProcessManager()
+    eng = manager.start(tempdir)
+    try:
+        phys = eng.character['physical']
+        assert set(phys.place[0].content) == {2, 3, 4}
+        phys.thing[2].location = phys.place[1]
+        phys.thing[3].delete()
+        assert set(phys.place[0].content) == {4}
+        assert len(phys.place[1].content) == 1
+        assert [thing.name for thing in phys.place[1].contents()] == [2]
+    finally:
+        manager.shutdown()
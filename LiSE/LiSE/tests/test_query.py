@@ -147,4 +147,89 @@ def noncollision(college24_premade):
 
 
 def test_noncollision_premade(college24_premade):
-    noncollision(college24_premade)
\ No newline at end of file
+    noncollision(college24_premade)
+
+
+def test_history(engy):
+    """Stat histories from the caches match what time travel finds"""
+    eng = engy
+    phys = eng.new_character('physical')
+    here = phys.new_place('here')
+    there = phys.new_place('there')
+    port = here.one_way_portal(there)
+    thing = here.new_thing('thing')
+    for turn in range(10):
+        eng.next_turn()
+        if turn % 3 == 0:
+            phys.stat['weather'] = 'rain' if turn % 2 else 'sun'
+            here['mud'] = turn
+            port['length'] = turn * 2
+            thing.location = there if turn % 2 else here
+    eng.turn = 4
+    eng.branch = 'other'
+    phys.stat['weather'] = 'snow'
+    del here['mud']
+    for turn in range(4):
+        eng.next_turn()
+        thing.location = here if turn % 2 else there
+    stats = [
+        (phys, 'weather'), (here, 'mud'), (port, 'length'),
+        (thing, 'location'), (thing, 'name'), (port, 'is_mirror')
+    ]
+    for branch, windows in [
+        ('other', [(4, 8), (5, 7), (6, 6)]),
+        ('trunk', [(0, 10), (2, 6), (5, 5)])
+    ]:
+        eng.branch = branch
+        eng.turn = windows[0][1]
+        now = eng._btt()
+        for entity, stat in stats:
+            hist = entity.historical(stat)
+            for (beginning, end) in windows:
+                fast = list(hist.iter_history(beginning, end))
+                assert eng._btt() == now
+                assert fast == list(hist._slow_iter_history(beginning, end))
+                changes = hist.history(beginning, end)
+                assert changes[0][0] == beginning
+                assert all(
+                    a[1] != b[1] for (a, b) in zip(changes, changes[1:]))
+    assert list(here.historical('mud').iter_history(0, 10)) \
+        == [None] + [0] * 3 + [3] * 3 + [6] * 3 + [9]
+    # before the branch began, its history is its parent's
+    trunk_mud = list(here.historical('mud').iter_history(0, 3))
+    eng.branch = 'other'
+    assert list(here.historical('mud').iter_history(0, 8)) \
+        == trunk_mud + [None] * 5
+
+
+def test_turns_when(engy):
+    """Comparisons find the turns they held from stats' change points"""
+    eng = engy
+    phys = eng.new_character('physical')
+    critter = phys.new_place('critter')
+    for turn in range(1, 21):
+        eng.turn = turn
+        critter['health'] = 20 - turn
+    eng.turn = 10
+    eng.branch = 'healed'
+    critter['health'] = 20
+    eng.turn = 12
+    health = critter.historical('health')
+    assert list(eng.turns_when(health < 12)) == [9]
+    assert list(eng.turns_when(health >= 19)) == [1, 10, 11, 12]
+    assert list(eng.turns_when(health == eng.alias(15))) == [5]
+    assert list((health > 15).iter_turns()) == [
+        ('trunk', 1), ('trunk', 2), ('trunk', 3), ('trunk', 4),
+        ('healed', 10), ('healed', 11), ('healed', 12)
+    ]
+    assert list(eng.turns_when((health > 15).before(3))) == [1, 2, 3]
+    assert list(eng.turns_when((health > 15).after(4))) == [4, 10, 11, 12]
+    eng.branch = 'trunk'
+    eng.turn = 20
+    assert list(eng.turns_when(health < 3)) == [18, 19, 20]
+    assert list(eng.turns_when(health > 100)) == []
+    # not on turn 0, when health wasn't set
+    assert list(eng.turns_when(health != 5)) == [
+        turn for turn in range(1, 21) if turn != 15]
+    with pytest.raises(TypeError):
+        list(eng.turns_when(health < 'ten'))
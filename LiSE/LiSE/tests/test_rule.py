@@ -145,4 +145,187 @@ def test_portal_dot_rule(engy):
     character.new_place(1)
     port = character.new_portal(0, 1)
     rule = something_dot_rule_test(port, engy)
-    assert port.rulebook[0] == rule
\ No newline at end of file
+    assert port.rulebook[0] == rule
+
+
+def test_rules_handled_saved(tempdir):
+    """Rules that ran this turn don't run again after reloading"""
+    with Engine(tempdir) as eng:
+        char = eng.new_character('char')
+        place = char.new_place('place')
+        place['ran'] = 0
+
+        @place.rule(always=True)
+        def run(node):
+            node['ran'] += 1
+
+        eng.next_turn()
+        assert place['ran'] == 1
+        assert len(list(eng.query.node_rules_handled_dump())) == 1
+        eng.turn = 0
+    with Engine(tempdir) as eng:
+        eng.next_turn()
+        assert eng.character['char'].place['place']['ran'] == 1
+
+
+def test_profiling(engy):
+    char = engy.new_character('char')
+    for i in range(3):
+        char.new_place(i)['odd'] = bool(i % 2)
+
+    @char.place.rule
+    def flip(node):
+        node['odd'] = not node['odd']
+
+    @flip.trigger
+    def odd(node):
+        return node['odd']
+
+    with pytest.raises(ValueError):
+        engy.profiling_report()
+    engy.start_profiling()
+    engy.next_turn()
+    report = engy.stop_profiling()
+    assert report['rules']['flip']['checked'] == 3
+    assert report['rules']['flip']['triggered'] == 1
+    assert report['rules']['flip']['performed'] == 1
+    assert report['triggers']['odd']['calls'] == 3
+    assert report['actions']['flip']['calls'] == 1
+    assert report['caches']['node_val_cache']['misses'] > 0
+    assert type(engy._node_val_cache).__name__ == 'Cache'
+    engy.next_turn()
+    assert engy.profiling_report() == report
+
+
+def test_memoize_triggers(tempdir):
+    with Engine(tempdir, memoize_triggers=True) as eng:
+        char = eng.new_character('char')
+        for i in range(4):
+            char.new_place(i)['hot'] = i == 0
+        char.add_portal(0, 1)
+        that = char.new_thing('that', 1)
+
+        @char.place.rule
+        def cool(node):
+            node['hot'] = False
+
+        @cool.trigger
+        def hot(node):
+            return node['hot']
+
+        @char.place.rule
+        def notice(node):
+            node['noticed'] = True
+
+        @notice.trigger
+        def crowded(node):
+            return any(node.contents()) or len(node.portal) > 1
+
+        eng.start_profiling()
+        eng.next_turn()
+        report = eng.stop_profiling()
+        assert report['triggers']['hot']['calls'] == 4
+        assert report['triggers']['crowded']['calls'] == 4
+        assert not char.place[0]['hot']
+        assert char.place[1]['noticed']
+        assert 'noticed' not in char.place[0]
+        # the caches only record reads while the triggers are checked
+        assert not any(type(cache).__name__.startswith('Recording')
+                       for cache in eng._caches().values())
+        eng.start_profiling()
+        eng.next_turn()
+        report = eng.stop_profiling()
+        # place 0 cooled off, so that's the only one to check again
+        assert report['triggers']['hot']['calls'] == 1
+        assert report['triggers']['crowded']['calls'] == 0
+        char.place[2]['hot'] = True
+        char.add_portal(0, 2)
+        char.add_portal(0, 3)
+        that.location = char.place[3]
+        eng.start_profiling()
+        eng.next_turn()
+        report = eng.stop_profiling()
+        assert report['triggers']['hot']['calls'] == 1
+        # new portals from 0, and the thing moved from 1 to 3
+        assert report['triggers']['crowded']['calls'] == 3
+        assert not char.place[2]['hot']
+        assert char.place[0]['noticed']
+        assert char.place[3]['noticed']
+
+
+def test_on_change(tempdir):
+    with Engine(tempdir) as eng:
+        char = eng.new_character('char')
+        for i in range(4):
+            char.new_place(i)['hunger'] = 0
+        that = char.new_thing('that', 0)
+
+        @char.place.rule
+        def eat(place):
+            place['hunger'] = 0
+            place['ate'] = place.engine.turn
+
+        @eat.on_change('hunger')
+        def hungry(place):
+            return place['hunger'] > 1
+
+        @char.thing.rule
+        def arrive(thing):
+            thing['arrived'] = thing.engine.turn
+
+        arrive.watches = ['location']
+        eng.next_turn()
+        # the places all got hungry when they were made
+        assert 'ate' not in char.place[0]
+        assert that['arrived'] == 1
+        eng.start_profiling()
+        eng.next_turn()
+        report = eng.stop_profiling()
+        # nothing changed, so nothing was checked
+        assert 'hungry' not in report['triggers']
+        assert 'eat' not in report['rules']
+        char.place[2]['hunger'] = 3
+        char.place[3]['hunger'] = 1
+        eng.start_profiling()
+        eng.next_turn()
+        report = eng.stop_profiling()
+        assert report['rules']['eat']['checked'] == 2
+        assert char.place[2]['ate'] == 3
+        assert 'ate' not in char.place[3]
+        assert that['arrived'] == 1
+    with Engine(tempdir) as eng:
+        char = eng.character['char']
+        assert eng.rule['eat'].watches == ('hunger',)
+        char.place[1]['hunger'] = 2
+        char.thing['that'].location = char.place[1]
+        eng.next_turn()
+        assert char.place[1]['ate'] == 4
+        assert 'ate' not in char.place[0]
+        assert char.thing['that']['arrived'] == 4
+
+
+def test_on_change_since_followed(tempdir):
+    with Engine(tempdir) as eng:
+        char = eng.new_character('char')
+        place = char.new_place('here')
+        place['hunger'] = 0
+
+        @char.place.rule
+        def eat(place):
+            place['ate'] = place.engine.turn
+
+        @eat.on_change('hunger')
+        def hungry(place):
+            return place['hunger'] > 1
+        eng.next_turn()
+        # change something in the next turn, before the rules run in it
+        eng.turn = 2
+        place['hunger'] = 2
+        eng.next_turn()
+        assert place['ate'] == 2
+        eng.start_profiling()
+        eng.next_turn()
+        report = eng.stop_profiling()
+        # the rules already saw that change
+        assert 'eat' not in report['rules']
+        assert place['ate'] == 2
@@ -70,3 +70,57 @@ def test_travel(engy):
     engy.turn = 14
     assert thing1.location == phys.place[7, 7]
     assert thing2.location == phys.place[0, 7]
+
+
+def test_routing_index(engy):
+    """Paths from the routing index are as short as networkx's, and the
+    index is rebuilt when the portals change"""
+    phys = engy.new_character(
+        'physical', data=nx.grid_2d_graph(6, 6).to_directed())
+    del phys.place[2, 2]
+    ports = [port for dests in phys.portal.values() for port in dests.values()]
+    for i, port in enumerate(ports):
+        port['length'] = i % 5 + 1
+
+    def plain():
+        return nx.DiGraph([
+            (orig, dest, {'length': port['length']})
+            for (orig, dests) in phys.portal.items()
+            for (dest, port) in dests.items()
+        ])
+    start = phys.place[0, 0]
+    for weight in (None, 'length'):
+        for dest in [(5, 5), (0, 5), (3, 2), (0, 0)]:
+            path = start.shortest_path(dest, weight)
+            assert path[0] == (0, 0) and path[-1] == dest
+            for orig, nxt in zip(path, path[1:]):
+                assert nxt in phys.portal[orig]
+            length = nx.shortest_path_length(plain(), (0, 0), dest, weight)
+            assert start.shortest_path_length(dest, weight) == length
+    walker = phys.place[1, 1].new_thing('walker')
+    index = engy._routing_index(phys, 'length')
+    assert engy._routing_index(phys, 'length') is index
+    # these don't change the portals
+    walker.location = phys.place[1, 2]
+    phys.place[1, 1]['color'] = 'red'
+    ports[0]['color'] = 'blue'
+    assert engy._routing_index(phys, 'length') is index
+    phys.portal[0, 0][0, 1]['length'] = 100
+    assert engy._routing_index(phys, 'length') is not index
+    index = engy._routing_index(phys, 'length')
+    # nothing's happened yet in the next turn
+    engy.next_turn()
+    assert engy._routing_index(phys, 'length') is index
+    with engy.plan():
+        engy.turn += 1
+        phys.portal[0, 0][0, 1]['length'] = 1
+    engy.turn += 1
+    assert engy._routing_index(phys, 'length') is None
+    assert start.shortest_path_length((0, 1), 'length') == 1
+    engy.turn -= 1
+    assert start.shortest_path_length((0, 1), 'length') \
+        == nx.shortest_path_length(plain(), (0, 0), (0, 1), 'length')
+    del phys.place[0, 1]
+    del phys.place[1, 0]
+    with pytest.raises(nx.NetworkXNoPath):
+        start.shortest_path((5, 5))
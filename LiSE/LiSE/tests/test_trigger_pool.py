@@ -0,0 +1,87 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests for evaluating triggers in a process pool"""
+import pytest
+from LiSE.engine import Engine
+
+
+@pytest.fixture(params=[0, 2])
+def pooled(tempdir, request):
+    with Engine(tempdir, trigger_workers=request.param) as eng:
+        yield eng
+
+
+def test_triggers_follow_deltas(pooled):
+    """Triggers in workers see changes made between turns"""
+    eng = pooled
+    char = eng.new_character('char')
+    for n in range(6):
+        char.new_place(n, hungry=n % 2 == 0)
+    char.place[0].new_thing('food')
+    char.add_portal(0, 1, hungry=True)
+    char.stat['hungry'] = False
+
+    @char.place.rule
+    def feed(place):
+        place['fed'] = place.get('fed', 0) + 1
+
+    @feed.trigger
+    def is_hungry(place):
+        return place['hungry']
+
+    @char.thing.rule
+    def eat(thing):
+        thing['eaten'] = True
+
+    @eat.trigger
+    def on_hungry_place(thing):
+        return thing.location['hungry']
+
+    @char.portal.rule
+    def cross(portal):
+        portal['crossed'] = True
+
+    @cross.trigger
+    def hungry_portal(portal):
+        return portal['hungry']
+
+    @char.rule
+    def whole(ch):
+        ch.stat['whole'] = True
+
+    @whole.trigger
+    def hungry_char(ch):
+        return ch.stat['hungry']
+
+    eng.next_turn()
+    assert [char.place[n].get('fed', 0) for n in range(6)] \
+        == [1, 0, 1, 0, 1, 0]
+    assert char.thing['food']['eaten']
+    assert char.portal[0][1]['crossed']
+    assert 'whole' not in char.stat
+    char.place[1]['hungry'] = True
+    char.place[0]['hungry'] = False
+    char.thing['food'].location = char.place[3]
+    char.portal[0][1]['hungry'] = False
+    del char.thing['food']['eaten']
+    del char.portal[0][1]['crossed']
+    char.stat['hungry'] = True
+    eng.next_turn()
+    assert [char.place[n].get('fed', 0) for n in range(6)] \
+        == [1, 1, 2, 0, 2, 0]
+    assert 'eaten' not in char.thing['food']
+    assert 'crossed' not in char.portal[0][1]
+    assert char.stat['whole']
@@ -109,6 +109,15 @@ class Thing(Node):
         except KeyError:
             return super().__getitem__(key)
 
+    def _get_cache_history(self, key, branch, turn_from, turn_to):
+        if key == 'name':
+            return [(turn_from, self.name)]
+        if key == 'location':
+            return self.engine._things_cache.retrieve_history(
+                self.character.name, self.name, branch, turn_from, turn_to
+            )
+        return super()._get_cache_history(key, branch, turn_from, turn_to)
+
     def __setitem__(self, key, value):
         """Set ``key``=``value`` for the present game-time."""
         try:
@@ -264,6 +273,11 @@ class Thing(Node):
         destn = dest.name if hasattr(dest, 'name') else dest
         if destn == self.location.name:
             raise ValueError("I'm already at {}".format(destn))
-        graph = self.character if graph is None else graph
+        if graph is None:
+            index = self.engine._routing_index(self.character, weight)
+            if index is not None:
+                path = index.shortest_path(self["location"], destn)
+                return self.follow_path(path, weight)
+            graph = self.character
         path = nx.shortest_path(graph, self["location"], destn, weight)
         return self.follow_path(path, weight)
\ No newline at end of file
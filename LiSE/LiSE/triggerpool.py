@@ -0,0 +1,220 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Evaluate triggers in worker processes.
+
+An engine with ``trigger_workers`` keeps a ``concurrent.futures`` process
+pool. Each worker holds a replica of the world, as plain dictionaries, and
+runs triggers on :class:`LiSE.character.Facade` objects built from it.
+The replicas are brought up to date at the start of each turn with the
+output of :meth:`LiSE.engine.Engine.get_delta`. The engine sends the last
+few deltas, so a worker that sat out a turn or two can catch up; one that
+has missed more than that asks for a fresh snapshot instead.
+
+Triggers evaluated this way see Facades, not real entities, so they can
+read the state of the world but can't reach the engine.
+
+"""
+from importlib import import_module
+
+from .character import Facade
+
+# keys in a character's delta that aren't stats of that character
+_special_keys = frozenset({
+    'nodes', 'node_val', 'edges', 'edge_val', 'avatars',
+    'character_rulebook', 'avatar_rulebook', 'character_thing_rulebook',
+    'character_place_rulebook', 'character_portal_rulebook'
+})
+# keys at the top level of a delta that aren't character names
+_global_keys = frozenset({'universal', 'eternal', 'rules', 'rulebooks'})
+
+_replica = {'version': None, 'chars': {}, 'triggers': {}}
+
+
+def _unwrapped(mapping):
+    return {
+        k: v.unwrap() if hasattr(v, 'unwrap') else v
+        for (k, v) in mapping.items() if k != 'name'
+    }
+
+
+def snapshot_character(character):
+    """Return a picklable copy of the state of a character
+
+    It's a tuple of things, places, portals, and stats, like a pickled
+    :class:`LiSE.character.Facade`.
+
+    """
+    things = {k: _unwrapped(v) for (k, v) in character.thing.items()}
+    places = {k: _unwrapped(v) for (k, v) in character.place.items()}
+    ports = {
+        orig: {dest: _unwrapped(port) for (dest, port) in dests.items()}
+        for (orig, dests) in character.portal.items()
+    }
+    return things, places, ports, _unwrapped(character.stat)
+
+
+def trigger_source(store):
+    """Return a picklable description of where to get trigger functions
+
+    For a :class:`LiSE.xcollections.FunctionStore`, that's the source
+    code of every function in it. For an ordinary module, it's the name of
+    the module.
+
+    """
+    if hasattr(store, 'iterplain'):
+        return 'source', dict(store.iterplain())
+    return 'module', store.__name__
+
+
+def _load_triggers(source):
+    typ, data = source
+    if typ == 'module':
+        return import_module(data).__dict__
+    namespace = {}
+    for code in data.values():
+        exec(compile(code, '<trigger>', 'exec'), namespace)
+    return namespace
+
+
+def _update_mapping(mapping, vals):
+    for k, v in vals.items():
+        if v is None:
+            mapping.pop(k, None)
+        else:
+            mapping[k] = v
+
+
+def _apply_delta(chars, delta):
+    for charn, chardelta in delta.items():
+        if charn in _global_keys:
+            continue
+        if chardelta is None:
+            chars.pop(charn, None)
+            continue
+        if charn not in chars:
+            chars[charn] = ({}, {}, {}, {})
+        things, places, ports, stats = chars[charn]
+        for node, exists in chardelta.get('nodes', {}).items():
+            if exists:
+                if node not in things and node not in places:
+                    places[node] = {}
+                continue
+            things.pop(node, None)
+            places.pop(node, None)
+            ports.pop(node, None)
+            for dests in ports.values():
+                dests.pop(node, None)
+        for node, vals in chardelta.get('node_val', {}).items():
+            if node in things:
+                ent = things[node]
+            elif node in places:
+                ent = places[node]
+            else:
+                continue
+            if 'location' in vals:
+                vals = dict(vals)
+                loc = vals.pop('location')
+                if loc is None:
+                    if node in things:
+                        places[node] = things.pop(node)
+                        ent.pop('location', None)
+                else:
+                    if node in places:
+                        things[node] = places.pop(node)
+                    ent['location'] = loc
+            _update_mapping(ent, vals)
+        for orig, dests in chardelta.get('edges', {}).items():
+            for dest, exists in dests.items():
+                if exists:
+                    ports.setdefault(orig, {}).setdefault(dest, {})
+                elif orig in ports:
+                    ports[orig].pop(dest, None)
+        for orig, dests in chardelta.get('edge_val', {}).items():
+            for dest, vals in dests.items():
+                if orig not in ports or dest not in ports[orig]:
+                    continue
+                _update_mapping(ports[orig][dest], vals)
+        _update_mapping(stats, {
+            k: v for (k, v) in chardelta.items() if k not in _special_keys})
+
+
+def _make_facade(state):
+    things, places, ports, stats = state
+    # Facades replace the dicts in their patches with entity objects,
+    # so give them copies to keep the replica clean
+    fac = Facade.__new__(Facade)
+    fac.__setstate__((
+        dict(things), dict(places),
+        {orig: dict(dests) for (orig, dests) in ports.items()},
+        dict(stats)
+    ))
+    return fac
+
+
+def _get_entity(facade, path):
+    if not path:
+        return facade
+    if path[0] == 'node':
+        return facade.node[path[1]]
+    return facade.portal[path[1]][path[2]]
+
+
+def check_triggers(version, payload, tasks):
+    """Run triggers in this worker's replica of the world
+
+    ``payload`` is either ``('deltas', deltas)``, where ``deltas`` is a list
+    of pairs of a version number and the delta that brings a replica up to
+    that version; or ``('snapshot', chars, triggers)``, which replaces the
+    replica entirely. Either way, the replica ends up at ``version``.
+
+    ``tasks`` is a list of triples of a character name, a path to an entity
+    in the character, and the names of the triggers to check on it. The
+    path is empty for the character itself, ``('node', name)`` for a
+    thing or place, and ``('portal', orig, dest)`` for a portal.
+
+    Return a list of booleans, one per task, for whether any of its
+    triggers fired; or ``None`` if my replica is too old for the deltas,
+    and I need a snapshot.
+
+    """
+    if payload[0] == 'snapshot':
+        _, chars, triggers = payload
+        _replica['chars'] = chars
+        _replica['triggers'] = _load_triggers(triggers)
+    else:
+        mine = _replica['version']
+        deltas = payload[1]
+        if mine is None or mine < deltas[0][0] - 1:
+            return
+        for v, delta in deltas:
+            if v > mine:
+                _apply_delta(_replica['chars'], delta)
+    _replica['version'] = version
+    chars = _replica['chars']
+    triggers = _replica['triggers']
+    facades = {}
+    results = []
+    for charn, path, trignames in tasks:
+        if charn not in facades:
+            facades[charn] = _make_facade(chars[charn])
+        entity = _get_entity(facades[charn], path)
+        for trigname in trignames:
+            if triggers[trigname](entity):
+                results.append(True)
+                break
+        else:
+            results.append(False)
+    return results
@@ -20,6 +20,7 @@ from collections.abc import Set
 from operator import attrgetter, add, sub, mul, pow, truediv, floordiv, mod
 from functools import partial
 from contextlib import contextmanager
+from math import floor
 from textwrap import dedent
 from time import monotonic
 
@@ -46,6 +47,258 @@ def singleton_get(s):
     return it
 
 
+_TRIE_BITS = 5
+_TRIE_WIDTH = 1 << _TRIE_BITS
+_TRIE_MASK = _TRIE_WIDTH - 1
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+_EMPTY = object()
+
+
+class _Collision(tuple):
+    """Items whose hashes are the same all the way down"""
+    __slots__ = ()
+
+
+def _trie_contains(node, item, h, shift):
+    while True:
+        slot = node[(h >> shift) & _TRIE_MASK]
+        if type(slot) is list:
+            node = slot
+            shift += _TRIE_BITS
+        elif type(slot) is _Collision:
+            return item in slot
+        else:
+            return slot is not _EMPTY and slot == item
+
+
+def _trie_add(node, item, h, shift):
+    """Return a copy of the trie ``node`` with ``item`` in it, sharing
+    what it can, or ``node`` itself if ``item`` was there already"""
+    i = (h >> shift) & _TRIE_MASK
+    slot = node[i]
+    if slot is _EMPTY:
+        new = item
+    elif type(slot) is list:
+        new = _trie_add(slot, item, h, shift + _TRIE_BITS)
+        if new is slot:
+            return node
+    elif type(slot) is _Collision:
+        if item in slot:
+            return node
+        new = _Collision(slot + (item,))
+    elif slot == item:
+        return node
+    elif shift + _TRIE_BITS >= _HASH_BITS:
+        new = _Collision((slot, item))
+    else:
+        new = _trie_add(
+            [_EMPTY] * _TRIE_WIDTH, slot, hash(slot) & _HASH_MASK,
+            shift + _TRIE_BITS)
+        new = _trie_add(new, item, h, shift + _TRIE_BITS)
+    node = node.copy()
+    node[i] = new
+    return node
+
+
+def _trie_remove(node, item, h, shift):
+    """Return a copy of the trie ``node`` without ``item``, sharing what
+    it can, or raise KeyError if it wasn't there"""
+    i = (h >> shift) & _TRIE_MASK
+    slot = node[i]
+    if type(slot) is list:
+        new = _trie_remove(slot, item, h, shift + _TRIE_BITS)
+        if all(it is _EMPTY for it in new):
+            new = _EMPTY
+    elif type(slot) is _Collision:
+        if item not in slot:
+            raise KeyError(item)
+        new = _Collision(it for it in slot if it != item)
+    elif slot is not _EMPTY and slot == item:
+        new = _EMPTY
+    else:
+        raise KeyError(item)
+    node = node.copy()
+    node[i] = new
+    return node
+
+
+def _trie_iter(node):
+    for slot in node:
+        if slot is _EMPTY:
+            continue
+        elif type(slot) is list:
+            yield from _trie_iter(slot)
+        elif type(slot) is _Collision:
+            yield from slot
+        else:
+            yield slot
+
+
+class PersistentSet(Set):
+    """An immutable set that makes new sets with an item more or less
+
+    ``with_item`` and ``without_item`` return new sets, sharing most of
+    their structure with the old one, so keeping every version of a set
+    that changes one item at a time takes time and memory in proportion
+    to the number of changes, rather than to the number of changes times
+    the size of the set.
+
+    """
+    __slots__ = ('_root', '_len')
+
+    def __init__(self, iterable=()):
+        root = [_EMPTY] * _TRIE_WIDTH
+        n = 0
+        for item in iterable:
+            nuroot = _trie_add(root, item, hash(item) & _HASH_MASK, 0)
+            if nuroot is not root:
+                root = nuroot
+                n += 1
+        self._root = root
+        self._len = n
+
+    @classmethod
+    def _from_root(cls, root, n):
+        ret = cls.__new__(cls)
+        ret._root = root
+        ret._len = n
+        return ret
+
+    def __contains__(self, item):
+        try:
+            h = hash(item)
+        except TypeError:
+            return False
+        return _trie_contains(self._root, item, h & _HASH_MASK, 0)
+
+    def __iter__(self):
+        return _trie_iter(self._root)
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, list(self))
+
+    def with_item(self, item):
+        """Return a set like this one, but with ``item`` in it"""
+        root = _trie_add(self._root, item, hash(item) & _HASH_MASK, 0)
+        if root is self._root:
+            return self
+        return self._from_root(root, self._len + 1)
+
+    def without_item(self, item):
+        """Return a set like this one, but without ``item``
+
+        Raise KeyError if it's not here.
+
+        """
+        root = _trie_remove(self._root, item, hash(item) & _HASH_MASK, 0)
+        return self._from_root(root, self._len - 1)
+
+
+PERLIN_PERMUTATION = (
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7,
+    225, 140, 36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190,
+    6, 148, 247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117,
+    35, 11, 32, 57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136,
+    171, 168, 68, 175, 74, 165, 71, 134, 139, 48, 27, 166, 77, 146,
+    158, 231, 83, 111, 229, 122, 60, 211, 133, 230, 220, 105, 92, 41,
+    55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161, 1, 216, 80,
+    73, 209, 76, 132, 187, 208, 89, 18, 169, 200, 196, 135, 130, 116,
+    188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226,
+    250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207,
+    206, 59, 227, 47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213,
+    119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43,
+    172, 9, 129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178,
+    185, 112, 104, 218, 246, 97, 228, 251, 34, 242, 193, 238, 210, 144,
+    12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14, 239, 107, 49,
+    192, 214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115, 121, 50,
+    45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114, 67, 29, 24, 72,
+    243, 141, 128, 195, 78, 66, 215, 61, 156, 180
+)
+"""Ken Perlin's permutation of the numbers up to 255"""
+
+
+def _grad(h, x, y, z):
+    """CONVERT LO 4 BITS OF HASH CODE INTO 12 GRADIENT DIRECTIONS."""
+    u = x if h < 8 else y
+    v = y if h < 4 else x if h == 12 or h == 14 else z
+    return (u if h & 1 == 0 else -u) + (v if h & 2 == 0 else -v)
+
+
+# The gradients are linear, so each is a sum of the coordinates times
+# these, which can be looked up for whole arrays of hashes at once
+PERLIN_GRADIENTS = tuple(
+    tuple(_grad(h, *axis) for h in range(16))
+    for axis in ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+)
+
+
+def perlin_noise(x, y, z, perm, grads=PERLIN_GRADIENTS, floor=floor):
+    """Return Ken Perlin's improved noise at the point ``(x, y, z)``
+
+    ``perm`` is a permutation of the numbers up to 255, twice over, and
+    ``grads`` is the x, y, and z parts of the gradients.
+
+    This does nothing but arithmetic and indexing, so if ``x``, ``y``,
+    and ``z`` are numpy arrays, ``perm`` and ``grads`` are too, and
+    ``floor`` returns an array of integers, it returns an array of the
+    noise at every point at once.
+
+    """
+    gx, gy, gz = grads
+
+    def fade(t):
+        return t * t * t * (t * (t * 6 - 15) + 10)
+
+    def lerp(t, a, b):
+        return a + t * (b - a)
+
+    def grad(hsh, x, y, z):
+        h = hsh & 15
+        return gx[h] * x + gy[h] * y + gz[h] * z
+    # FIND UNIT CUBE THAT CONTAINS POINT.
+    fx = floor(x)
+    fy = floor(y)
+    fz = floor(z)
+    X = fx & 255
+    Y = fy & 255
+    Z = fz & 255
+    # FIND RELATIVE X, Y, Z OF POINT IN CUBE.
+    x = x - fx
+    y = y - fy
+    z = z - fz
+    # COMPUTE FADE CURVES FOR EACH OF X, Y, Z.
+    u = fade(x)
+    v = fade(y)
+    w = fade(z)
+    # HASH COORDINATES OF THE 8 CUBE CORNERS,
+    A = perm[X] + Y
+    AA = perm[A] + Z
+    AB = perm[A + 1] + Z
+    B = perm[X + 1] + Y
+    BA = perm[B] + Z
+    BB = perm[B + 1] + Z
+    # AND ADD BLENDED RESULTS FROM 8 CORNERS OF CUBE
+    return lerp(
+        w,
+        lerp(
+            v,
+            lerp(u, grad(perm[AA], x, y, z), grad(perm[BA], x-1, y, z)),
+            lerp(u, grad(perm[AB], x, y-1, z), grad(perm[BB], x-1, y-1, z))
+        ),
+        lerp(
+            v,
+            lerp(u, grad(perm[AA+1], x, y, z-1),
+                 grad(perm[BA+1], x-1, y, z-1)),
+            lerp(u, grad(perm[AB+1], x, y-1, z-1),
+                 grad(perm[BB+1], x-1, y-1, z-1))
+        )
+    )
+
+
 class EntityStatAccessor(object):
     __slots__ = [
         'engine', 'entity', 'branch', 'turn', 'tick', 'stat', 'current', 'mungers'
@@ -153,11 +406,43 @@ class EntityStatAccessor(object):
     def __getitem__(self, k):
         return self.munge(lambda x: x[k])
 
+    def history(self, beginning, end):
+        """Return the values this stat has had in the given window, inclusive.
+
+        It's a list of pairs of a turn and the value the stat took on
+        then: one for ``beginning``, then one for each later turn when it
+        changed. ``None`` means the stat wasn't set.
+
+        This reads the caches directly, so it doesn't change the engine's time.
+
+        """
+        get_history = getattr(self.entity, '_get_cache_history', None)
+        if get_history is not None:
+            changes = get_history(
+                self.stat, self.engine.branch, beginning, end)
+            if changes is not None:
+                return changes
+        ret = []
+        for turn, y in zip(
+                range(beginning, end + 1),
+                self._slow_iter_history(beginning, end)
+        ):
+            if not ret or ret[-1][1] != y:
+                ret.append((turn, y))
+        return ret
+
     def iter_history(self, beginning, end):
         """Iterate over all the values this stat has had in the given window, inclusive.
 
         """
-        # It might be useful to do this in a way that doesn't change the engine's time, perhaps for thread safety
+        changes = self.history(beginning, end)
+        for (turn, y), (nxt, _) in zip(changes, changes[1:] + [(end + 1, None)]):
+            for _ in range(turn, nxt):
+                yield y
+
+    def _slow_iter_history(self, beginning, end):
+        # for entities that can't look up their history in the caches.
+        # This moves the engine through time, so it isn't thread safe
         engine = self.engine
         entity = self.entity
         oldturn = engine.turn
@@ -0,0 +1,190 @@
+# This file is part of LiSE, a framework for life simulation games.
+# Copyright (c) Zachary Spector, public@zacharyspector.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""A compact format for sending deltas between processes.
+
+Wrap a delta, like :meth:`LiSE.Engine.get_delta` returns, in
+:class:`Delta`, and the engine's ``pack`` will send it this way.
+``unpack`` turns it back into an ordinary dictionary.
+
+Every name of a character, node, or stat appears only once in the
+message. Changes to the existence of nodes and portals, and to their
+stats, are sent as columns of indices into that list of names, plus a
+column of the new values. Everything else in the delta is sent as is.
+
+"""
+from array import array
+
+# keys at the top level of a delta that aren't character names
+_global_keys = frozenset({
+    'eternal', 'universal', 'rules', 'rulebooks', 'strings'})
+# index meaning that there's nothing there: the node, or the portal, was
+# in the delta with an empty dictionary. Real names start at 1
+NONE = 0
+
+
+class Delta(dict):
+    """A delta that gets packed in the compact format"""
+    __slots__ = ()
+
+
+def _typecode(n):
+    # the narrowest unsigned type of array that can index n names
+    if n <= 0xff:
+        return 'B'
+    if n <= 0xffff:
+        return 'H'
+    return 'I'
+
+
+def _ints(typecode, b):
+    ret = array(typecode)
+    ret.frombytes(b)
+    return ret
+
+
+def encode_delta(delta):
+    """Return a list of simple data that ``pack`` can handle, encoding
+    the delta"""
+    names = [None]
+    index = {}
+
+    def intern(name):
+        # 1 and True are equal, but they aren't the same name
+        k = (type(name), name)
+        if k in index:
+            return index[k]
+        ret = index[k] = len(names)
+        names.append(name)
+        return ret
+    rest = {}
+    nodes_c, nodes_n, nodes_x = [], [], bytearray()
+    nv_c, nv_n, nv_k, nv_v = [], [], [], []
+    edges_c, edges_o, edges_d, edges_x = [], [], [], bytearray()
+    ev_c, ev_o, ev_d, ev_k, ev_v = [], [], [], [], []
+    for char, chardelta in delta.items():
+        if char in _global_keys or not isinstance(chardelta, dict):
+            rest[char] = chardelta
+            continue
+        c = intern(char)
+        charrest = rest[char] = {}
+        for k, v in chardelta.items():
+            if not v or k not in (
+                    'nodes', 'node_val', 'edges', 'edge_val'):
+                charrest[k] = v
+            elif k == 'nodes':
+                for node, ex in v.items():
+                    nodes_c.append(c)
+                    nodes_n.append(intern(node))
+                    nodes_x.append(bool(ex))
+            elif k == 'node_val':
+                for node, vals in v.items():
+                    n = intern(node)
+                    if not vals:
+                        nv_c.append(c)
+                        nv_n.append(n)
+                        nv_k.append(NONE)
+                        nv_v.append(None)
+                        continue
+                    for key, val in vals.items():
+                        nv_c.append(c)
+                        nv_n.append(n)
+                        nv_k.append(intern(key))
+                        nv_v.append(val)
+            elif k == 'edges':
+                for orig, dests in v.items():
+                    o = intern(orig)
+                    if not dests:
+                        edges_c.append(c)
+                        edges_o.append(o)
+                        edges_d.append(NONE)
+                        edges_x.append(0)
+                        continue
+                    for dest, ex in dests.items():
+                        edges_c.append(c)
+                        edges_o.append(o)
+                        edges_d.append(intern(dest))
+                        edges_x.append(bool(ex))
+            else:
+                for orig, dests in v.items():
+                    o = intern(orig)
+                    if not dests:
+                        ev_c.append(c)
+                        ev_o.append(o)
+                        ev_d.append(NONE)
+                        ev_k.append(NONE)
+                        ev_v.append(None)
+                        continue
+                    for dest, vals in dests.items():
+                        d = intern(dest)
+                        if not vals:
+                            ev_c.append(c)
+                            ev_o.append(o)
+                            ev_d.append(d)
+                            ev_k.append(NONE)
+                            ev_v.append(None)
+                            continue
+                        for key, val in vals.items():
+                            ev_c.append(c)
+                            ev_o.append(o)
+                            ev_d.append(d)
+                            ev_k.append(intern(key))
+                            ev_v.append(val)
+    typecode = _typecode(len(names))
+
+    def col(ints):
+        return array(typecode, ints).tobytes()
+    return [
+        typecode, names, rest,
+        [col(nodes_c), col(nodes_n), bytes(nodes_x)],
+        [col(nv_c), col(nv_n), col(nv_k), nv_v],
+        [col(edges_c), col(edges_o), col(edges_d), bytes(edges_x)],
+        [col(ev_c), col(ev_o), col(ev_d), col(ev_k), ev_v]
+    ]
+
+
+def decode_delta(data):
+    """Return the delta that ``encode_delta`` made ``data`` from"""
+    typecode, names, delta, nodes, node_val, edges, edge_val = data
+
+    def ints(b):
+        return _ints(typecode, b)
+    chars, nds, extant = nodes
+    for c, n, ex in zip(ints(chars), ints(nds), extant):
+        delta[names[c]].setdefault('nodes', {})[names[n]] = bool(ex)
+    chars, nds, keys, vals = node_val
+    for c, n, k, v in zip(ints(chars), ints(nds), ints(keys), vals):
+        stats = delta[names[c]].setdefault(
+            'node_val', {}).setdefault(names[n], {})
+        if k != NONE:
+            stats[names[k]] = v
+    chars, origs, dests, extant = edges
+    for c, o, d, ex in zip(
+            ints(chars), ints(origs), ints(dests), extant):
+        dsts = delta[names[c]].setdefault(
+            'edges', {}).setdefault(names[o], {})
+        if d != NONE:
+            dsts[names[d]] = bool(ex)
+    chars, origs, dests, keys, vals = edge_val
+    for c, o, d, k, v in zip(
+            ints(chars), ints(origs), ints(dests), ints(keys), vals):
+        dsts = delta[names[c]].setdefault(
+            'edge_val', {}).setdefault(names[o], {})
+        if d == NONE:
+            continue
+        stats = dsts.setdefault(names[d], {})
+        if k != NONE:
+            stats[names[k]] = v
+    return delta
@@ -220,8 +220,8 @@ class FunctionStore(Signal):
         self._need_save = False
 
     def iterplain(self):
-        for funcdef in self._ast.body:
-            yield funcdef.name, unparse(funcdef)
+        for name in self._ast_idx:
+            yield name, self.get_source(name)
 
     def store_source(self, v, name=None):
         self._need_save = True
@@ -20,7 +20,43 @@ if sys.version_info[0] < 3 or (
 ):
     raise RuntimeError("LiSE requires Python 3.6 or later")
 
+import os
 from setuptools import setup
+from setuptools.command.build_ext import build_ext
+
+# The hottest modules in allegedb get compiled when Cython is installed,
+# unless you set LISE_PURE_PYTHON. They work the same uncompiled, just
+# slower, so if compiling fails, they get installed as plain Python.
+# LiSE.allegedb.benchmark tells you which you have and how fast it is.
+compiled_modules = [
+    "LiSE/allegedb/window.py",
+    "LiSE/allegedb/cache.py"
+]
+ext_modules = []
+if not os.environ.get("LISE_PURE_PYTHON"):
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        pass
+    else:
+        ext_modules = cythonize(
+            compiled_modules,
+            compiler_directives={'language_level': 3}
+        )
+
+
+class optional_build_ext(build_ext):
+    def run(self):
+        try:
+            super().run()
+        except Exception as ex:
+            self.warn("Not compiling allegedb: {}".format(ex))
+
+    def build_extension(self, ext):
+        try:
+            super().build_extension(ext)
+        except Exception as ex:
+            self.warn("Not compiling {}: {}".format(ext.name, ex))
 
 
 setup(
@@ -36,11 +72,14 @@ setup(
         "LiSE",
         "LiSE.server",
         "LiSE.examples",
-        "LiSE.allegedb"
+        "LiSE.allegedb",
+        "LiSE.benchmarks"
     ],
     package_data={
         'LiSE': ['sqlite.json']
     },
+    ext_modules=ext_modules,
+    cmdclass={'build_ext': optional_build_ext},
     install_requires=[
         "astunparse>=1.6.3<2",
         "msgpack>=1.0.0<1.1",